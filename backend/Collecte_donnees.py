@@ -9,37 +9,32 @@ import requests
 from datetime import datetime
 import json
 
+from services.aqi import aqi_value
+
 # Importer les fonctions de base de données
 from init_db import (
     insert_air_quality_data, 
     insert_alert, 
     log_collecte,
+    flush_writes,
     get_db_connection
 )
 
 
-def main():
-    """
-    Fonction principale de collecte.
-    Appelée automatiquement par app.py toutes les X minutes.
+def collect_aqicn(db_path=None):
     """
-    db_path = os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
+    Collecte AQICN (une mesure pour CITY).
+    Tâche "collecte_aqicn" du planificateur (cadence AQICN_INTERVAL).
     
-    # Récupérer les clés API
+    Returns:
+        (enregistrements collectés, liste des erreurs)
+    """
+    db_path = db_path or os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
     AQICN_TOKEN = os.getenv("AQICN_TOKEN", "")
-    OPENWEATHER_KEY = os.getenv("OPENWEATHER_KEY", "")
     CITY = os.getenv("CITY", "Paris")
-    
-    print(f"\n{'='*60}")
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🌍 COLLECTE - {CITY}")
-    print(f"{'='*60}\n")
-    
     total_collected = 0
     errors = []
     
-    # ========================================
-    # 1. COLLECTE AQICN
-    # ========================================
     if AQICN_TOKEN:
         try:
             print("📡 Collecte AQICN...")
@@ -71,7 +66,8 @@ def main():
                     }
                     
                     # Insérer dans la base de données
-                    insert_air_quality_data(air_quality_data, db_path)
+                    # Mesure contrôlée (valeurs aberrantes à None) : les alertes en découlent
+                    air_quality_data = insert_air_quality_data(air_quality_data, db_path)
                     total_collected += 1
                     
                     print(f"   ✅ AQI: {air_quality_data['aqi']} | PM2.5: {air_quality_data['pm25']} µg/m³")
@@ -113,9 +109,23 @@ def main():
     else:
         print("   ⚠️ AQICN_TOKEN non configuré - ignoré")
     
-    # ========================================
-    # 2. COLLECTE OPENWEATHER
-    # ========================================
+    return total_collected, errors
+
+
+def collect_openweather(db_path=None):
+    """
+    Collecte OpenWeather (pollution + météo pour CITY).
+    Tâche "collecte_openweather" du planificateur (cadence OPENWEATHER_INTERVAL).
+    
+    Returns:
+        (enregistrements collectés, liste des erreurs)
+    """
+    db_path = db_path or os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
+    OPENWEATHER_KEY = os.getenv("OPENWEATHER_KEY", "")
+    CITY = os.getenv("CITY", "Paris")
+    total_collected = 0
+    errors = []
+    
     if OPENWEATHER_KEY:
         try:
             print("\n📡 Collecte OpenWeather...")
@@ -153,7 +163,14 @@ def main():
                     # Préparer les données
                     air_quality_data = {
                         'city': CITY,
-                        'aqi': aqi_ow * 50,  # Convertir échelle OpenWeather (1-5) en AQI approximatif
+                        'aqi': aqi_value(
+                            pm25=components.get("pm2_5"),
+                            pm10=components.get("pm10"),
+                            no2=components.get("no2"),
+                            o3=components.get("o3"),
+                            so2=components.get("so2"),
+                            co=components.get("co"),
+                        ),  # AQI calculé depuis les concentrations (l'indice OpenWeather est sur 1-5)
                         'pm25': components.get("pm2_5"),
                         'pm10': components.get("pm10"),
                         'no2': components.get("no2"),
@@ -167,8 +184,8 @@ def main():
                         'raw_data': json.dumps(air_data)
                     }
                     
-                    # Insérer dans la base
-                    insert_air_quality_data(air_quality_data, db_path)
+                    # Insérer dans la base (mesure contrôlée, valeurs aberrantes à None)
+                    air_quality_data = insert_air_quality_data(air_quality_data, db_path)
                     total_collected += 1
                     
                     print(f"   ✅ AQI: {aqi_ow} ({air_quality_data['aqi']}) | PM2.5: {air_quality_data['pm25']} µg/m³")
@@ -194,6 +211,30 @@ def main():
     else:
         print("   ⚠️ OPENWEATHER_KEY non configuré - ignoré")
     
+    return total_collected, errors
+
+
+def main():
+    """
+    Collecte complète (toutes les sources) puis résumé.
+    Lancement manuel : python Collecte_donnees.py (en service, chaque source
+    est une tâche du planificateur avec sa propre cadence).
+    """
+    db_path = os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
+    CITY = os.getenv("CITY", "Paris")
+    
+    print(f"\n{'='*60}")
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🌍 COLLECTE - {CITY}")
+    print(f"{'='*60}\n")
+    
+    total_collected = 0
+    errors = []
+    
+    for collect in (collect_aqicn, collect_openweather):
+        collected, source_errors = collect(db_path)
+        total_collected += collected
+        errors.extend(source_errors)
+    
     # ========================================
     # 3. RÉSUMÉ
     # ========================================
@@ -210,6 +251,7 @@ def main():
     
     # Afficher les dernières données en DB
     try:
+        flush_writes()  # écritures différées de cette collecte
         conn = get_db_connection(db_path)
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM air_quality")
@@ -1,7 +1,8 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, request, jsonify, make_response, current_app
 import jwt
 import datetime
-import os
+
+from routes.auth import DEMO_USERS
 
 api_bp = Blueprint("api", __name__)
 
@@ -32,13 +33,19 @@ def login():
 
     # Vérification email + password
     if email and password == "demo":
+        # Persona du compte démo (sert au contrôle d'accès par route)
+        persona = DEMO_USERS.get(email.lower(), {}).get("persona", "citizen")
+        now = datetime.datetime.utcnow()
         token = jwt.encode(
             {
+                "sub": email,
                 "email": email,
+                "persona": persona,
                 "role": "DEMO",
-                "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=2)
+                "iat": now,
+                "exp": now + datetime.timedelta(hours=2)
             },
-            os.environ.get("JWT_SECRET", "dev_secret"),
+            current_app.config["JWT_SECRET"],
             algorithm="HS256"
         )
 
@@ -47,6 +54,7 @@ def login():
             "user": {
                 "email": email,
                 "name": users.get(email, "Utilisateur"),
+                "persona": persona,
                 "role": "DEMO"
             }
         })
@@ -21,12 +21,32 @@ logger.info(f"📦 Chemin de la base de données: {db_path}")
 
 try:
     logger.info("🔄 Import de init_db...")
-    from init_db import init_database
+    from init_db import init_database, backfill_air_quality_epoch
     logger.info("✅ Module init_db importé")
     
     logger.info("🔄 Initialisation de la base de données...")
     init_database(db_path)
     logger.info(f"✅ Base de données initialisée: {db_path}")
+    
+    # Migration ts/zone de l'historique (par lots), fusion des sources,
+    # état courant des zones, fenêtre chaude du dashboard puis corrélations,
+    # sans bloquer le démarrage
+    def _warm_up():
+        backfill_air_quality_epoch(db_path)
+        from services.fusion import fusion
+        fusion.warm()
+        from services.snapshot_store import snapshot_store
+        snapshot_store.get()
+        from services.hot_window import hot_window
+        t0 = time.time()
+        n = hot_window.warm()
+        logger.info(f"🔥 Fenêtre chaude: {n} mesures chargées en {time.time() - t0:.2f}s")
+        from services.correlations import correlations
+        correlations.warm()
+
+    # WARM_UP=false : pas de préchargement (sonde de démarrage à froid, import_budget.py)
+    if os.getenv("WARM_UP", "true").lower() == "true":
+        threading.Thread(target=_warm_up, daemon=True).start()
 except Exception as e:
     logger.error(f"❌ Erreur initialisation DB: {e}")
     import traceback
@@ -38,9 +58,14 @@ except Exception as e:
 logger.info("🔄 Import des blueprints...")
 from api_backend import api_bp
 from routes.dashboard import dashboard_bp
+from routes.iot import iot_bp
+from routes.sensors import sensors_bp
+from auth_middleware import init_auth
+from response_encoding import init_response_encoding
 logger.info("✅ Blueprints importés")
 
 app = Flask(__name__)
+app.config["JWT_SECRET"] = os.environ.get("JWT_SECRET", "dev_secret")
 
 # Configuration CORS complète
 CORS(app, resources={
@@ -48,7 +73,10 @@ CORS(app, resources={
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"],
-        "expose_headers": ["Content-Type", "Authorization"],
+        "expose_headers": [
+            "Content-Type", "Authorization",
+            "X-Heatmap-Bbox", "X-Heatmap-Size", "X-Heatmap-Vmax", "X-Heatmap-Generation",
+        ],
         "supports_credentials": False,
         "max_age": 3600
     }
@@ -56,6 +84,14 @@ CORS(app, resources={
 
 app.register_blueprint(api_bp, url_prefix="/api")
 app.register_blueprint(dashboard_bp)
+app.register_blueprint(iot_bp)
+app.register_blueprint(sensors_bp)
+
+# Vérification JWT + contrôle d'accès par persona
+init_auth(app)
+
+# JSON rapide (orjson) + compression gzip/brotli
+init_response_encoding(app)
 
 @app.route("/ping")
 def ping():
@@ -74,6 +110,8 @@ def db_status():
     """Route pour vérifier l'état de la DB"""
     try:
         from init_db import get_db_connection
+        from write_buffer import buffer_stats
+        from services.anomaly import detector
         conn = get_db_connection(db_path)
         cursor = conn.cursor()
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
@@ -89,7 +127,9 @@ def db_status():
         return jsonify({
             "status": "ok",
             "db_path": db_path,
-            "tables": status
+            "tables": status,
+            "write_buffer": buffer_stats(),
+            "anomalies": detector.stats()
         })
     except Exception as e:
         return jsonify({
@@ -98,58 +138,77 @@ def db_status():
         }), 500
 
 
+@app.route("/scheduler-status")
+def scheduler_status():
+    """État des tâches périodiques (dernier lancement, durée, statut, prochain lancement)"""
+    from scheduler import scheduler
+    return jsonify({"status": "ok", "jobs": scheduler.status()})
+
+
 # ========================================
-# COLLECTE AUTOMATIQUE EN ARRIÈRE-PLAN
+# TÂCHES PÉRIODIQUES (COLLECTE PAR SOURCE, ARCHIVE)
 # ========================================
 
-def run_collecte():
-    """Lance la collecte de données en boucle"""
-    import sys
-    sys.path.insert(0, os.path.dirname(__file__))
-    
-    # Attendre 30 secondes au démarrage pour laisser le serveur se lancer
-    logger.info("⏳ Attente de 30 secondes avant la première collecte...")
-    time.sleep(30)
-    
-    while True:
-        try:
-            logger.info("🔄 Démarrage de la collecte de données...")
-            
-            # Importer et exécuter le script de collecte
-            try:
-                from Collecte_donnees import main as collecte_main
-                collecte_main()
-                logger.info("✅ Collecte terminée avec succès")
-            except ImportError as e:
-                logger.warning(f"⚠️ Collecte_donnees.py non trouvé ou erreur d'import: {e}")
-                logger.info("💡 Utilisation de données simulées à la place")
-            except Exception as e:
-                logger.error(f"❌ Erreur lors de la collecte: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-            
-            # Attendre X minutes avant la prochaine collecte
-            interval = int(os.getenv("COLLECTE_INTERVAL", "900"))
-            logger.info(f"⏳ Prochaine collecte dans {interval} secondes ({interval//60} minutes)...")
-            time.sleep(interval)
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur critique dans la boucle de collecte: {e}")
-            time.sleep(60)  # Attendre 1 minute en cas d'erreur
-
-
-# Démarrer le thread de collecte automatique
+def _collecte_job(source):
+    """Tâche de collecte d'une source : lève en cas d'échec total pour le statut de la tâche."""
+    def run():
+        import Collecte_donnees
+        collect = getattr(Collecte_donnees, f"collect_{source}")
+        collected, errors = collect(db_path)
+        logger.info(f"✅ Collecte {source}: {collected} enregistrement(s), {len(errors)} erreur(s)")
+        if errors and not collected:
+            raise RuntimeError("; ".join(errors))
+    return run
+
+
+def _archive_job():
+    # Nouvelles mesures -> archive colonnaire (tendances longues)
+    from columnar_archive import sync_archive
+    sync_archive(db_path)
+
+
+from scheduler import scheduler
+
+collecte_interval = int(os.getenv("COLLECTE_INTERVAL", "900"))
 if os.getenv("ENABLE_AUTO_COLLECTE", "true").lower() == "true":
-    collecte_thread = threading.Thread(target=run_collecte, daemon=True)
-    collecte_thread.start()
-    logger.info("🚀 Thread de collecte automatique démarré")
+    # Premier lancement après 30 s pour laisser le serveur démarrer
+    for source, env in (("aqicn", "AQICN_INTERVAL"), ("openweather", "OPENWEATHER_INTERVAL")):
+        interval = int(os.getenv(env, str(collecte_interval)))
+        scheduler.register(f"collecte_{source}", _collecte_job(source), interval,
+                           timeout=120, first_delay=30)
+    logger.info("🚀 Collecte automatique planifiée (une tâche par source)")
 else:
     logger.info("ℹ️ Collecte automatique désactivée (ENABLE_AUTO_COLLECTE=false)")
 
+scheduler.register("archive_sync", _archive_job, int(os.getenv("ARCHIVE_INTERVAL", "3600")),
+                   timeout=600, first_delay=60, misfire="skip")
+
+# Mobilité : échantillons par zone (rattrapage après arrêt) puis agrégats horaires
+from services.mobility_pipeline import SAMPLE as MOBILITY_SAMPLE, rollup_mobility, sample_mobility
+scheduler.register("mobility_sample", sample_mobility, MOBILITY_SAMPLE, timeout=120, first_delay=5)
+scheduler.register("mobility_rollup", rollup_mobility, 3600, timeout=600, first_delay=90, misfire="skip")
+
+# Corrélations : recalcul exact nocturne sur l'archive (dérive du calcul en ligne)
+from services.correlations import recompute_correlations, seconds_until_recompute
+scheduler.register("correlations_recompute", recompute_correlations, 86400, jitter=0.01,
+                   timeout=3600, first_delay=seconds_until_recompute())
+
+# Prévisions : un passage vectorisé sur la forêt pour toutes les zones / échéances
+from services.forecast import refresh_forecasts
+scheduler.register("forecast", refresh_forecasts, int(os.getenv("FORECAST_EVERY", "3600")),
+                   timeout=300, first_delay=120, misfire="skip")
+scheduler.start()
+
 logger.info("=" * 60)
 logger.info("✅ BACKEND PRÊT")
 logger.info("=" * 60)
 
 if __name__ == "__main__":
+    import signal
+    import sys
+    
+    # SIGTERM (arrêt Render) -> sortie normale : atexit vide la file d'écriture
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    
     port = int(os.getenv("PORT", 10000))
     app.run(host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,150 @@
+# backend/auth_middleware.py
+"""
+Vérification JWT sans état, exécutée une seule fois par requête (before_request).
+
+- La clé HS256 est lue une seule fois à l'initialisation (app.config["JWT_SECRET"]).
+- Un petit LRU garde les tokens déjà vérifiés : le polling du dashboard (toutes
+  les 15 s, toujours le même token) ne refait ni HMAC ni décodage JSON.
+- Les claims décodés sont exposés dans flask.g.claims.
+- Certaines routes sont réservées à des personas (env / elected / citizen).
+- Avec AUTH_REQUIRED=false, le token est décodé s'il est présent mais jamais exigé.
+
+Env:
+  AUTH_REQUIRED     "true" (défaut) / "false" pour désactiver le contrôle
+  AUTH_CACHE_SIZE   nombre de tokens gardés en cache (défaut 512)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import jwt
+from flask import g, jsonify, request
+
+
+# Routes accessibles sans token
+PUBLIC_PATHS = {"/", "/ping", "/healthz", "/api/auth/login"}
+# Ingestion capteurs : protégée par IOT_API_KEY, refusée si la clé n'est pas
+# configurée (sauf IOT_ALLOW_ANONYMOUS=true, voir routes/iot.py)
+PUBLIC_PREFIXES: Tuple[str, ...] = ("/api/iot/",)
+
+# Routes réservées à certains personas (préfixe -> personas autorisés)
+ROUTE_PERSONAS: Tuple[Tuple[str, frozenset], ...] = (
+    ("/db-status", frozenset({"env"})),
+    ("/scheduler-status", frozenset({"env"})),
+    ("/api/predictions", frozenset({"env"})),
+)
+
+
+class _TokenCache:
+    """LRU des tokens vérifiés : token -> claims."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            claims = self._data.get(token)
+            if claims is None:
+                return None
+            exp = claims.get("exp")
+            if exp is not None and exp <= time.time():
+                del self._data[token]
+                return None
+            self._data.move_to_end(token)
+            return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        with self._lock:
+            self._data[token] = claims
+            self._data.move_to_end(token)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_cache = _TokenCache(int(os.getenv("AUTH_CACHE_SIZE", "512")))
+_secret: Optional[str] = None
+_enforce = True
+
+
+def _bearer_token() -> Optional[str]:
+    header = request.headers.get("Authorization", "")
+    if header[:7].lower() == "bearer ":
+        return header[7:].strip() or None
+    return None
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    """Retourne les claims du token (depuis le cache si déjà vérifié).
+
+    Lève jwt.InvalidTokenError si le token est invalide ou expiré.
+    """
+    claims = _cache.get(token)
+    if claims is not None:
+        return claims
+
+    claims = jwt.decode(token, _secret, algorithms=["HS256"])
+    # Les anciens tokens n'ont que "email"
+    claims.setdefault("sub", claims.get("email"))
+    _cache.put(token, claims)
+    return claims
+
+
+def _is_public(path: str) -> bool:
+    return path in PUBLIC_PATHS or path.startswith(PUBLIC_PREFIXES)
+
+
+def _allowed_personas(path: str) -> Optional[frozenset]:
+    for prefix, personas in ROUTE_PERSONAS:
+        if path.startswith(prefix):
+            return personas
+    return None
+
+
+def _check_request():
+    g.claims = None
+    if request.method == "OPTIONS":
+        return None
+
+    path = request.path
+    public = not _enforce or _is_public(path)
+    token = _bearer_token()
+    if token:
+        try:
+            g.claims = verify_token(token)
+        except jwt.ExpiredSignatureError:
+            if not public:
+                return jsonify({"error": "Token expired"}), 401
+        except jwt.InvalidTokenError:
+            if not public:
+                return jsonify({"error": "Invalid token"}), 401
+
+    if public:
+        return None
+
+    if g.claims is None:
+        return jsonify({"error": "Authentication required"}), 401
+
+    personas = _allowed_personas(path)
+    if personas is not None and g.claims.get("persona") not in personas:
+        return jsonify({"error": "Forbidden for this persona"}), 403
+
+    return None
+
+
+def init_auth(app) -> None:
+    """Branche la vérification JWT sur l'application Flask."""
+    global _secret, _enforce
+    _secret = app.config["JWT_SECRET"]
+    _enforce = os.getenv("AUTH_REQUIRED", "true").lower() == "true"
+    _cache.clear()
+    app.before_request(_check_request)
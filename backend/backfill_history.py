@@ -0,0 +1,370 @@
+# backend/backfill_history.py
+"""
+Import en masse de l'historique des stations dans air_quality.
+
+Usage :
+  python backfill_history.py archives/*.csv.gz stations.ndjson \\
+      [--map "Date=timestamp,PM2.5=pm25"] [--city Paris] [--zone centre] \\
+      [--source BACKFILL] [--tz UTC] [--batch 100000] [--rebuild-indexes] [--restart] [--no-archive]
+
+- Formats : .csv, .ndjson / .jsonl, éventuellement compressés en .gz,
+  lus en flux par lots pandas (mémoire bornée par la taille d'un lot) ;
+  parsing, validation et AQI sont vectorisés par lot.
+- Colonnes : alias courants (date, pm2.5, station, ...) + --map source=cible.
+  Les colonnes inconnues sont ignorées.
+- Validation : horodatage obligatoire (ISO 8601 ou epoch s/ms), valeurs
+  numériques >= 0 (sinon vides), au moins une mesure par ligne. Les lignes
+  CSV mal formées (nombre de champs) sont ignorées.
+- AQI absent : calculé par lot depuis les concentrations (services.aqi).
+- Écriture : un lot = une transaction (executemany) qui enregistre aussi le
+  point de reprise du fichier ; une relance reprend au dernier lot validé.
+- --rebuild-indexes : supprime les index secondaires d'air_quality pendant
+  l'import et les reconstruit à la fin (plus rapide sur de gros volumes).
+  Dans tous les cas les index sont recréés si besoin, puis ANALYZE.
+- Fusion : les lignes canoniques (air_quality_fused) des intervalles
+  importés sont recalculées (services.fusion).
+- Archive : les lignes fusionnées recalculées sont ensuite reportées dans
+  l'archive colonnaire (columnar_archive.py), sauf --no-archive.
+"""
+import argparse
+import gzip
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+from zoneinfo import ZoneInfo
+
+from init_db import DEFAULT_ZONE, init_database
+
+
+DB_PATH = os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
+
+POLLUTANTS = ("pm25", "pm10", "no2", "o3", "so2", "co")
+NUMERIC = ("aqi",) + POLLUTANTS + ("temperature", "humidity", "wind_speed")
+TEXT = ("city", "zone", "source")
+TARGETS = ("timestamp",) + TEXT + NUMERIC
+
+ALIASES = {
+    "date": "timestamp", "datetime": "timestamp", "time": "timestamp", "ts": "timestamp",
+    "date_time": "timestamp", "measured_at": "timestamp",
+    "pm2.5": "pm25", "pm2_5": "pm25", "pm_25": "pm25", "pm_2_5": "pm25", "pm_10": "pm10",
+    "station": "city", "ville": "city", "zone_id": "zone",
+    "temp": "temperature", "temperature_c": "temperature", "humidite": "humidity",
+    "wind": "wind_speed", "windspeed": "wind_speed", "vent": "wind_speed",
+}
+
+# Index secondaires d'air_quality (mêmes définitions que les migrations d'init_db)
+SECONDARY_INDEXES = {
+    "idx_air_quality_timestamp": "air_quality(timestamp DESC)",
+    "idx_air_quality_zone_ts": "air_quality(zone, ts)",
+    "idx_air_quality_ts": "air_quality(ts)",
+}
+
+# ?1 = epoch : la colonne texte timestamp est dérivée par SQLite
+_INSERT = '''
+    INSERT INTO air_quality
+    (timestamp, ts, city, zone, source, aqi, pm25, pm10, no2, o3, so2, co, temperature, humidity, wind_speed)
+    VALUES (datetime(?1, 'unixepoch'), ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12, ?13, ?14)
+'''
+
+
+class Mapper:
+    """Nom de colonne source -> colonne cible (mémoïsé)."""
+
+    def __init__(self, overrides):
+        self.overrides = {k.strip().lower(): v for k, v in overrides.items()}
+        self._memo = {}
+
+    def __call__(self, key):
+        if key not in self._memo:
+            k = str(key).strip().lower()
+            self._memo[key] = self.overrides.get(k) or ALIASES.get(k) or (k if k in TARGETS else None)
+        return self._memo[key]
+
+
+def _parse_map(raw):
+    mapping = {}
+    for pair in filter(None, (raw or "").split(",")):
+        src, _, dst = pair.partition("=")
+        if dst.strip() not in TARGETS:
+            raise SystemExit(f"❌ --map: colonne cible inconnue '{dst}' (attendu: {', '.join(TARGETS)})")
+        mapping[src] = dst.strip()
+    return mapping
+
+
+def _ndjson_chunks(path, batch_size):
+    """Lots NDJSON ; une ligne illisible devient un enregistrement vide (rejeté)."""
+    import pandas as pd
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as handle:
+        while True:
+            lines = list(itertools.islice(handle, batch_size))
+            if not lines:
+                break
+            records = []
+            for line in lines:
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    obj = None
+                records.append(obj if isinstance(obj, dict) else {})
+            yield pd.DataFrame.from_records(records)
+
+
+def _read_chunks(path, delimiter, batch_size):
+    """DataFrames successifs de batch_size enregistrements (CSV / NDJSON, .gz inclus)."""
+    import pandas as pd
+
+    base = path[:-3] if path.endswith(".gz") else path
+    if base.endswith((".ndjson", ".jsonl", ".json")):
+        return _ndjson_chunks(path, batch_size)
+    return pd.read_csv(path, sep=delimiter, chunksize=batch_size, compression="infer",
+                       on_bad_lines="skip", skipinitialspace=True)
+
+
+def _epoch_seconds(col, tz):
+    """Colonne horodatage -> epoch en secondes (float64, NaN si invalide)."""
+    import numpy as np
+    import pandas as pd
+
+    numeric = pd.to_numeric(col, errors="coerce").to_numpy(dtype=np.float64)
+    out = np.where(numeric > 1e11, numeric / 1000, numeric)  # epoch en ms
+    text = np.isnan(out) & col.notna().to_numpy()
+    if text.any():
+        dates = pd.to_datetime(col[text].astype(str), errors="coerce", format="ISO8601", utc=False)
+        if dates.dtype == object:  # décalages horaires mélangés
+            dates = pd.to_datetime(col[text].astype(str), errors="coerce", format="ISO8601", utc=True)
+        elif dates.dt.tz is None:
+            dates = dates.dt.tz_localize(tz, ambiguous="NaT", nonexistent="NaT")
+        seconds = dates.astype("int64").to_numpy() / 1e9
+        out[text] = np.where(dates.isna().to_numpy(), np.nan, seconds)
+    return out
+
+
+class Importer:
+    def __init__(self, db_path, mapper, defaults, tz, batch_size, compute_aqi=True):
+        self.db_path = db_path
+        self.mapper = mapper
+        self.defaults = defaults
+        self.tz = tz
+        self.batch_size = batch_size
+        self.compute_aqi = compute_aqi
+        self.reject_reasons = {}
+
+        self.conn = sqlite3.connect(db_path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-262144")  # 256 Mo
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+
+    def _reject(self, reason, n):
+        if n:
+            self.reject_reasons[reason] = self.reject_reasons.get(reason, 0) + int(n)
+
+    def _rows(self, df):
+        """Lot pandas -> liste de tuples pour _INSERT (validation vectorisée)."""
+        import numpy as np
+        import pandas as pd
+
+        columns = {}
+        for name in df.columns:
+            target = self.mapper(name)
+            if target is not None and target not in columns:
+                columns[target] = df[name]
+
+        n = len(df)
+        if "timestamp" not in columns:
+            self._reject("horodatage absent ou invalide", n)
+            return []
+        ts = _epoch_seconds(columns["timestamp"], self.tz)
+
+        values = {}
+        for c in NUMERIC:
+            if c in columns:
+                v = pd.to_numeric(columns[c], errors="coerce").to_numpy(dtype=np.float64)
+                v[v < 0] = np.nan
+            else:
+                v = np.full(n, np.nan)
+            values[c] = v
+
+        has_ts = ~np.isnan(ts)
+        has_value = ~np.all(np.isnan(np.vstack([values[c] for c in NUMERIC])), axis=0)
+        keep = has_ts & has_value
+        self._reject("horodatage absent ou invalide", (~has_ts).sum())
+        self._reject("aucune mesure", (has_ts & ~has_value).sum())
+        if not keep.any():
+            return []
+
+        values = {c: v[keep] for c, v in values.items()}
+        if self.compute_aqi:
+            # AQI manquants calculés en un appel vectorisé par lot
+            from services.aqi import compute_aqi
+
+            missing = np.isnan(values["aqi"])
+            if missing.any():
+                computed = compute_aqi(**{c: values[c][missing] for c in POLLUTANTS})
+                values["aqi"][missing] = computed
+        values["aqi"] = np.rint(values["aqi"])
+
+        text = {}
+        for c in TEXT:
+            if c in columns:
+                col = columns[c][keep].astype("string").str.strip()
+                text[c] = col.mask(col.isna() | (col == ""), self.defaults[c]).tolist()
+            else:
+                text[c] = [self.defaults[c]] * int(keep.sum())
+
+        # NaN -> NULL à l'insertion
+        return list(zip(
+            ts[keep].astype(np.int64).tolist(),
+            text["city"], text["zone"], text["source"],
+            *(values[c].tolist() for c in NUMERIC),
+        ))
+
+    def _commit(self, key, rows, records, inserted, rejected, done=False):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if rows:
+                self.conn.executemany(_INSERT, rows)
+            self.conn.execute('''
+                INSERT INTO backfill_checkpoints (file, records, inserted, rejected, done, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(file) DO UPDATE SET
+                    records = excluded.records, inserted = excluded.inserted,
+                    rejected = excluded.rejected, done = excluded.done,
+                    updated_at = excluded.updated_at
+            ''', (key, records, inserted, rejected, int(done)))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def import_file(self, path, delimiter=",", restart=False):
+        """Importe un fichier depuis son dernier point de reprise. Retourne (insérées, rejetées)."""
+        # La clé inclut la taille : un fichier modifié repart de zéro
+        key = f"{os.path.abspath(path)}:{os.path.getsize(path)}"
+        records = inserted = rejected = 0
+        if restart:
+            self.conn.execute("DELETE FROM backfill_checkpoints WHERE file = ?", (key,))
+        else:
+            row = self.conn.execute(
+                "SELECT records, inserted, rejected, done FROM backfill_checkpoints WHERE file = ?", (key,)
+            ).fetchone()
+            if row:
+                records, inserted, rejected, done = row
+                if done:
+                    print(f"⏭️ {path}: déjà importé ({inserted} lignes)")
+                    return 0, 0
+                print(f"🔁 {path}: reprise après {records} enregistrements")
+
+        t0 = time.time()
+        new_inserted = new_rejected = 0
+        seen = 0
+        for chunk in _read_chunks(path, delimiter, self.batch_size):
+            # Reprise : les enregistrements déjà validés sont relus puis ignorés
+            start = seen
+            seen += len(chunk)
+            if seen <= records:
+                continue
+            if start < records:
+                chunk = chunk.iloc[records - start:]
+
+            rows = self._rows(chunk)
+            records += len(chunk)
+            inserted += len(rows)
+            rejected += len(chunk) - len(rows)
+            new_inserted += len(rows)
+            new_rejected += len(chunk) - len(rows)
+            self._commit(key, rows, records, inserted, rejected)
+            rate = new_inserted / max(time.time() - t0, 1e-6)
+            print(f"   {path}: {records} enregistrements, {inserted} insérés ({rate:,.0f} lignes/s)")
+
+        self._commit(key, [], records, inserted, rejected, done=True)
+        print(f"✅ {path}: {new_inserted} lignes insérées, {new_rejected} rejetées en {time.time() - t0:.1f}s")
+        return new_inserted, new_rejected
+
+    def drop_indexes(self):
+        for name in SECONDARY_INDEXES:
+            self.conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def finish(self):
+        """Index secondaires (re)créés si besoin, puis statistiques du planificateur."""
+        t0 = time.time()
+        for name, target in SECONDARY_INDEXES.items():
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        self.conn.execute("ANALYZE air_quality")
+        self.conn.close()
+        print(f"✅ Index et statistiques à jour en {time.time() - t0:.1f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import en masse de l'historique air_quality (CSV / NDJSON, .gz)")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--map", default="", help="source=cible,... (ex: 'Date=timestamp,PM2.5=pm25')")
+    parser.add_argument("--delimiter", default=",", help="séparateur CSV")
+    parser.add_argument("--city", default=os.getenv("CITY", "Paris"), help="ville si absente du fichier")
+    parser.add_argument("--zone", default=DEFAULT_ZONE, help="zone si absente du fichier")
+    parser.add_argument("--source", default="BACKFILL", help="source si absente du fichier")
+    parser.add_argument("--tz", default="UTC", help="fuseau des dates sans décalage")
+    parser.add_argument("--batch", type=int, default=100_000, help="lignes par transaction")
+    parser.add_argument("--no-aqi", action="store_true", help="ne pas calculer les AQI manquants")
+    parser.add_argument("--rebuild-indexes", action="store_true",
+                        help="supprimer les index secondaires pendant l'import, reconstruits à la fin")
+    parser.add_argument("--restart", action="store_true", help="ignorer les points de reprise")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="ne pas alimenter l'archive colonnaire à la fin de l'import")
+    args = parser.parse_args(argv)
+
+    init_database(args.db)
+    importer = Importer(
+        args.db,
+        Mapper(_parse_map(args.map)),
+        {"city": args.city, "zone": args.zone, "source": args.source},
+        ZoneInfo(args.tz),
+        max(1, args.batch),
+        compute_aqi=not args.no_aqi,
+    )
+    if args.rebuild_indexes:
+        print("🔧 Index secondaires supprimés pendant l'import")
+        importer.drop_indexes()
+
+    conn = sqlite3.connect(args.db)
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM air_quality").fetchone()[0]
+    conn.close()
+
+    t0 = time.time()
+    total_inserted = total_rejected = 0
+    try:
+        for path in args.files:
+            inserted, rejected = importer.import_file(path, args.delimiter, args.restart)
+            total_inserted += inserted
+            total_rejected += rejected
+    finally:
+        importer.finish()
+
+    # Lignes canoniques (fusion des sources) des intervalles touchés par l'import
+    conn = sqlite3.connect(args.db)
+    lo, hi = conn.execute("SELECT MIN(ts), MAX(ts) FROM air_quality WHERE id > ?", (last_id,)).fetchone()
+    conn.close()
+    if lo is not None:
+        from services.fusion import rebuild
+        t1 = time.time()
+        n = rebuild(args.db, lo, hi)
+        print(f"✅ Fusion: {n} lignes canoniques recalculées en {time.time() - t1:.1f}s")
+
+    if not args.no_archive:
+        from columnar_archive import sync_archive
+        sync_archive(args.db)
+
+    print(f"📊 {total_inserted} lignes insérées, {total_rejected} rejetées en {time.time() - t0:.1f}s")
+    for reason, n in sorted(importer.reject_reasons.items(), key=lambda x: -x[1]):
+        print(f"   - {reason}: {n}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,6 +18,8 @@ from typing import Any, Dict, Optional
 
 import requests
 
+from services.aqi import aqi_value
+
 
 API_BASE = os.getenv("API_BASE", "http://localhost:5000").rstrip("/")
 AQICN_TOKEN = os.getenv("AQICN_TOKEN", "")
@@ -42,7 +44,7 @@ def _simulate() -> Dict[str, Any]:
     pm10 = int(55 + (t % 7) * 3)
     no2 = int(45 + (t % 9) * 4)
     o3 = int(38 + (t % 6) * 3)
-    aqi = int(min(180, max(10, round(pm25 * 1.7))))
+    aqi = aqi_value(pm25=pm25, pm10=pm10, no2=no2, o3=o3)
     return {
         "zone": "centre",
         "kpis": {"pm25": pm25, "pm10": pm10, "no2": no2, "o3": o3, "aqi": aqi, "sensors": {"active": 3, "total": 3}},
@@ -104,7 +106,7 @@ def run_once() -> None:
         if ow.get(k) is not None:
             kpis[k] = ow[k]
 
-    payload = {"zone": "centre", "kpis": kpis, "alerts": []}
+    payload = {"zone": "centre", "sensor_id": "collecte-centre", "kpis": kpis, "alerts": []}
 
     print(f"[collecte] ingest -> {API_BASE}/api/iot/ingest (CITY={CITY})")
     r = requests.post(f"{API_BASE}/api/iot/ingest", json=payload, timeout=20)
@@ -0,0 +1,364 @@
+# backend/columnar_archive.py
+"""
+Archive colonnaire de l'historique fusionné (air_quality_fused), lue par memory-map.
+
+Pour les vues de tendance sur plusieurs mois, les corrélations et
+l'entraînement des modèles, lire la base ligne à ligne (sqlite3.Row -> dict)
+est lent et gourmand. L'archive range chaque mesure dans un fichier par
+polluant / zone / mois :
+
+  ARCHIVE_DIR/<colonne>/<zone>/<AAAA-MM>.bin
+
+Chaque fichier est une suite d'enregistrements de largeur fixe (8 octets) :
+ts epoch UTC (uint32) + valeur (float32), triés par ts, un par intervalle de
+fusion (services.fusion) : les sources sont déjà pondérées et ramenées aux
+mêmes unités. La zone "all" garde la moyenne des zones par intervalle. Les
+valeurs absentes ne sont pas archivées.
+
+- Lecture : np.memmap en lecture seule + searchsorted sur ts ; segments()
+  renvoie des vues sans copie (un segment par mois), read() les concatène.
+  Seules les pages touchées sont chargées par l'OS.
+- Alimentation : sync() reporte les lignes fusionnées modifiées depuis le
+  dernier repère updated_at (manifest.json), relu avec ARCHIVE_SYNC_OVERLAP
+  secondes de recouvrement (écritures différées). Une ligne fusionnée change
+  tant que son intervalle est ouvert, et rebuild() réécrit l'historique :
+  chaque enregistrement remplace celui de même ts. Des ts postérieurs à la
+  fin du fichier sont ajoutés en fin ; sinon ce seul fichier est réécrit trié
+  (remplacement atomique). Appelé après chaque collecte, après un import
+  backfill_history, ou à la main :
+      python columnar_archive.py sync [--db ...] [--dir ...]
+      python columnar_archive.py stats
+- Une ligne supprimée en base, ou une valeur devenue absente, n'est pas
+  retirée de l'archive.
+- Reprise : le manifest est écrit après les fichiers ; un lot interrompu est
+  rejoué, sans doublon puisque l'écriture remplace par ts. Une archive d'un
+  ancien format (mesures brutes d'air_quality) est effacée et reconstruite.
+
+Env:
+  ARCHIVE_DIR            répertoire de l'archive (défaut : <DATABASE_PATH sans extension>_archive)
+  ARCHIVE_SYNC_OVERLAP   recouvrement du repère updated_at, en secondes (défaut 600)
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from init_db import DEFAULT_ZONE, get_db_connection
+from write_buffer import flush_all
+
+
+DB_PATH = os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.splitext(DB_PATH)[0] + "_archive")
+
+COLUMNS = ("aqi", "pm25", "pm10", "no2", "o3", "so2", "co", "temperature", "humidity", "wind_speed")
+
+RECORD = np.dtype([("ts", "<u4"), ("value", "<f4")])
+
+ALL = "all"
+
+MANIFEST = "manifest.json"
+
+# 2 : lignes d'air_quality_fused (1, sans champ format : air_quality brute)
+FORMAT = 2
+
+SYNC_BATCH = 100_000
+SYNC_OVERLAP = int(os.getenv("ARCHIVE_SYNC_OVERLAP", "600"))
+
+_STAMP = "%Y-%m-%d %H:%M:%S"
+
+
+def _months_between(start: int, end: int) -> List[str]:
+    """Mois (AAAA-MM, UTC) couverts par [start, end]."""
+    first = datetime.fromtimestamp(max(start, 0), tz=timezone.utc)
+    last = datetime.fromtimestamp(max(end, 0), tz=timezone.utc)
+    y, m = first.year, first.month
+    out = []
+    while (y, m) <= (last.year, last.month):
+        out.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+def archive_dir_for(db_path: str) -> str:
+    """Répertoire de l'archive d'une base (ARCHIVE_DIR pour la base par défaut)."""
+    if db_path == DB_PATH:
+        return ARCHIVE_DIR
+    return os.path.splitext(db_path)[0] + "_archive"
+
+
+def _safe_zone(zone: str) -> str:
+    return zone.replace(os.sep, "_").replace("..", "_") or DEFAULT_ZONE
+
+
+def _since(updated_at: str) -> str:
+    """Repère updated_at moins le recouvrement ("" : tout relire)."""
+    if not updated_at:
+        return ""
+    return (datetime.strptime(updated_at, _STAMP) - timedelta(seconds=SYNC_OVERLAP)).strftime(_STAMP)
+
+
+class ColumnarArchive:
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+        self._maps: Dict[str, Tuple[Tuple[int, int], np.memmap]] = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    # ---------- Lecture ----------
+
+    def _rel(self, column: str, zone: str, month: str) -> str:
+        return os.path.join(column, _safe_zone(zone), f"{month}.bin")
+
+    def _map(self, rel: str) -> Optional[np.memmap]:
+        """memmap du fichier (remappé s'il a été remplacé ou a grandi depuis), ou None."""
+        path = os.path.join(self.root, rel)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        n = st.st_size // RECORD.itemsize
+        if not n:
+            return None
+        with self._lock:
+            cached = self._maps.get(rel)
+            if cached is not None and cached[0] == (st.st_ino, n):
+                return cached[1]
+            mm = np.memmap(path, dtype=RECORD, mode="r", shape=(n,))
+            self._maps[rel] = ((st.st_ino, n), mm)
+            return mm
+
+    def segments(self, column: str, zone: str, start: int, end: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(ts, valeurs) par mois pour start < ts <= end : vues sur le memmap, sans copie."""
+        if column not in COLUMNS:
+            raise ValueError(f"colonne inconnue: {column}")
+        end = int(time.time()) if end is None else end
+        for month in _months_between(start, end):
+            mm = self._map(self._rel(column, zone, month))
+            if mm is None:
+                continue
+            ts = mm["ts"]
+            lo = int(np.searchsorted(ts, start, side="right"))
+            hi = int(np.searchsorted(ts, end, side="right"))
+            if lo < hi:
+                yield ts[lo:hi], mm["value"][lo:hi]
+
+    def read(self, column: str, zone: str, start: int, end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(ts int64, valeurs float32) concaténés sur la plage (une seule copie)."""
+        parts = list(self.segments(column, zone, start, end))
+        if not parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if len(parts) == 1:
+            return parts[0][0].astype(np.int64), np.asarray(parts[0][1])
+        return (np.concatenate([p[0] for p in parts]).astype(np.int64),
+                np.concatenate([p[1] for p in parts]))
+
+    def zones(self, column: str) -> List[str]:
+        """Zones archivées pour une colonne (hors "all")."""
+        try:
+            return sorted(z for z in os.listdir(os.path.join(self.root, column)) if z != ALL)
+        except OSError:
+            return []
+
+    def months(self, column: str, zone: str) -> List[str]:
+        """Mois (AAAA-MM) archivés pour une colonne et une zone, triés."""
+        try:
+            names = os.listdir(os.path.join(self.root, column, _safe_zone(zone)))
+        except OSError:
+            return []
+        return sorted(n[:-4] for n in names if n.endswith(".bin"))
+
+    def stats(self) -> Dict[str, object]:
+        manifest = self._load_manifest()
+        counts = manifest["counts"]
+        return {
+            "dir": self.root,
+            "updated_at": manifest["updated_at"],
+            "files": len(counts),
+            "records": sum(counts.values()),
+            "bytes": sum(counts.values()) * RECORD.itemsize,
+        }
+
+    # ---------- Alimentation ----------
+
+    def _load_manifest(self) -> Dict[str, object]:
+        try:
+            with open(os.path.join(self.root, MANIFEST), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"format": FORMAT, "updated_at": "", "counts": {}}
+
+    def _reset(self) -> Dict[str, object]:
+        """Efface une archive d'un ancien format ; retourne un manifest vide."""
+        for column in COLUMNS:
+            shutil.rmtree(os.path.join(self.root, column), ignore_errors=True)
+        with self._lock:
+            self._maps.clear()
+        manifest = {"format": FORMAT, "updated_at": "", "counts": {}}
+        self._save_manifest(manifest)
+        return manifest
+
+    def _save_manifest(self, manifest: Dict[str, object]) -> None:
+        path = os.path.join(self.root, MANIFEST)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _repair(self, counts: Dict[str, int]) -> None:
+        """Retire un enregistrement partiel en fin de fichier (écriture interrompue)."""
+        for rel in counts:
+            path = os.path.join(self.root, rel)
+            if os.path.exists(path) and os.path.getsize(path) % RECORD.itemsize:
+                with open(path, "r+b") as f:
+                    f.truncate(os.path.getsize(path) // RECORD.itemsize * RECORD.itemsize)
+
+    def _upsert(self, rel: str, records: np.ndarray) -> int:
+        """Écrit des enregistrements triés (ts uniques), en remplaçant ceux de même ts ; retourne le nombre d'enregistrements."""
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        count = os.path.getsize(path) // RECORD.itemsize if os.path.exists(path) else 0
+        last_ts = None
+        if count:
+            with open(path, "rb") as f:
+                f.seek((count - 1) * RECORD.itemsize)
+                last_ts = int(np.frombuffer(f.read(RECORD.itemsize), dtype=RECORD)["ts"][0])
+
+        if last_ts is None or records["ts"][0] > last_ts:
+            with open(path, "ab" if count else "wb") as f:
+                f.write(records.tobytes())
+            return count + len(records)
+
+        # Intervalles déjà archivés (ou historique plus ancien) : réécriture
+        # triée, le dernier enregistrement d'un même ts (le nouveau) l'emporte
+        existing = np.fromfile(path, dtype=RECORD, count=count)
+        merged = np.concatenate([existing, records])
+        merged = merged[np.argsort(merged["ts"], kind="stable")]
+        merged = merged[np.r_[merged["ts"][1:] != merged["ts"][:-1], True]]
+        tmp = path + ".tmp"
+        merged.tofile(tmp)
+        os.replace(tmp, path)
+        return len(merged)
+
+    def _store(self, groups: Dict[str, np.ndarray], ts: np.ndarray, block: np.ndarray,
+               counts: Dict[str, int]) -> None:
+        """Range les valeurs (lignes x COLUMNS) de chaque zone (masque de lignes) par colonne et par mois."""
+        months = ts.astype("datetime64[s]").astype("datetime64[M]").astype(str)
+        for zone, zone_mask in groups.items():
+            for month in np.unique(months[zone_mask]):
+                mask = zone_mask & (months == month)
+                for i, column in enumerate(COLUMNS):
+                    values = block[:, i]
+                    keep = mask & ~np.isnan(values)
+                    if not keep.any():
+                        continue
+                    records = np.empty(int(keep.sum()), dtype=RECORD)
+                    records["ts"] = ts[keep]
+                    records["value"] = values[keep]
+                    records = records[np.argsort(records["ts"], kind="stable")]
+                    rel = self._rel(column, zone, month)
+                    counts[rel] = self._upsert(rel, records)
+
+    def sync(self, db_path: str = DB_PATH, batch: int = SYNC_BATCH) -> int:
+        """Archive les lignes fusionnées modifiées depuis la dernière synchro. Retourne le nombre de lignes lues."""
+        with self._sync_lock:
+            return self._sync(db_path, batch)
+
+    def _sync(self, db_path: str, batch: int) -> int:
+        os.makedirs(self.root, exist_ok=True)
+        manifest = self._load_manifest()
+        if manifest.get("format") != FORMAT:
+            print("♻️ Archive: ancien format (mesures brutes), reconstruction depuis air_quality_fused")
+            manifest = self._reset()
+        counts: Dict[str, int] = manifest["counts"]
+        self._repair(counts)
+        # Lignes fusionnées encore en file d'écriture
+        flush_all()
+
+        conn = get_db_connection(db_path)
+        try:
+            total = 0
+            since = _since(manifest["updated_at"])
+            key: Tuple[str, str, int] = (since, "", -1)
+            while True:
+                rows = conn.execute(f'''
+                    SELECT zone, ts, updated_at, {", ".join(COLUMNS)}
+                    FROM air_quality_fused
+                    WHERE updated_at >= ? AND (updated_at, zone, ts) > (?, ?, ?)
+                    ORDER BY updated_at, zone, ts
+                    LIMIT ?
+                ''', (since, *key, batch)).fetchall()
+                if not rows:
+                    break
+
+                zones = np.array([r[0] or DEFAULT_ZONE for r in rows], dtype=object)
+                ts = np.array([r[1] for r in rows], dtype=np.int64)
+                block = np.array([tuple(r)[3:] for r in rows], dtype=np.float64)  # None -> NaN
+                self._store({zone: zones == zone for zone in set(zones.tolist())}, ts, block, counts)
+
+                # "all" : moyenne des zones des intervalles touchés par le lot
+                agg = conn.execute(f'''
+                    SELECT ts, {", ".join(f"AVG({c})" for c in COLUMNS)}
+                    FROM air_quality_fused
+                    WHERE ts >= ? AND ts <= ?
+                    GROUP BY ts
+                    ORDER BY ts
+                ''', (int(ts.min()), int(ts.max()))).fetchall()
+                agg_block = np.array([tuple(r) for r in agg], dtype=np.float64)
+                agg_ts = agg_block[:, 0].astype(np.int64)
+                self._store({ALL: np.isin(agg_ts, ts)}, agg_ts, agg_block[:, 1:], counts)
+
+                last = rows[-1]
+                key = (last[2], last[0], last[1])
+                manifest["updated_at"] = last[2]
+                self._save_manifest(manifest)
+                total += len(rows)
+            return total
+        finally:
+            conn.close()
+
+
+archive = ColumnarArchive()
+
+
+def sync_archive(db_path: str = DB_PATH) -> int:
+    """Synchronise l'archive de la base et logge le résultat."""
+    target = archive if db_path == DB_PATH else ColumnarArchive(archive_dir_for(db_path))
+    t0 = time.time()
+    n = target.sync(db_path)
+    if n:
+        print(f"🗄️ Archive colonnaire: {n} lignes archivées en {time.time() - t0:.1f}s")
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive colonnaire (memory-map) de l'historique air_quality_fused")
+    parser.add_argument("command", choices=("sync", "stats"))
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dir", default=None, help="répertoire de l'archive (défaut : selon --db)")
+    parser.add_argument("--batch", type=int, default=SYNC_BATCH, help="lignes lues par lot")
+    args = parser.parse_args(argv)
+
+    target = ColumnarArchive(args.dir or archive_dir_for(args.db))
+    if args.command == "sync":
+        t0 = time.time()
+        n = target.sync(args.db, max(1, args.batch))
+        print(f"✅ {n} lignes archivées en {time.time() - t0:.1f}s")
+    stats = target.stats()
+    print(f"📦 {stats['dir']}: {stats['files']} fichiers, {stats['records']:,} enregistrements "
+          f"({stats['bytes'] / 1e6:.1f} Mo), modifié jusqu'à {stats['updated_at'] or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
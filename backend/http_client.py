@@ -0,0 +1,228 @@
+# backend/http_client.py
+"""
+Client HTTP partagé pour les API externes (OpenWeather, AQICN).
+
+- Une session requests par processus (keep-alive, pool de connexions).
+- Cache mémoire des réponses JSON (LRU) qui respecte Cache-Control
+  (max-age, no-store, no-cache) ; à défaut, le TTL par défaut du fournisseur.
+  Une entrée périmée avec ETag / Last-Modified est revalidée par une requête
+  conditionnelle (304 -> pas de corps à retélécharger).
+- Un disjoncteur par fournisseur : après UPSTREAM_FAILURES échecs consécutifs,
+  le fournisseur n'est plus appelé pendant UPSTREAM_RESET_AFTER secondes et
+  la dernière valeur connue est servie immédiatement.
+- Les appels concurrents identiques partagent une seule requête (SingleFlight).
+
+Env:
+  UPSTREAM_CONNECT_TIMEOUT   secondes (défaut 3)
+  UPSTREAM_READ_TIMEOUT      secondes (défaut 10)
+  UPSTREAM_FAILURES          échecs avant ouverture du disjoncteur (défaut 3)
+  UPSTREAM_RESET_AFTER       durée d'ouverture, en secondes (défaut 60)
+  UPSTREAM_CACHE_SIZE        entrées max du cache (défaut 256)
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from rate_limit import SingleFlight
+
+
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "10"))
+FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_FAILURES", "3"))
+RESET_AFTER = float(os.getenv("UPSTREAM_RESET_AFTER", "60"))
+CACHE_SIZE = int(os.getenv("UPSTREAM_CACHE_SIZE", "256"))
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class UpstreamUnavailable(Exception):
+    """Fournisseur en échec (ou disjoncteur ouvert) et aucune valeur connue."""
+
+
+class CircuitBreaker:
+    """closed -> open après N échecs -> half-open (un seul essai) -> closed."""
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_after: float = RESET_AFTER):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class _Entry:
+    __slots__ = ("body", "etag", "last_modified", "expires")
+
+    def __init__(self, body: Any, etag: Optional[str], last_modified: Optional[str], expires: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+
+class ResponseCache:
+    """LRU des réponses JSON : clé -> corps + validateurs + expiration."""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._data: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, entry: _Entry) -> None:
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+
+class UpstreamClient:
+    def __init__(self):
+        self.cache = ResponseCache()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._flight = SingleFlight()
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    # requests chargé au premier appel externe (démarrage à froid)
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker()
+            return self._breakers[provider]
+
+    @staticmethod
+    def _expires(cache_control: str, default_ttl: float, now: float) -> Optional[float]:
+        """Date d'expiration, ou None si la réponse ne doit pas être gardée."""
+        cc = cache_control.lower()
+        if "no-store" in cc:
+            return None
+        if "no-cache" in cc:
+            return now
+        m = _MAX_AGE.search(cc)
+        return now + (int(m.group(1)) if m else default_ttl)
+
+    def get_json(self, provider: str, url: str, params: Optional[Dict[str, Any]] = None,
+                 default_ttl: float = 600) -> Any:
+        """
+        GET JSON via le cache et le disjoncteur du fournisseur.
+
+        Retourne la réponse fraîche, sinon la dernière valeur connue ;
+        lève UpstreamUnavailable si le fournisseur est en échec sans valeur connue.
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        entry = self.cache.get(key)
+        if entry is not None and entry.expires > time.time():
+            return entry.body
+
+        breaker = self.breaker(provider)
+        if not breaker.allow():
+            if entry is not None:
+                return entry.body
+            raise UpstreamUnavailable(f"{provider}: disjoncteur ouvert")
+
+        return self._flight.do(key, lambda: self._fetch(provider, key, url, params, default_ttl, entry, breaker))
+
+    def _fetch(self, provider: str, key: Tuple, url: str, params: Optional[Dict[str, Any]],
+               default_ttl: float, entry: Optional[_Entry], breaker: CircuitBreaker) -> Any:
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        try:
+            r = self._get_session().get(url, params=params, headers=headers,
+                                        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            if r.status_code == 304 and entry is not None:
+                body = entry.body
+            else:
+                r.raise_for_status()
+                body = r.json()
+        except Exception as e:
+            breaker.failure()
+            # Pas d'URL dans le log : elle peut contenir la clé d'API
+            print(f"⚠️ {provider} indisponible ({type(e).__name__}), état: {breaker.state}")
+            if entry is not None:
+                return entry.body
+            raise UpstreamUnavailable(f"{provider}: {type(e).__name__}") from e
+
+        breaker.success()
+        now = time.time()
+        expires = self._expires(r.headers.get("Cache-Control", ""), default_ttl, now)
+        if expires is not None:
+            self.cache.put(key, _Entry(
+                body,
+                r.headers.get("ETag") or (entry.etag if entry else None),
+                r.headers.get("Last-Modified") or (entry.last_modified if entry else None),
+                expires,
+            ))
+        return body
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """État des disjoncteurs, par fournisseur."""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: {"state": b.state, "failures": b.failures} for name, b in breakers.items()}
+
+
+upstream = UpstreamClient()
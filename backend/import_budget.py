@@ -0,0 +1,117 @@
+# backend/import_budget.py
+"""
+Contrôle du démarrage à froid du backend (spin-down Render free tier).
+
+Lance `import app` dans un interpréteur neuf puis une première requête
+/healthz, et échoue (code retour 1) si :
+  - le temps d'import dépasse IMPORT_BUDGET_MS,
+  - une bibliothèque lourde est chargée dès le démarrage (elle doit l'être
+    au premier usage : numpy, requests, pandas, reportlab, fpdf, sklearn).
+
+Le préchargement en arrière-plan (_warm_up d'app.py : fenêtre chaude,
+fusion, corrélations, qui importe numpy) est coupé dans la sonde
+(WARM_UP=false) : le contrôle ne dépend pas du moment où ce thread tourne.
+
+Usage :
+  python import_budget.py [--budget-ms 600] [--top 15]
+
+Même contrôle dans la suite de tests : tests/test_cold_start.py.
+
+--top affiche les modules les plus coûteux (python -X importtime).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "600"))
+
+HEAVY_MODULES = ("numpy", "requests", "pandas", "reportlab", "fpdf", "sklearn", "joblib")
+
+_PROBE = f"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.app.test_client().get("/healthz")
+t2 = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (t1 - t0) * 1000,
+    "healthz_ms": (t2 - t1) * 1000,
+    "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def _env(tmp_dir):
+    env = dict(os.environ)
+    env.setdefault("DATABASE_PATH", os.path.join(tmp_dir, "smartcity.db"))
+    env["ENABLE_AUTO_COLLECTE"] = "false"
+    env["WARM_UP"] = "false"
+    return env
+
+
+def probe(env):
+    """Mesure `import app` + premier /healthz dans un interpréteur neuf (CalledProcessError si l'import échoue)."""
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _top_imports(env, n):
+    """Modules les plus coûteux (temps cumulé, en ms) d'après -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Budget de démarrage à froid du backend")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=0, help="afficher les N imports les plus lents")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = _env(tmp_dir)
+        try:
+            result = probe(env)
+        except subprocess.CalledProcessError as e:
+            print(e.stderr)
+            print("❌ import app a échoué")
+            return 1
+
+        if args.top:
+            for ms, name in _top_imports(env, args.top):
+                print(f"   {ms:8.1f} ms  {name}")
+
+    print(f"⏱️ import app: {result['import_ms']:.0f} ms (budget {args.budget_ms:.0f} ms), "
+          f"premier /healthz: {result['healthz_ms']:.0f} ms")
+
+    ok = True
+    if result["import_ms"] > args.budget_ms:
+        print("❌ Budget d'import dépassé")
+        ok = False
+    if result["heavy"]:
+        print(f"❌ Bibliothèques lourdes chargées au démarrage: {', '.join(result['heavy'])}")
+        ok = False
+    if ok:
+        print("✅ Démarrage à froid dans le budget")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,56 @@
 # backend/init_db.py
 import sqlite3
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+
+from write_buffer import flush_all, write
+
+# Zone des mesures "ville" (collecteurs, historique sans zone)
+DEFAULT_ZONE = os.getenv("DEFAULT_ZONE", "centre")
+
+# Mesures d'air_quality contrôlées à l'ingestion
+AIR_QUALITY_MEASURES = ('aqi', 'pm25', 'pm10', 'no2', 'o3', 'so2', 'co', 'temperature', 'humidity', 'wind_speed')
 
 def init_database(db_path="/tmp/smartcity.db"):
     """
-    Initialise la base de données SQLite avec toutes les tables nécessaires.
-    Cette fonction crée les tables si elles n'existent pas déjà.
+    Met la base SQLite au niveau du schéma courant.
+
+    La version du schéma est stockée dans PRAGMA user_version : seules les
+    migrations en attente sont appliquées, et si la base est à jour le coût
+    se limite à la lecture de ce pragma (aucun CREATE, aucun COUNT(*)).
     """
-    print(f"📦 Initialisation de la base de données: {db_path}")
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    target = len(MIGRATIONS)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= target:
+        conn.close()
+        return db_path
     
-    conn = sqlite3.connect(db_path)
+    print(f"📦 Migration de la base de données {db_path}: v{version} -> v{target}")
     cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        # Un autre worker a pu migrer pendant l'attente du verrou
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, (description, migrate) in enumerate(MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            migrate(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            print(f"   ✅ v{number}: {description}")
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
     
+    return db_path
+
+
+def _migration_001_initial_schema(cursor):
+    """Tables et index d'origine (IF NOT EXISTS : bases créées avant les versions)"""
     # Table 1: air_quality - Données de qualité de l'air collectées
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS air_quality (
@@ -124,21 +162,255 @@ def init_database(db_path="/tmp/smartcity.db"):
             error_message TEXT
         )
     ''')
-    
-    conn.commit()
-    
-    # Vérifier que toutes les tables sont créées
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = cursor.fetchall()
-    
-    print(f"✅ Base de données initialisée avec {len(tables)} tables:")
-    for table in tables:
-        cursor.execute(f"SELECT COUNT(*) FROM {table[0]}")
-        count = cursor.fetchone()[0]
-        print(f"   - {table[0]}: {count} enregistrements")
-    
+
+
+def _migration_002_iot_sensor_index(cursor):
+    """Dernière mesure par capteur (chargement du registre)"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_iot_data_sensor
+        ON iot_data(sensor_id, id)
+    ''')
+
+
+def _migrate_air_quality_epoch_schema(cursor):
+    """
+    Ajoute ts (epoch en secondes, INTEGER) et zone à air_quality.
+
+    Partie rapide de la migration (ALTER + index + trigger). Le remplissage
+    des lignes existantes se fait en ligne, par lots : backfill_air_quality_epoch.
+    La colonne texte timestamp reste écrite et lisible.
+    """
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(air_quality)")}
+    if 'ts' not in columns:
+        cursor.execute("ALTER TABLE air_quality ADD COLUMN ts INTEGER")
+    if 'zone' not in columns:
+        cursor.execute("ALTER TABLE air_quality ADD COLUMN zone TEXT")
+
+    # Requêtes par zone et par plage de temps : recherche d'index sur des entiers
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_air_quality_zone_ts
+        ON air_quality(zone, ts)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_air_quality_ts
+        ON air_quality(ts)
+    ''')
+
+    # Les écrivains qui ne renseignent que timestamp restent cohérents
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_air_quality_ts
+        AFTER INSERT ON air_quality
+        WHEN NEW.ts IS NULL OR NEW.zone IS NULL
+        BEGIN
+            UPDATE air_quality
+            SET ts = COALESCE(NEW.ts, CAST(strftime('%s', NEW.timestamp) AS INTEGER)),
+                zone = COALESCE(NEW.zone, '{DEFAULT_ZONE}')
+            WHERE id = NEW.id;
+        END
+    ''')
+
+
+def _migration_004_backfill_checkpoints(cursor):
+    """Reprise des imports d'historique (backfill_history.py)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            file TEXT PRIMARY KEY,
+            records INTEGER NOT NULL DEFAULT 0,
+            inserted INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _migration_005_zone_snapshot(cursor):
+    """État courant par zone pour /api/snapshot (services.snapshot_store)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS zone_snapshot (
+            zone TEXT PRIMARY KEY,
+            ts INTEGER,
+            timestamp TEXT,
+            source TEXT,
+            measures TEXT,
+            alerts TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _migration_006_quality_flags(cursor):
+    """Drapeaux de qualité des mesures (services.anomaly)"""
+    for table in ("air_quality", "iot_data"):
+        columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if 'quality' not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN quality TEXT")
+
+
+def _migration_007_air_quality_fused(cursor):
+    """Ligne canonique par zone et intervalle, fusion des sources (services.fusion)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS air_quality_fused (
+            zone TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            aqi REAL,
+            pm25 REAL,
+            pm10 REAL,
+            no2 REAL,
+            o3 REAL,
+            so2 REAL,
+            co REAL,
+            temperature REAL,
+            humidity REAL,
+            wind_speed REAL,
+            last_ts INTEGER,
+            sources TEXT,
+            n_sources INTEGER,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (zone, ts)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_air_quality_fused_ts
+        ON air_quality_fused(ts)
+    ''')
+
+
+def _migration_008_mobility(cursor):
+    """Séries de mobilité par zone, brutes et agrégées par heure (services.mobility_pipeline)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mobility (
+            zone TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            traffic_index INTEGER,
+            pt_load INTEGER,
+            incidents INTEGER,
+            PRIMARY KEY (zone, ts)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mobility_hourly (
+            zone TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            traffic_avg REAL,
+            traffic_max INTEGER,
+            pt_load_avg REAL,
+            incidents INTEGER,
+            samples INTEGER,
+            PRIMARY KEY (zone, ts)
+        )
+    ''')
+
+
+def _migration_009_correlation_stats(cursor):
+    """Co-moments par zone / polluant / facteur / décalage (services.correlations)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS correlation_stats (
+            zone TEXT NOT NULL,
+            target TEXT NOT NULL,
+            driver TEXT NOT NULL,
+            lag INTEGER NOT NULL,
+            n REAL,
+            mean_x REAL,
+            mean_y REAL,
+            m2_x REAL,
+            m2_y REAL,
+            c_xy REAL,
+            exact_until INTEGER,
+            recomputed_at INTEGER,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (zone, target, driver, lag)
+        )
+    ''')
+
+
+def _migration_010_prediction_bounds(cursor):
+    """Bornes de l'intervalle de prévision (services.forecast)"""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(predictions)")}
+    for column in ("lower_bound", "upper_bound"):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE predictions ADD COLUMN {column} REAL")
+
+
+def _migration_011_refuse_aqicn_units(cursor):
+    """Lignes fusionnées calculées avec les sous-indices AQICN : reconstruites par services.fusion"""
+    cursor.execute("DELETE FROM air_quality_fused")
+    # Snapshot tiré de ces mêmes lignes : reconstruit après la fusion (SnapshotStore._rebuild)
+    cursor.execute("DELETE FROM zone_snapshot")
+
+
+def _migration_012_fused_updated_index(cursor):
+    """Synchro de l'archive colonnaire par updated_at (columnar_archive)"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_air_quality_fused_updated
+        ON air_quality_fused(updated_at, zone, ts)
+    ''')
+
+
+def _migration_013_correlations_from_fused(cursor):
+    """Co-moments recalculés sur l'archive fusionnée (services.correlations)"""
+    cursor.execute("DELETE FROM correlation_stats")
+
+
+# Migrations versionnées : la position dans la liste est le numéro de version.
+# Ne jamais modifier ni réordonner une migration publiée, seulement en ajouter.
+MIGRATIONS = [
+    ("schéma initial", _migration_001_initial_schema),
+    ("index iot_data(sensor_id, id)", _migration_002_iot_sensor_index),
+    ("air_quality: colonnes ts / zone", _migrate_air_quality_epoch_schema),
+    ("table backfill_checkpoints", _migration_004_backfill_checkpoints),
+    ("table zone_snapshot", _migration_005_zone_snapshot),
+    ("colonnes quality (air_quality, iot_data)", _migration_006_quality_flags),
+    ("table air_quality_fused", _migration_007_air_quality_fused),
+    ("tables mobility / mobility_hourly", _migration_008_mobility),
+    ("table correlation_stats", _migration_009_correlation_stats),
+    ("colonnes predictions.lower_bound / upper_bound", _migration_010_prediction_bounds),
+    ("air_quality_fused: unités AQICN (reconstruction)", _migration_011_refuse_aqicn_units),
+    ("index air_quality_fused(updated_at)", _migration_012_fused_updated_index),
+    ("correlation_stats: recalcul sur la série fusionnée", _migration_013_correlations_from_fused),
+]
+
+
+def backfill_air_quality_epoch(db_path="/tmp/smartcity.db", batch_size=50000, pause=0.05):
+    """
+    Remplit ts / zone des lignes historiques, par petits lots.
+
+    Chaque lot est une transaction courte : l'application continue de lire
+    et d'écrire pendant la migration. Les lignes sont parcourues par id, une
+    seule fois : un timestamp illisible laisse ts à NULL sans bloquer la
+    boucle. Retourne le nombre de lignes migrées.
+    """
+    conn = sqlite3.connect(db_path)
+    total = invalid = 0
+    last_id = 0
+    while True:
+        upper = conn.execute('''
+            SELECT MAX(id) FROM (
+                SELECT id FROM air_quality WHERE ts IS NULL AND id > ? ORDER BY id LIMIT ?
+            )
+        ''', (last_id, batch_size)).fetchone()[0]
+        if upper is None:
+            break
+        cursor = conn.execute('''
+            UPDATE air_quality
+            SET ts = CAST(strftime('%s', timestamp) AS INTEGER),
+                zone = COALESCE(zone, ?)
+            WHERE ts IS NULL AND id > ? AND id <= ?
+        ''', (DEFAULT_ZONE, last_id, upper))
+        skipped = conn.execute(
+            "SELECT COUNT(*) FROM air_quality WHERE ts IS NULL AND id > ? AND id <= ?", (last_id, upper)
+        ).fetchone()[0]
+        conn.commit()
+        total += cursor.rowcount - skipped
+        invalid += skipped
+        last_id = upper
+        time.sleep(pause)
     conn.close()
-    return db_path
+    if total:
+        print(f"✅ Migration ts/zone: {total} lignes historiques migrées")
+    if invalid:
+        print(f"⚠️ Migration ts/zone: {invalid} ligne(s) au timestamp illisible, ts laissé à NULL")
+    return total
 
 
 def get_db_connection(db_path="/tmp/smartcity.db"):
@@ -150,21 +422,68 @@ def get_db_connection(db_path="/tmp/smartcity.db"):
 
 def insert_air_quality_data(data, db_path="/tmp/smartcity.db"):
     """
-    Insère des données de qualité de l'air dans la DB
+    Insère des données de qualité de l'air dans la DB (écriture différée,
+    validée par le thread écrivain avec les autres écritures du moment)
+    
+    Les valeurs aberrantes (services.anomaly) sont écrites à NULL et
+    signalées dans la colonne quality.
+    La ligne fusionnée de la zone (services.fusion), le snapshot et les
+    corrélations (services.correlations) sont mis à jour dans la même écriture.
     
     Args:
         data: dict avec les clés city, aqi, pm25, pm10, etc.
+    
+    Returns:
+        la mesure telle qu'écrite (valeurs en quarantaine à None, aqi calculé)
     """
-    conn = get_db_connection(db_path)
-    cursor = conn.cursor()
+    zone = data.get('zone') or DEFAULT_ZONE
     
-    cursor.execute('''
+    # Contrôle en ligne (état mémoire par source et zone, sans lecture DB)
+    from services.anomaly import detector
+    data, flags, _ = detector.inspect(f"{data.get('source') or '?'}:{zone}", data, AIR_QUALITY_MEASURES)
+    
+    aqi = data.get('aqi')
+    if aqi is None:
+        # AQI absent (ou mis en quarantaine) : calcul depuis les concentrations,
+        # en µg/m³ (sous-indices des sources comme AQICN convertis d'abord)
+        from services.aqi import aqi_value
+        from services.fusion import as_concentrations
+        concentrations = as_concentrations(data.get('source'), data)
+        aqi = aqi_value(**{k: concentrations.get(k) for k in ('pm25', 'pm10', 'no2', 'o3', 'so2', 'co')})
+    
+    # Horodatage pris à l'appel, pas au commit différé
+    now = datetime.now(timezone.utc)
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+    ts = int(now.timestamp())
+    data = {**data, 'aqi': aqi}
+    
+    # Ligne canonique (zone, intervalle) fusionnant les sources, puis état
+    # courant de la zone (snapshot) et corrélations : validés dans la même
+    # transaction
+    from services.correlations import correlations
+    from services.fusion import fusion
+    from services.snapshot_store import snapshot_store
+    derived_ops = []
+    fused = fusion.observe(zone, ts, data.get('source'), data) if fusion.db_path == db_path else None
+    if fused is not None:
+        bucket, fused_row, fusion_ops = fused
+        derived_ops += fusion_ops
+        if snapshot_store.db_path == db_path:
+            derived_ops += snapshot_store.measure_ops(
+                zone, ts, timestamp, {**fused_row, 'source': '+'.join(fused_row['sources'])})
+        if correlations.db_path == db_path:
+            derived_ops += correlations.observe(zone, bucket, fused_row)
+    
+    write(db_path, [('''
         INSERT INTO air_quality 
-        (city, aqi, pm25, pm10, no2, o3, so2, co, temperature, humidity, wind_speed, source, raw_data)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        (timestamp, ts, zone, city, aqi, pm25, pm10, no2, o3, so2, co, temperature, humidity, wind_speed, source, raw_data, quality)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
+        timestamp,
+        ts,
+        zone,
         data.get('city'),
-        data.get('aqi'),
+        aqi,
         data.get('pm25'),
         data.get('pm10'),
         data.get('no2'),
@@ -175,23 +494,33 @@ def insert_air_quality_data(data, db_path="/tmp/smartcity.db"):
         data.get('humidity'),
         data.get('wind_speed'),
         data.get('source'),
-        data.get('raw_data', '')
-    ))
+        data.get('raw_data', ''),
+        ';'.join(flags) or None
+    ), False)] + derived_ops)
     
-    conn.commit()
-    conn.close()
+    # Fenêtre chaude du dashboard (lignes fusionnées, si chargée dans ce processus)
+    from services.hot_window import hot_window
+    if fused is not None and hot_window.db_path == db_path:
+        hot_window.append(zone, bucket, fused_row)
+    
+    return data
 
 
 def insert_alert(alert_data, db_path="/tmp/smartcity.db"):
-    """Insère une alerte dans la DB"""
-    conn = get_db_connection(db_path)
-    cursor = conn.cursor()
+    """Insère une alerte dans la DB (écriture différée) et dans le snapshot de sa zone"""
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
     
-    cursor.execute('''
+    from services.snapshot_store import snapshot_store
+    snapshot_ops = []
+    if snapshot_store.db_path == db_path:
+        snapshot_ops = snapshot_store.alert_ops(alert_data, timestamp)
+    
+    write(db_path, [('''
         INSERT INTO alerts 
-        (title, message, zone, pollutant, value, unit, threshold, critical, people_affected)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        (timestamp, title, message, zone, pollutant, value, unit, threshold, critical, people_affected)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
+        timestamp,
         alert_data.get('title'),
         alert_data.get('message'),
         alert_data.get('zone'),
@@ -201,10 +530,57 @@ def insert_alert(alert_data, db_path="/tmp/smartcity.db"):
         alert_data.get('threshold'),
         alert_data.get('critical', False),
         alert_data.get('people_affected', 0)
-    ))
-    
-    conn.commit()
-    conn.close()
+    ), False)] + snapshot_ops)
+
+
+def insert_iot_readings(readings, db_path="/tmp/smartcity.db", status_changes=()):
+    """
+    Insère un lot de mesures capteurs dans iot_data et met à jour la table
+    sensors (upsert + last_update, + status si changé), en une seule
+    écriture différée (atomique dans le commit groupé).
+
+    Args:
+        readings: liste de dicts avec sensor_id, timestamp (texte UTC),
+                  zone, latitude, longitude, pm25, pm10, temperature, ...,
+                  quality (drapeaux d'anomalie, optionnel)
+        status_changes: liste de (status, sensor_id) à appliquer
+    """
+    ops = [
+        ('''
+            INSERT INTO iot_data
+            (timestamp, sensor_id, pm25, pm10, temperature, humidity, battery_level, quality)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(
+            r.get('timestamp'),
+            r.get('sensor_id'),
+            r.get('pm25'),
+            r.get('pm10'),
+            r.get('temperature'),
+            r.get('humidity'),
+            r.get('battery_level'),
+            r.get('quality')
+        ) for r in readings], True),
+        ('''
+            INSERT INTO sensors (sensor_id, name, zone, latitude, longitude, last_update)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(sensor_id) DO UPDATE SET
+                name = COALESCE(excluded.name, sensors.name),
+                zone = COALESCE(excluded.zone, sensors.zone),
+                latitude = COALESCE(excluded.latitude, sensors.latitude),
+                longitude = COALESCE(excluded.longitude, sensors.longitude),
+                last_update = excluded.last_update
+        ''', [(
+            r.get('sensor_id'),
+            r.get('name'),
+            r.get('zone'),
+            r.get('latitude'),
+            r.get('longitude'),
+            r.get('timestamp')
+        ) for r in readings], True),
+    ]
+    if status_changes:
+        ops.append(("UPDATE sensors SET status = ? WHERE sensor_id = ?", list(status_changes), True))
+    write(db_path, ops)
 
 
 def get_latest_air_quality(limit=10, db_path="/tmp/smartcity.db"):
@@ -214,7 +590,7 @@ def get_latest_air_quality(limit=10, db_path="/tmp/smartcity.db"):
     
     cursor.execute('''
         SELECT * FROM air_quality 
-        ORDER BY timestamp DESC 
+        ORDER BY ts DESC 
         LIMIT ?
     ''', (limit,))
     
@@ -225,17 +601,16 @@ def get_latest_air_quality(limit=10, db_path="/tmp/smartcity.db"):
 
 
 def log_collecte(source, status, records=0, error=None, db_path="/tmp/smartcity.db"):
-    """Enregistre un log de collecte"""
-    conn = get_db_connection(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO collecte_logs (source, status, records_collected, error_message)
-        VALUES (?, ?, ?, ?)
-    ''', (source, status, records, error))
-    
-    conn.commit()
-    conn.close()
+    """Enregistre un log de collecte (écriture différée)"""
+    write(db_path, [('''
+        INSERT INTO collecte_logs (timestamp, source, status, records_collected, error_message)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), source, status, records, error), False)])
+
+
+def flush_writes(timeout=30.0):
+    """Attend que les écritures différées déjà soumises soient en base"""
+    flush_all(timeout)
 
 
 # Initialiser la DB au démarrage du module
@@ -255,6 +630,7 @@ if __name__ == "__main__":
     }
     
     insert_air_quality_data(test_data)
+    flush_writes()
     print("✅ Données de test insérées")
     
     latest = get_latest_air_quality(limit=5)
@@ -5,21 +5,42 @@ IoT simulator for Smart City demo.
 - Every INTERVAL seconds, pushes a measurement to the backend /api/iot/ingest
 - Designed to run as a Render "worker" service.
 
+Load mode (capacity test of the ingest path):
+  python iot_simulator.py --load --sensors 50000 --rate 5000 --batch 200 --duration 60
+
+- N virtual sensors (spread around the zone centres), same _tick signal model
+  with a per-sensor phase
+- batches of readings POSTed to /api/iot/ingest at a target rate (readings/s),
+  with optional jitter, from an asyncio scheduler over a pooled keep-alive session
+- reports achieved throughput, errors, client round-trip latency and
+  server-side latency percentiles (Server-Timing header of the ingest route)
+
 Env:
   API_BASE        e.g. https://<your-backend>.onrender.com
   INTERVAL        seconds, default 900 (15 minutes)
+  IOT_API_KEY     sent as X-API-Key (if set; required by the backend unless
+                  IOT_ALLOW_ANONYMOUS=true)
 """
 from __future__ import annotations
 
+import argparse
+import asyncio
 import os
+import random
+import re
 import time
 import json
 import math
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 import requests
 
+from services.aqi import aqi_value
+from services.zones import ZONES as ZONE_CENTERS
+
 
 API_BASE = os.getenv("API_BASE", "http://localhost:5000").rstrip("/")
 INTERVAL = int(os.getenv("INTERVAL", "900"))
@@ -44,7 +65,7 @@ def _tick(zone: str, t: int) -> Dict[str, Any]:
     no2 = int(_clamp(round((48 + 22 * math.sin(t / 20) + 6 * math.cos(t / 13)) * zf), 5, 240))
     o3 = int(_clamp(round((40 + 15 * math.sin(t / 26) + 4 * math.cos(t / 15)) * zf), 5, 200))
 
-    aqi = int(_clamp(round(pm25 * 1.7), 10, 180))
+    aqi = aqi_value(pm25=pm25, pm10=pm10, no2=no2, o3=o3)
 
     alerts: List[Dict[str, Any]] = []
     if pm25 > 50:
@@ -78,6 +99,7 @@ def _tick(zone: str, t: int) -> Dict[str, Any]:
 
     return {
         "zone": zone,
+        "sensor_id": f"sim-{zone}",
         "kpis": {
             "pm25": pm25,
             "pm10": pm10,
@@ -95,12 +117,13 @@ def _tick(zone: str, t: int) -> Dict[str, Any]:
 
 def main() -> None:
     print(f"[iot] starting — API_BASE={API_BASE} INTERVAL={INTERVAL}s")
+    headers = {"X-API-Key": os.getenv("IOT_API_KEY", "")} if os.getenv("IOT_API_KEY") else {}
     tick = 0
     while True:
         for zone in ZONES:
             payload = _tick(zone, tick)
             try:
-                r = requests.post(f"{API_BASE}/api/iot/ingest", json=payload, timeout=15)
+                r = requests.post(f"{API_BASE}/api/iot/ingest", json=payload, headers=headers, timeout=15)
                 print(f"[iot] pushed zone={zone} status={r.status_code}")
             except Exception as e:
                 print(f"[iot] push failed zone={zone}: {e}")
@@ -108,5 +131,181 @@ def main() -> None:
         time.sleep(INTERVAL)
 
 
+# ========================================
+# MODE CHARGE
+# ========================================
+
+_SERVER_TIMING = re.compile(r"dur=([0-9.]+)")
+
+
+def _virtual_reading(index: int, tick: int) -> Dict[str, Any]:
+    """Mesure d'un capteur virtuel : _tick de sa zone, déphasé par capteur."""
+    zone = ZONES[index % len(ZONES)]
+    kpis = _tick(zone, tick + index % 97)["kpis"]
+    center = ZONE_CENTERS[zone]
+    # Position stable par capteur, dans ~2 km autour du centre de la zone
+    rnd = random.Random(index)
+    return {
+        "sensor_id": f"load-{zone}-{index:06d}",
+        "zone": zone,
+        "lat": center["lat"] + rnd.uniform(-0.02, 0.02),
+        "lon": center["lon"] + rnd.uniform(-0.02, 0.02),
+        "pm25": kpis["pm25"],
+        "pm10": kpis["pm10"],
+        "temperature": kpis["temperature"],
+        "humidity": kpis["humidity"],
+        "battery_level": 100 - index % 60,
+    }
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    v = sorted(values)
+
+    def at(q: float) -> float:
+        return round(v[min(len(v) - 1, int(q * len(v)))], 1)
+
+    return {"p50": at(0.50), "p90": at(0.90), "p99": at(0.99), "max": round(v[-1], 1)}
+
+
+class LoadStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sent = 0
+        self.accepted = 0
+        self.statuses: Counter = Counter()
+        self.client_ms: List[float] = []
+        self.server_ms: List[float] = []
+        self.max_lag_ms = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "elapsed_s": round(elapsed, 1),
+            "readings_sent": self.sent,
+            "readings_accepted": self.accepted,
+            "throughput_rps": round(self.accepted / elapsed, 1) if elapsed else 0.0,
+            "requests": dict(self.statuses),
+            "client_latency_ms": _percentiles(self.client_ms),
+            "server_latency_ms": _percentiles(self.server_ms),
+            "max_scheduler_lag_ms": round(self.max_lag_ms, 1),
+        }
+
+
+def _post_batch(session, url: str, headers: Dict[str, str], readings: List[Dict[str, Any]]):
+    """Exécuté dans le pool de threads : (status, ms client, ms serveur, acceptées)."""
+    body = json.dumps({"readings": readings})
+    t0 = time.perf_counter()
+    try:
+        r = session.post(url, data=body, headers=headers, timeout=30)
+    except Exception as e:
+        return type(e).__name__, (time.perf_counter() - t0) * 1000, None, 0
+    client_ms = (time.perf_counter() - t0) * 1000
+    m = _SERVER_TIMING.search(r.headers.get("Server-Timing", ""))
+    accepted = 0
+    if r.status_code == 200:
+        try:
+            accepted = int(r.json().get("received", len(readings)))
+        except ValueError:
+            accepted = len(readings)
+    return r.status_code, client_ms, float(m.group(1)) if m else None, accepted
+
+
+async def run_load(sensors: int, rate: float, batch: int, duration: float,
+                   concurrency: int, jitter: float) -> Dict[str, Any]:
+    """
+    Envoie des lots de `batch` mesures au rythme de `rate` mesures/s pendant
+    `duration` secondes, au plus `concurrency` requêtes en vol.
+    Un passage complet sur les `sensors` capteurs virtuels = un tick du signal.
+    """
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    headers = {"Content-Type": "application/json"}
+    if os.getenv("IOT_API_KEY"):
+        headers["X-API-Key"] = os.getenv("IOT_API_KEY", "")
+    url = f"{API_BASE}/api/iot/ingest"
+
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    slots = asyncio.Semaphore(concurrency)
+    stats = LoadStats()
+    period = batch / rate
+    pending = set()
+
+    async def send(readings: List[Dict[str, Any]]) -> None:
+        try:
+            status, client_ms, server_ms, accepted = await loop.run_in_executor(
+                pool, _post_batch, session, url, headers, readings)
+        finally:
+            slots.release()
+        stats.statuses[str(status)] += 1
+        stats.client_ms.append(client_ms)
+        if server_ms is not None:
+            stats.server_ms.append(server_ms)
+        stats.accepted += accepted
+
+    next_report = stats.started + 5
+    k = 0
+    cursor = 0
+    while True:
+        due = stats.started + k * period
+        if due - stats.started >= duration:
+            break
+        # Jitter : chaque lot part à ±jitter période de son échéance
+        delay = due + random.uniform(-jitter, jitter) * period - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+        stats.max_lag_ms = max(stats.max_lag_ms, (time.perf_counter() - due) * 1000)
+
+        readings = []
+        for _ in range(batch):
+            readings.append(_virtual_reading(cursor % sensors, cursor // sensors))
+            cursor += 1
+        stats.sent += len(readings)
+        task = asyncio.ensure_future(send(readings))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        k += 1
+
+        if time.perf_counter() >= next_report:
+            next_report += 5
+            s = stats.summary()
+            print(f"[load] {s['elapsed_s']}s sent={s['readings_sent']} "
+                  f"accepted={s['readings_accepted']} ({s['throughput_rps']}/s) "
+                  f"server p99={s['server_latency_ms']['p99']}ms")
+
+    if pending:
+        await asyncio.gather(*pending)
+    pool.shutdown()
+    session.close()
+    return stats.summary()
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="IoT simulator / générateur de charge d'ingestion")
+    parser.add_argument("--load", action="store_true", help="mode charge (sinon: simulateur 3 zones)")
+    parser.add_argument("--sensors", type=int, default=10000, help="capteurs virtuels")
+    parser.add_argument("--rate", type=float, default=1000, help="mesures par seconde visées")
+    parser.add_argument("--batch", type=int, default=100, help="mesures par requête")
+    parser.add_argument("--duration", type=float, default=60, help="durée en secondes")
+    parser.add_argument("--concurrency", type=int, default=32, help="requêtes en vol max")
+    parser.add_argument("--jitter", type=float, default=0.2, help="jitter relatif des envois (0..1)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
+    args = _parse_args()
+    if args.load:
+        print(f"[load] {args.sensors} sensors, {args.rate}/s by {args.batch}, "
+              f"{args.duration}s, concurrency={args.concurrency} -> {API_BASE}")
+        result = asyncio.run(run_load(args.sensors, args.rate, max(1, args.batch), args.duration,
+                                      max(1, args.concurrency), min(1.0, max(0.0, args.jitter))))
+        print(json.dumps(result, indent=2))
+    else:
+        main()
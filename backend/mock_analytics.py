@@ -11,6 +11,8 @@ import math
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Tuple
 
+from services.aqi import aqi_value
+
 ZONES = [
     {"id": "all", "label": "Toutes"},
     {"id": "centre", "label": "Centre-ville"},
@@ -146,8 +148,8 @@ def get_dashboard_data(filters: Dict[str, Any]) -> Dict[str, Any]:
     delta_pct = 0.0 if prev == 0 else round(((last - prev) / prev) * 1000) / 10
     delta_str = f"{'+' if delta_pct >= 0 else ''}{delta_pct}% vs précédent"
 
-    aqi_global = int(round(_clamp(last * 1.7, 10, 200)))
-    aqi_prev = int(round(_clamp(prev * 1.7, 10, 200)))
+    aqi_global = aqi_value(pm25=last)
+    aqi_prev = aqi_value(pm25=prev)
     aqi_delta_pct = 0.0 if aqi_prev == 0 else round(((aqi_global - aqi_prev) / aqi_prev) * 1000) / 10
     aqi_delta_str = f"{'+' if aqi_delta_pct >= 0 else ''}{aqi_delta_pct}% vs précédent"
 
@@ -0,0 +1,137 @@
+# backend/rate_limit.py
+"""
+Protection des routes coûteuses (dashboard, rapports, exports).
+
+- RateLimiter : un token bucket par client (sujet JWT, sinon IP). Un client
+  bruyant vide son propre bucket sans pénaliser les autres.
+- SingleFlight : les requêtes identiques simultanées partagent un seul calcul
+  (le premier calcule, les autres attendent son résultat).
+
+Env:
+  HEAVY_RATE_PER_MIN   jetons rechargés par minute et par client (défaut 60)
+  HEAVY_BURST          taille du bucket (défaut 20)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from flask import g, jsonify, request
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """Token bucket par client, borné à max_clients buckets (LRU)."""
+
+    def __init__(self, rate_per_sec: float, burst: int, max_clients: int = 10000):
+        self.rate = rate_per_sec
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """Consomme `cost` jetons. Retourne (autorisé, secondes avant réessai)."""
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = _Bucket(float(self.burst), now)
+                self._buckets[key] = b
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                b.tokens = min(self.burst, b.tokens + (now - b.updated) * self.rate)
+                b.updated = now
+                self._buckets.move_to_end(key)
+
+            if b.tokens >= cost:
+                b.tokens -= cost
+                return True, 0.0
+            return False, (cost - b.tokens) / self.rate
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Coalescence des appels concurrents ayant la même clé."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+def client_key() -> str:
+    """Identifiant du client : sujet JWT si authentifié, sinon IP d'origine."""
+    claims = getattr(g, "claims", None)
+    if claims and claims.get("sub"):
+        return f"sub:{claims['sub']}"
+    forwarded = request.headers.get("X-Forwarded-For", "")
+    ip = forwarded.split(",")[0].strip() or request.remote_addr or "unknown"
+    return f"ip:{ip}"
+
+
+# Bucket partagé par toutes les routes lourdes
+heavy_limiter = RateLimiter(
+    rate_per_sec=int(os.getenv("HEAVY_RATE_PER_MIN", "60")) / 60.0,
+    burst=int(os.getenv("HEAVY_BURST", "20")),
+)
+
+
+def rate_limited(limiter: RateLimiter = heavy_limiter, cost: float = 1.0):
+    """Décorateur de route : 429 + Retry-After quand le bucket du client est vide."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            ok, retry_after = limiter.allow(client_key(), cost)
+            if not ok:
+                response = jsonify({"error": "Too many requests"})
+                response.status_code = 429
+                response.headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
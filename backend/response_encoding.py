@@ -0,0 +1,105 @@
+# backend/response_encoding.py
+"""
+Encodage compact des réponses de l'API.
+
+- Sérialisation JSON rapide via orjson (si installé, sinon json standard).
+- Forme "colonnes" optionnelle pour les séries : au lieu de répéter les clés
+  t / PM25 / PM10 ... sur chaque point, on renvoie {"t": [...], "PM25": [...]}.
+  Négociée par ?shape=columnar ou Accept: application/vnd.smartcity.columnar+json.
+- Compression gzip / brotli des réponses au-delà d'un seuil de taille.
+
+Env:
+  COMPRESS_MIN_SIZE   taille minimale (octets) avant compression (défaut 1024)
+"""
+from __future__ import annotations
+
+import gzip
+import os
+from typing import Any, Dict, List
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+COLUMNAR_MIMETYPE = "application/vnd.smartcity.columnar+json"
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/csv", "text/plain", "image/svg+xml"}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Provider JSON Flask basé sur orjson quand il est disponible."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if not ORJSON_AVAILABLE or kwargs.get("indent"):
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS).decode()
+
+    def response(self, *args: Any, **kwargs: Any):
+        if not ORJSON_AVAILABLE or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def wants_columnar() -> bool:
+    """Le client a-t-il demandé la forme colonnes ?"""
+    shape = request.args.get("shape", "").lower()
+    if shape:
+        return shape == "columnar"
+    return COLUMNAR_MIMETYPE in request.headers.get("Accept", "")
+
+
+def to_columnar(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """[{"t": a, "PM25": 1}, ...] -> {"t": [a, ...], "PM25": [1, ...]}"""
+    if not rows:
+        return {}
+    keys = list(rows[0].keys())
+    return {k: [row.get(k) for row in rows] for k in keys}
+
+
+def _compress(response):
+    if (
+        response.direct_passthrough
+        or not 200 <= response.status_code < 300
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    accepted = request.accept_encodings
+    if BROTLI_AVAILABLE and accepted["br"]:
+        body, encoding = brotli.compress(data, quality=5), "br"
+    elif accepted["gzip"]:
+        body, encoding = gzip.compress(data, compresslevel=6), "gzip"
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_response_encoding(app) -> None:
+    """Installe le provider JSON rapide et la compression des réponses."""
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
+    app.after_request(_compress)
@@ -1,11 +1,18 @@
 # backend/routes/dashboard.py
 from __future__ import annotations
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, make_response, request
 from datetime import datetime, timezone, timedelta
 import math
 import os
 import random
+import time
+
+from rate_limit import SingleFlight, rate_limited
+from response_encoding import to_columnar, wants_columnar
+from services.aggregates import dashboard_aggregates
+from services.downsampling import DEFAULT_MAX_POINTS, lttb_indices, parse_max_points
+from services.sensor_registry import registry as sensor_registry
 
 # Importer les fonctions de base de données
 try:
@@ -18,6 +25,9 @@ except ImportError:
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
+# Requêtes /api/dashboard identiques et simultanées -> un seul calcul
+_dashboard_flight = SingleFlight()
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -57,76 +67,6 @@ def _aqi_label(aqi: int):
     return {"label": "Très mauvais", "tone": "danger"}
 
 
-def _get_real_data_from_db():
-    """Récupère les vraies données de la base de données"""
-    db_path = os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
-    
-    try:
-        conn = get_db_connection(db_path)
-        cursor = conn.cursor()
-        
-        # Récupérer les dernières données de qualité de l'air
-        cursor.execute('''
-            SELECT * FROM air_quality 
-            ORDER BY timestamp DESC 
-            LIMIT 1
-        ''')
-        latest = cursor.fetchone()
-        
-        if latest:
-            return dict(latest)
-        
-        conn.close()
-    except Exception as e:
-        print(f"⚠️ Erreur lecture DB: {e}")
-    
-    return None
-
-
-def _get_real_alerts_from_db():
-    """Récupère les vraies alertes de la base de données"""
-    db_path = os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
-    
-    try:
-        conn = get_db_connection(db_path)
-        cursor = conn.cursor()
-        
-        # Récupérer les alertes récentes (dernières 24h)
-        cursor.execute('''
-            SELECT * FROM alerts 
-            WHERE timestamp > datetime('now', '-1 day')
-            ORDER BY timestamp DESC 
-            LIMIT 10
-        ''')
-        alerts_rows = cursor.fetchall()
-        
-        alerts = []
-        for row in alerts_rows:
-            alert = dict(row)
-            # Formater pour le frontend
-            alerts.append({
-                "id": f"alert_{alert['id']}",
-                "title": alert['title'],
-                "message": alert['message'],
-                "zone": alert['zone'],
-                "time": alert['timestamp'].split(' ')[1] if ' ' in alert['timestamp'] else alert['timestamp'],
-                "people": alert.get('people_affected', 0),
-                "pollutant": alert['pollutant'],
-                "value": alert['value'],
-                "unit": alert.get('unit', 'µg/m³'),
-                "threshold": alert['threshold'],
-                "critical": bool(alert['critical']),
-                "read": bool(alert.get('read', False))
-            })
-        
-        conn.close()
-        return alerts
-    except Exception as e:
-        print(f"⚠️ Erreur lecture alertes DB: {e}")
-    
-    return []
-
-
 def _demo_weather(seed: int):
     r = _mulberry32(seed)
     return {
@@ -169,21 +109,21 @@ def _demo_alerts():
 @dashboard_bp.get("/api/snapshot")
 def snapshot():
     """
-    Snapshot avec VRAIES données de la DB si disponibles,
-    sinon données simulées
+    Snapshot avec VRAIES données (état courant matérialisé de la zone,
+    ?zone=..., "all" par défaut) si disponibles, sinon données simulées
     """
+    from services.snapshot_store import snapshot_store
+
+    zone = request.args.get("zone", "all")
     
-    # Essayer de récupérer les vraies données
+    # Lecture en mémoire : coût constant quelle que soit la taille des tables
+    state = snapshot_store.get(zone) if DB_AVAILABLE else None
     real_data = None
-    if DB_AVAILABLE:
-        real_data = _get_real_data_from_db()
-    
-    # Récupérer les vraies alertes
-    alerts = []
-    if DB_AVAILABLE:
-        alerts = _get_real_alerts_from_db()
+    if state and any(v is not None for v in state["measures"].values()):
+        real_data = {**state["measures"], "timestamp": state["timestamp"], "source": state["source"]}
     
-    # Si pas d'alertes réelles, utiliser les démo
+    # Alertes récentes de la zone, sinon les démo
+    alerts = state["alerts"] if state else []
     if not alerts:
         alerts = _demo_alerts()
     
@@ -200,7 +140,7 @@ def snapshot():
             "temperature": int(temperature) if temperature else 20,
             "wind": int(wind) if wind else 10,
             "humidity": int(humidity) if humidity else 60,
-            "sensors": {"active": 3, "total": 3},
+            "sensors": sensor_registry.counts(),
         }
         
         print(f"✅ Snapshot avec VRAIES données - AQI: {aqi}, Source: {real_data.get('source')}")
@@ -209,15 +149,17 @@ def snapshot():
         minute_seed = _hash_string("snapshot|" + datetime.now().strftime("%Y-%m-%d %H:%M"))
         weather = _demo_weather(minute_seed)
         
+        from services.aqi import aqi_value
+        
         pm25 = next((a["value"] for a in alerts if a.get("pollutant") == "PM25"), 40)
-        aqi = int(_clamp(pm25 * 1.6, 10, 180))
+        aqi = aqi_value(pm25=pm25)
         
         kpis = {
             "aqi": aqi,
             "temperature": weather["temperature"],
             "wind": weather["wind"],
             "humidity": weather["humidity"],
-            "sensors": {"active": 3, "total": 3},
+            "sensors": sensor_registry.counts(),
         }
         
         print(f"⚠️ Snapshot avec données SIMULÉES - AQI: {aqi}")
@@ -261,51 +203,62 @@ def _build_time_axis(period: str):
     return out
 
 
-def _get_historical_data_from_db(period: str, pollutant: str):
-    """Récupère les données historiques depuis la DB"""
+def _get_historical_data_from_db(period: str, pollutant: str, max_points: int = DEFAULT_MAX_POINTS, zone: str = "all"):
+    """Récupère l'historique (fenêtre chaude en mémoire, sinon la DB), réduit à max_points par LTTB"""
+    import numpy as np
+    from services.hot_window import hot_window
+
     db_path = os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
     
+    # Calculer la période
+    hours_map = {"1h": 1, "6h": 6, "24h": 24, "7d": 168}
+    hours = hours_map.get(period, 24)
+    
+    # Colonne du polluant demandé (AQI par défaut)
+    column = {"PM25": "pm25", "PM10": "pm10", "NO2": "no2", "O3": "o3"}.get(pollutant, "aqi")
+    since = int(time.time()) - hours * 3600
+    
     try:
-        conn = get_db_connection(db_path)
-        cursor = conn.cursor()
-        
-        # Calculer la période
-        hours_map = {"1h": 1, "6h": 6, "24h": 24, "7d": 168}
-        hours = hours_map.get(period, 24)
-        
-        # Requête pour obtenir les données
-        cursor.execute(f'''
-            SELECT timestamp, aqi, pm25, pm10, no2, o3
-            FROM air_quality
-            WHERE timestamp > datetime('now', '-{hours} hours')
-            ORDER BY timestamp ASC
-        ''', ())
-        
-        rows = cursor.fetchall()
-        conn.close()
+        # Plage couverte par la fenêtre chaude : simple tranche de tableaux
+        window = hot_window.series(zone, column, since) if hot_window.db_path == db_path else None
+        if window is not None:
+            x, values = window
+            ok = ~np.isnan(values) & (values != 0)
+            x, values = x[ok], values[ok]
+        else:
+            # Lignes fusionnées, plage sur ts : recherche d'index (zone, ts) ou (ts)
+            conn = get_db_connection(db_path)
+            where_zone = "AND zone = ?" if zone != "all" else ""
+            params = (since, zone) if zone != "all" else (since,)
+            rows = conn.execute(f'''
+                SELECT ts, {column} AS value
+                FROM air_quality_fused
+                WHERE ts > ? {where_zone}
+                  AND {column} IS NOT NULL AND {column} != 0
+                ORDER BY ts ASC
+            ''', params).fetchall()
+            conn.close()
+            x = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            values = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
         
-        if rows:
-            series = []
-            for row in rows:
-                data = dict(row)
-                # Extraire la valeur du polluant demandé
-                value_map = {
-                    "PM25": data.get('pm25'),
-                    "PM10": data.get('pm10'),
-                    "NO2": data.get('no2'),
-                    "O3": data.get('o3'),
+        if len(x):
+            # Réduction LTTB : la taille du payload ne dépend plus de l'historique
+            if len(x) > max_points:
+                keep = lttb_indices(x, values, max_points)
+            else:
+                keep = range(len(x))
+            
+            series = [
+                {
+                    "t": datetime.fromtimestamp(int(x[i])).strftime("%H:%M"),
+                    "value": int(values[i])
                 }
-                value = value_map.get(pollutant, data.get('aqi'))
-                
-                if value:
-                    series.append({
-                        "t": data['timestamp'].split(' ')[1][:5] if ' ' in data['timestamp'] else data['timestamp'],
-                        "value": int(value)
-                    })
+                for i in keep
+            ]
             
-            if series:
-                print(f"✅ {len(series)} points de données RÉELLES récupérés pour {pollutant}")
-                return series
+            source = "mémoire" if window is not None else "DB"
+            print(f"✅ {len(series)}/{len(x)} points de données RÉELLES ({source}) récupérés pour {pollutant}")
+            return series
         
     except Exception as e:
         print(f"⚠️ Erreur lecture historique DB: {e}")
@@ -313,39 +266,8 @@ def _get_historical_data_from_db(period: str, pollutant: str):
     return None
 
 
-@dashboard_bp.get("/api/dashboard")
-def dashboard():
-    """Dashboard principal avec VRAIES données si disponibles"""
-    period = request.args.get("period", "24h")
-    zone = request.args.get("zone", "all")
-    pollutant = request.args.get("pollutant", "PM25")
-    
-    # Essayer de récupérer les vraies données historiques
-    real_series = None
-    if DB_AVAILABLE:
-        real_series = _get_historical_data_from_db(period, pollutant)
-    
-    # Si on a des vraies données, les utiliser
-    if real_series and len(real_series) > 0:
-        series = real_series
-        print(f"✅ Dashboard avec {len(series)} points RÉELS")
-    else:
-        # Sinon, générer des données simulées (fallback)
-        print(f"⚠️ Dashboard avec données SIMULÉES")
-        seed = _hash_string(f"{period}|{zone}|{pollutant}|{datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        r = _mulberry32(seed)
-        
-        axis = _build_time_axis(period)
-        base = {"PM25": 38, "PM10": 58, "NO2": 50, "O3": 42}.get(pollutant, 35)
-        
-        series = []
-        for idx, t in enumerate(axis):
-            wave = math.sin(idx / 2.2) * 6 + math.cos(idx / 5.5) * 3
-            noise = (r() - 0.5) * 5
-            v = int(_clamp(round(base + wave + noise), 5, 140))
-            series.append({"t": t, "value": v})
-    
-    # Multi-series (simulé pour le moment)
+def _demo_aggregates(period: str, zone: str, series: list) -> dict:
+    """multi / barZones / pie / kpis simulés (DB vide)"""
     axis = _build_time_axis(period)
     seed = _hash_string(f"{period}|{zone}|{datetime.now().strftime('%Y-%m-%d %H:%M')}")
     r = _mulberry32(seed)
@@ -388,8 +310,10 @@ def dashboard():
     delta_pct = 0.0 if prev == 0 else round(((last - prev) / prev) * 1000) / 10
     delta_str = f"{'+' if delta_pct >= 0 else ''}{delta_pct}% vs précédent"
 
-    aqi_global = int(_clamp(last * 1.7, 10, 180))
-    aqi_prev = int(_clamp(prev * 1.7, 10, 180))
+    from services.aqi import aqi_value
+
+    aqi_global = aqi_value(pm25=last)
+    aqi_prev = aqi_value(pm25=prev)
     aqi_delta_pct = 0.0 if aqi_prev == 0 else round(((aqi_global - aqi_prev) / aqi_prev) * 1000) / 10
     aqi_delta_str = f"{'+' if aqi_delta_pct >= 0 else ''}{aqi_delta_pct}% vs précédent"
 
@@ -400,17 +324,263 @@ def dashboard():
         "AQI": {"title": "AQI Global", "value": aqi_global, "unit": "", "delta": aqi_delta_str, "tone": _aqi_label(aqi_global)["tone"]},
     }
 
-    return jsonify({
+    return {"multi": multi, "barZones": barZones, "pie": pie, "kpis": kpis}
+
+
+def _build_dashboard(period: str, zone: str, pollutant: str, max_points: int = DEFAULT_MAX_POINTS) -> dict:
+    """Calcule le payload du dashboard pour un filtre period|zone|pollutant"""
+    # Essayer de récupérer les vraies données historiques
+    real_series = None
+    if DB_AVAILABLE:
+        real_series = _get_historical_data_from_db(period, pollutant, max_points, zone)
+    
+    # Si on a des vraies données, les utiliser
+    if real_series and len(real_series) > 0:
+        series = real_series
+        print(f"✅ Dashboard avec {len(series)} points RÉELS")
+    else:
+        # Sinon, générer des données simulées (fallback)
+        print(f"⚠️ Dashboard avec données SIMULÉES")
+        seed = _hash_string(f"{period}|{zone}|{pollutant}|{datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        r = _mulberry32(seed)
+        
+        axis = _build_time_axis(period)
+        base = {"PM25": 38, "PM10": 58, "NO2": 50, "O3": 42}.get(pollutant, 35)
+        
+        series = []
+        for idx, t in enumerate(axis):
+            wave = math.sin(idx / 2.2) * 6 + math.cos(idx / 5.5) * 3
+            noise = (r() - 0.5) * 5
+            v = int(_clamp(round(base + wave + noise), 5, 140))
+            series.append({"t": t, "value": v})
+    
+    # Agrégats réels (une requête SQL), sinon simulés
+    aggregates = None
+    if DB_AVAILABLE:
+        try:
+            aggregates = dashboard_aggregates(period, zone)
+        except Exception as e:
+            print(f"⚠️ Erreur agrégats DB: {e}")
+
+    if aggregates:
+        aqi = aggregates["kpis"]["AQI"]
+        aqi["tone"] = _aqi_label(aqi["value"])["tone"]
+    else:
+        aggregates = _demo_aggregates(period, zone, series)
+
+    return {
         "period": period,
         "zone": zone,
         "pollutant": pollutant,
         "series": series,
-        "multi": multi,
-        "barZones": barZones,
-        "pie": pie,
-        "kpis": kpis,
+        "multi": aggregates["multi"],
+        "barZones": aggregates["barZones"],
+        "pie": aggregates["pie"],
+        "kpis": aggregates["kpis"],
         "updatedAt": _now_iso(),
-    })
+    }
+
+
+@dashboard_bp.get("/api/dashboard")
+@rate_limited()
+def dashboard():
+    """Dashboard principal avec VRAIES données si disponibles"""
+    period = request.args.get("period", "24h")
+    zone = request.args.get("zone", "all")
+    pollutant = request.args.get("pollutant", "PM25")
+    max_points = parse_max_points(request.args.get("maxPoints"))
+
+    payload = _dashboard_flight.do(
+        (period, zone, pollutant, max_points),
+        lambda: _build_dashboard(period, zone, pollutant, max_points),
+    )
+    if wants_columnar():
+        # Le payload est partagé entre requêtes coalescées : ne pas le modifier
+        payload = {
+            **payload,
+            "shape": "columnar",
+            "series": to_columnar(payload["series"]),
+            "multi": to_columnar(payload["multi"]),
+        }
+    return jsonify(payload)
+
+
+@dashboard_bp.get("/api/dashboard/export")
+@rate_limited()
+def dashboard_export():
+    """Export CSV de la série du dashboard (?period, zone, pollutant, maxPoints)"""
+    period = request.args.get("period", "24h")
+    zone = request.args.get("zone", "all")
+    pollutant = request.args.get("pollutant", "PM25")
+    max_points = parse_max_points(request.args.get("maxPoints"))
+
+    payload = _dashboard_flight.do(
+        (period, zone, pollutant, max_points),
+        lambda: _build_dashboard(period, zone, pollutant, max_points),
+    )
+
+    lines = [f"t,{pollutant}"]
+    lines.extend(f"{p['t']},{p['value']}" for p in payload["series"])
+    response = make_response("\n".join(lines) + "\n")
+    response.mimetype = "text/csv"
+    response.headers["Content-Disposition"] = f'attachment; filename="export_{zone}_{pollutant}_{period}.csv"'
+    return response
+
+
+@dashboard_bp.get("/api/dashboard/trend")
+@rate_limited()
+def dashboard_trend():
+    """Tendance longue (?pollutant, zone, days, maxPoints) lue dans l'archive colonnaire, sinon la DB"""
+    import numpy as np
+    from columnar_archive import archive
+
+    zone = request.args.get("zone", "all")
+    pollutant = request.args.get("pollutant", "PM25")
+    column = {"PM25": "pm25", "PM10": "pm10", "NO2": "no2", "O3": "o3"}.get(pollutant, "aqi")
+    max_points = parse_max_points(request.args.get("maxPoints"))
+    try:
+        days = max(1, min(3650, int(request.args.get("days", 365))))
+    except ValueError:
+        days = 365
+    since = int(time.time()) - days * 86400
+
+    source = "archive"
+    x, values = archive.read(column, zone, since)
+    if not len(x) and DB_AVAILABLE:
+        source = "DB"
+        try:
+            conn = get_db_connection(os.getenv("DATABASE_PATH", "/tmp/smartcity.db"))
+            try:
+                # Même série que l'archive : lignes fusionnées, moyenne des zones pour "all"
+                if zone == "all":
+                    rows = conn.execute(f'''
+                        SELECT ts, AVG({column}) FROM air_quality_fused
+                        WHERE ts > ? AND {column} IS NOT NULL
+                        GROUP BY ts
+                        ORDER BY ts ASC
+                    ''', (since,)).fetchall()
+                else:
+                    rows = conn.execute(f'''
+                        SELECT ts, {column} FROM air_quality_fused
+                        WHERE ts > ? AND zone = ? AND {column} IS NOT NULL
+                        ORDER BY ts ASC
+                    ''', (since, zone)).fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ Erreur lecture tendance DB: {e}")
+            return jsonify({"status": "error", "message": str(e)}), 500
+        x = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+
+    keep = lttb_indices(x, values, max_points) if len(x) > max_points else range(len(x))
+    series = [
+        {"t": datetime.fromtimestamp(int(x[i])).strftime("%Y-%m-%d %H:%M"), "value": round(float(values[i]), 1)}
+        for i in keep
+    ]
+    payload = {
+        "pollutant": pollutant,
+        "zone": zone,
+        "days": days,
+        "source": source,
+        "points": int(len(x)),
+        "series": to_columnar(series) if wants_columnar() else series,
+        "updatedAt": _now_iso(),
+    }
+    if wants_columnar():
+        payload["shape"] = "columnar"
+    return jsonify(payload)
+
+
+@dashboard_bp.get("/api/mobility")
+@rate_limited()
+def mobility():
+    """Séries de mobilité par zone (?period=1h|6h|24h|7d|30d, zone, maxPoints)"""
+    from services.mobility_pipeline import (
+        MOBILITY_ZONES, PERIODS, combine_zones, mobility as pipeline, simulated_series,
+    )
+    from services.zones import ZONES
+
+    period = request.args.get("period", "24h")
+    if period not in PERIODS:
+        period = "24h"
+    zone = request.args.get("zone", "all")
+    max_points = parse_max_points(request.args.get("maxPoints"))
+    zones = MOBILITY_ZONES if zone == "all" else (zone,)
+
+    source = "DB"
+    resolution, series = pipeline.series(period, zones) if DB_AVAILABLE else (None, {})
+    if not series:
+        # Table encore vide (premier échantillonnage pas encore passé)
+        source = "simulation"
+        resolution, series = simulated_series(period, zones)
+    if zone == "all" and series:
+        series = {**series, "all": combine_zones(series)}
+
+    fmt = "%H:%M" if resolution == "raw" else "%d/%m %Hh"
+    columnar = wants_columnar()
+    out = {}
+    for z, (x, traffic, pt_load, incidents) in series.items():
+        keep = lttb_indices(x, traffic, max_points) if len(x) > max_points else range(len(x))
+        points = [
+            {
+                "t": datetime.fromtimestamp(int(x[i])).strftime(fmt),
+                "trafficIndex": int(round(traffic[i])),
+                "publicTransportLoad": int(round(pt_load[i])),
+                "incidentsCount": int(incidents[i]),
+            }
+            for i in keep
+        ]
+        out[z] = {
+            "label": ZONES.get(z, {}).get("label", z),
+            "series": to_columnar(points) if columnar else points,
+        }
+
+    payload = {
+        "period": period,
+        "zone": zone,
+        "resolution": resolution,
+        "source": source,
+        "zones": out,
+        "updatedAt": _now_iso(),
+    }
+    if columnar:
+        payload["shape"] = "columnar"
+    return jsonify(payload)
+
+
+@dashboard_bp.get("/api/analytics/correlations")
+def analytics_correlations():
+    """Corrélations facteurs (vent, humidité, trafic) / polluants (?zone), lues en mémoire"""
+    from services.correlations import correlations
+
+    zone = request.args.get("zone", "all")
+    return jsonify({**correlations.report(zone), "updatedAt": _now_iso()})
+
+
+@dashboard_bp.get("/api/predictions")
+@rate_limited()
+def predictions():
+    """Prévisions AQI par zone avec bandes d'incertitude (?zone, hours)"""
+    from services.forecast import HOURS, forecaster
+
+    zone = request.args.get("zone", "all")
+    try:
+        hours = max(1, min(72, int(request.args.get("hours", HOURS))))
+    except ValueError:
+        hours = HOURS
+
+    try:
+        result = forecaster.latest() if hours == HOURS else None
+        if result is None:
+            # Pas encore de passage planifié (ou échéance non standard) : calcul direct
+            result = forecaster.compute(hours=hours)
+    except Exception as e:
+        print(f"⚠️ Prévisions indisponibles: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 503
+
+    zones = result["zones"] if zone == "all" else {zone: result["zones"].get(zone, [])}
+    return jsonify({**result, "zone": zone, "hours": hours, "zones": zones})
 
 
 @dashboard_bp.get("/api/dashboard/overview")
@@ -1,10 +1,71 @@
+import hmac
+import os
+import time
+
 from flask import Blueprint, jsonify, request
 
+from services.sensor_registry import registry
+from write_buffer import WriteBufferFull
+
 iot_bp = Blueprint("iot", __name__, url_prefix="/api/iot")
 
-# MVP: on accepte la donnée, on renvoie OK.
-# Plus tard: stocker en SQLite.
+# Clé des capteurs (header X-API-Key). Route hors JWT (PUBLIC_PREFIXES) : sans
+# clé configurée, l'ingestion est refusée (503) sauf IOT_ALLOW_ANONYMOUS=true
+# (démo locale).
+IOT_API_KEY = os.getenv("IOT_API_KEY", "")
+IOT_ALLOW_ANONYMOUS = os.getenv("IOT_ALLOW_ANONYMOUS", "false").lower() == "true"
+
+
+def _readings_from_payload(payload):
+    """
+    Accepte :
+    - une mesure capteur {"sensor_id": ..., "pm25": ...}
+    - une liste de mesures, ou {"readings": [...]}
+    - le format du simulateur {"zone": ..., "kpis": {...}, "sensor_id"?: ...}
+    """
+    if isinstance(payload, list):
+        return payload
+    if not isinstance(payload, dict):
+        return []
+    if isinstance(payload.get("readings"), list):
+        return payload["readings"]
+    if isinstance(payload.get("kpis"), dict):
+        zone = payload.get("zone")
+        return [{
+            **payload["kpis"],
+            "sensor_id": payload.get("sensor_id") or f"sim-{zone}",
+            "zone": zone,
+        }]
+    return [payload]
+
+
 @iot_bp.post("/measurements")
+@iot_bp.post("/ingest")
 def ingest():
-    payload = request.get_json(force=True)
-    return jsonify({"ok": True, "received": payload})
+    if not IOT_API_KEY:
+        if not IOT_ALLOW_ANONYMOUS:
+            return jsonify({"error": "Ingestion IoT désactivée : IOT_API_KEY non configurée"}), 503
+    elif not hmac.compare_digest(request.headers.get("X-API-Key", "").encode(), IOT_API_KEY.encode()):
+        return jsonify({"error": "Invalid API key"}), 401
+
+    payload = request.get_json(silent=True)
+    readings = _readings_from_payload(payload)
+    if not readings:
+        return jsonify({"error": "No readings"}), 400
+
+    t0 = time.perf_counter()
+    try:
+        stored = registry.ingest(readings)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except WriteBufferFull:
+        # Backpressure : l'écriture ne suit plus, le capteur réessaiera
+        response = jsonify({"error": "Ingestion saturée, réessayer plus tard"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
+
+    response = jsonify({"ok": True, "received": len(stored)})
+    # Durée de l'ingestion côté serveur (lue par iot_simulator --load)
+    response.headers["Server-Timing"] = f"ingest;dur={(time.perf_counter() - t0) * 1000:.1f}"
+    return response
@@ -0,0 +1,96 @@
+# backend/routes/sensors.py
+from flask import Blueprint, Response, jsonify, request
+
+from services.openweather_service import fetch_weather
+from services.sensor_registry import registry
+from services.zones import ZONES
+
+sensors_bp = Blueprint("sensors", __name__)
+
+
+@sensors_bp.get("/api/sensors/latest")
+def sensors_latest():
+    """Dernière mesure de chaque capteur (cache mémoire, pas de requête SQL)"""
+    return jsonify(registry.latest())
+
+
+@sensors_bp.get("/api/sensors/bbox")
+def sensors_bbox():
+    """
+    Capteurs dans la vue de la carte.
+    ?bbox=ouest,sud,est,nord (format Leaflet toBBoxString)
+    """
+    try:
+        west, south, east, north = (float(x) for x in request.args.get("bbox", "").split(","))
+    except ValueError:
+        return jsonify({"error": "bbox attendu: ouest,sud,est,nord"}), 400
+    return jsonify(registry.in_bbox(south, west, north, east))
+
+
+@sensors_bp.get("/api/sensors/nearest")
+def sensors_nearest():
+    """k capteurs les plus proches de ?lat=&lon= (k=5 par défaut, max 100)"""
+    try:
+        lat = float(request.args["lat"])
+        lon = float(request.args["lon"])
+        k = min(100, max(1, int(request.args.get("k", 5))))
+    except (KeyError, ValueError):
+        return jsonify({"error": "Paramètres lat, lon (et k) requis"}), 400
+    return jsonify(registry.nearest(lat, lon, k))
+
+
+@sensors_bp.get("/api/sensors/status")
+def sensors_status():
+    """Nombre de capteurs actifs / total"""
+    return jsonify(registry.counts())
+
+
+@sensors_bp.get("/api/map/heatmap")
+def map_heatmap():
+    """
+    Grille de pollution interpolée (IDW), en cache par génération d'ingestion.
+    ?pollutant=pm25|pm10 &format=png|bin &w=96 &h=96
+    Emprise et échelle dans les en-têtes X-Heatmap-*.
+    """
+    pollutant = request.args.get("pollutant", "pm25").lower()
+    fmt = request.args.get("format", "png")
+    if pollutant not in ("pm25", "pm10") or fmt not in ("png", "bin"):
+        return jsonify({"error": "pollutant=pm25|pm10, format=png|bin"}), 400
+    try:
+        width = min(256, max(8, int(request.args.get("w", 96))))
+        height = min(256, max(8, int(request.args.get("h", 96))))
+    except ValueError:
+        return jsonify({"error": "w et h doivent être des entiers"}), 400
+
+    # NumPy + IDW chargés à la première carte, pas au démarrage
+    from services.heatmap_service import get_heatmap
+
+    heatmap = get_heatmap(pollutant, width, height, fmt)
+    if heatmap is None:
+        return jsonify({"error": "Aucun capteur actif"}), 404
+
+    meta = heatmap["meta"]
+    response = Response(heatmap["body"], mimetype=heatmap["mimetype"])
+    response.headers["X-Heatmap-Bbox"] = ",".join(str(x) for x in meta["bbox"])
+    response.headers["X-Heatmap-Size"] = f"{meta['width']}x{meta['height']}"
+    response.headers["X-Heatmap-Vmax"] = str(meta["vmax"])
+    response.headers["X-Heatmap-Generation"] = str(meta["generation"])
+    response.headers["Cache-Control"] = "private, max-age=60"
+    return response
+
+
+@sensors_bp.get("/api/weather/current")
+def weather_current():
+    """Météo courante pour une zone (OpenWeather, ou valeurs démo sans clé)"""
+    zone = ZONES.get(request.args.get("zone", "all"), ZONES["all"])
+    try:
+        w = fetch_weather(zone["lat"], zone["lon"])
+    except Exception as e:
+        return jsonify({"error": f"Météo indisponible: {e}"}), 502
+
+    return jsonify({
+        "temperature": w["temp"],
+        "humidity": w["humidity"],
+        "wind_speed": w["wind"],
+        "zone": zone["label"],
+    })
@@ -0,0 +1,190 @@
+# backend/scheduler.py
+"""
+Planificateur des tâches périodiques (collecte par source, archive, ...).
+
+Remplace la boucle `while True: ...; sleep(COLLECTE_INTERVAL)` : chaque tâche
+a sa propre cadence et ne retarde pas les autres.
+
+- Cadence : bibliothèque `schedule` (every(n).seconds), avec une gigue
+  aléatoire de ±jitter sur chaque intervalle (every(a).to(b)) et un premier
+  lancement décalé (first_delay + gigue) pour étaler les démarrages.
+- Exécution : chaque lancement part dans son propre thread ; la boucle du
+  planificateur ne bloque jamais et l'intervalle part du lancement (pas de
+  dérive de la durée d'exécution).
+- Chevauchement : un lancement est sauté tant que l'exécution précédente de
+  la même tâche n'est pas terminée.
+- Timeout : une exécution qui dépasse `timeout` est marquée "timeout" et
+  loggée ; le thread ne peut pas être interrompu, les lancements suivants
+  sont sautés jusqu'à ce qu'il rende la main.
+- Lancements manqués (processus suspendu, boucle en retard) : misfire="coalesce"
+  exécute une seule fois les lancements en retard, misfire="skip" les saute
+  au-delà de `grace` secondes de retard et attend le suivant.
+- État par tâche (dernier lancement, durée, statut, erreurs, prochain
+  lancement) : status(), exposé par GET /scheduler-status.
+
+Usage :
+    from scheduler import scheduler
+    scheduler.register("archive", sync_archive, interval=3600, timeout=600)
+    scheduler.start()
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Job:
+    def __init__(self, name: str, func: Callable[[], Any], interval: float, jitter: float,
+                 timeout: Optional[float], first_delay: float, misfire: str, grace: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.first_delay = first_delay
+        self.misfire = misfire
+        self.grace = grace
+        self.entry = None  # schedule.Job
+        self.thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.timed_out = False
+        self.stats: Dict[str, Any] = {
+            "runs": 0, "failures": 0, "timeouts": 0, "skipped_overlap": 0, "skipped_misfire": 0,
+            "last_start": None, "last_duration": None, "last_status": None, "last_error": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+
+class Scheduler:
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._sched = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, func: Callable[[], Any], interval: float, *, jitter: float = 0.1,
+                 timeout: Optional[float] = None, first_delay: float = 0.0, misfire: str = "coalesce",
+                 grace: Optional[float] = None) -> Job:
+        """
+        Déclare une tâche périodique (avant ou après start()).
+
+        jitter : fraction de l'intervalle (0.1 = ±10 %) ; timeout : durée max
+        en secondes (défaut : l'intervalle) ; misfire : "coalesce" ou "skip" ;
+        grace : retard toléré avant de sauter (défaut : moitié de l'intervalle).
+        """
+        if misfire not in ("coalesce", "skip"):
+            raise ValueError(f"misfire inconnu: {misfire}")
+        job = Job(name, func, interval, jitter, timeout or interval, first_delay, misfire,
+                  interval / 2 if grace is None else grace)
+        with self._lock:
+            if name in self._jobs:
+                raise ValueError(f"tâche déjà enregistrée: {name}")
+            self._jobs[name] = job
+            if self._sched is not None:
+                self._plan(job)
+        return job
+
+    def _plan(self, job: Job) -> None:
+        low = max(1, int(job.interval * (1 - job.jitter)))
+        high = max(low, int(job.interval * (1 + job.jitter)))
+        every = self._sched.every(low)
+        if high > low:
+            every = every.to(high)
+        job.entry = every.seconds.do(self._launch, job)
+        # Premier lancement étalé : first_delay + gigue, pas un intervalle complet
+        delay = job.first_delay + random.uniform(0, job.interval * job.jitter)
+        job.entry.next_run = datetime.fromtimestamp(time.time() + delay)
+
+    def _launch(self, job: Job) -> None:
+        """Appelé par la boucle : décide et lance en thread, sans jamais bloquer."""
+        now = time.time()
+        if job.running:
+            job.stats["skipped_overlap"] += 1
+            return
+        late = now - job.entry.next_run.timestamp()
+        if job.misfire == "skip" and late > job.grace:
+            job.stats["skipped_misfire"] += 1
+            print(f"⏭️ Tâche {job.name}: lancement manqué de {late:.0f}s, sauté")
+            return
+        job.started_at = now
+        job.timed_out = False
+        job.stats["last_start"] = datetime.fromtimestamp(now).isoformat(timespec="seconds")
+        job.thread = threading.Thread(target=self._run, args=(job,), name=f"job:{job.name}", daemon=True)
+        job.thread.start()
+
+    def _run(self, job: Job) -> None:
+        t0 = time.time()
+        status, error = "ok", None
+        try:
+            job.func()
+        except Exception as e:
+            status, error = "error", str(e)
+            job.stats["failures"] += 1
+            print(f"❌ Tâche {job.name}: {e}")
+            traceback.print_exc()
+        duration = time.time() - t0
+        if job.timed_out:
+            status = "timeout"
+        job.stats.update(runs=job.stats["runs"] + 1, last_duration=round(duration, 3),
+                         last_status=status, last_error=error)
+
+    def _watchdog(self) -> None:
+        now = time.time()
+        for job in list(self._jobs.values()):
+            if job.running and not job.timed_out and now - job.started_at > job.timeout:
+                job.timed_out = True
+                job.stats["timeouts"] += 1
+                print(f"⏱️ Tâche {job.name}: dépasse son timeout ({job.timeout:.0f}s), lancements suivants sautés")
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                self._sched.run_pending()
+                idle = self._sched.idle_seconds
+            self._watchdog()
+            self._stop.wait(1.0 if idle is None else min(1.0, max(0.05, idle)))
+
+    def start(self) -> None:
+        """Démarre la boucle du planificateur (thread démon)."""
+        import schedule
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._sched = schedule.Scheduler()
+            for job in self._jobs.values():
+                self._plan(job)
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        out = []
+        for job in list(self._jobs.values()):
+            next_run = job.entry.next_run.isoformat(timespec="seconds") if job.entry is not None else None
+            out.append({
+                "name": job.name,
+                "interval": job.interval,
+                "jitter": job.jitter,
+                "timeout": job.timeout,
+                "misfire": job.misfire,
+                "running": job.running,
+                "running_for": round(now - job.started_at, 1) if job.running else None,
+                "next_run": next_run,
+                **job.stats,
+            })
+        return out
+
+
+scheduler = Scheduler()
@@ -0,0 +1,188 @@
+# backend/services/aggregates.py
+"""
+Agrégats du dashboard calculés en SQL, en un seul passage par requête, sur
+les lignes fusionnées (air_quality_fused : une par zone et intervalle).
+
+Une seule requête GROUP BY (zone, bucket) couvre la fenêtre courante et la
+fenêtre précédente (ou, si les deux tiennent dans la fenêtre chaude en
+mémoire, le même regroupement fait en NumPy sans lire la base). On en déduit :
+- multi    : série multi-polluants (moyenne par bucket, toutes zones)
+- barZones : AQI moyen par zone sur la fenêtre courante
+- pie      : part de chaque polluant dans la fenêtre courante
+- kpis     : moyennes courantes et variation vs fenêtre précédente
+"""
+from __future__ import annotations
+
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from init_db import get_db_connection
+from services.zones import ZONES
+
+
+# période -> (durée de la fenêtre, pas des buckets) en secondes
+PERIODS = {
+    "1h": (3600, 300),
+    "6h": (6 * 3600, 900),
+    "24h": (24 * 3600, 1800),
+    "7d": (7 * 24 * 3600, 24 * 3600),
+}
+
+POLLUTANT_COLUMNS = {"PM25": "pm25", "PM10": "pm10", "NO2": "no2", "O3": "o3"}
+
+# Colonne qui identifie la zone d'une mesure
+ZONE_COLUMN = "zone"
+
+
+def _label(epoch: int, step: int) -> str:
+    return datetime.fromtimestamp(epoch).strftime("%a" if step >= 24 * 3600 else "%H:%M")
+
+
+def _delta_str(cur: Optional[float], prev: Optional[float]) -> str:
+    if not cur or not prev:
+        pct = 0.0
+    else:
+        pct = round(((cur - prev) / prev) * 1000) / 10
+    return f"{'+' if pct >= 0 else ''}{pct}% vs précédent"
+
+
+def _mean(acc: Dict[str, List[float]], key: str) -> Optional[float]:
+    s, n = acc.get(key, (0.0, 0))
+    return s / n if n else None
+
+
+def _add(acc: Dict[str, List[float]], key: str, s: Optional[float], n: int) -> None:
+    if n:
+        cur = acc.setdefault(key, [0.0, 0])
+        cur[0] += s
+        cur[1] += n
+
+
+def _rows_from_db(db_path: str, zone: str, prev_start: int, step: int, columns: List[str]) -> List[Any]:
+    sums = ", ".join(f"SUM({c}) AS s_{c}, COUNT({c}) AS n_{c}" for c in columns)
+    where_zone = f"AND {ZONE_COLUMN} = ?" if zone != "all" else ""
+    params: List[Any] = [prev_start, step, prev_start]
+    if zone != "all":
+        params.append(zone)
+
+    conn = get_db_connection(db_path)
+    rows = conn.execute(f'''
+        SELECT {ZONE_COLUMN} AS zone,
+               (ts - ?) / ? AS b,
+               {sums}
+        FROM air_quality_fused
+        WHERE ts > ? {where_zone}
+        GROUP BY zone, b
+    ''', params).fetchall()
+    conn.close()
+    return rows
+
+
+def _rows_from_window(db_path: str, zone: str, prev_start: int, step: int,
+                      columns: List[str]) -> Optional[List[Dict[str, Any]]]:
+    """Mêmes lignes (zone, b, s_*, n_*) que la requête SQL, depuis la fenêtre chaude."""
+    import numpy as np
+    from services.hot_window import COLUMNS, hot_window
+
+    if hot_window.db_path != db_path:
+        return None
+    zones = hot_window.zones_since(prev_start)
+    if zones is None:
+        return None
+
+    rows = []
+    for z, (ts, values) in zones.items():
+        if (zone != "all" and z != zone) or not len(ts):
+            continue
+        b = (ts - prev_start) // step
+        size = int(b.max()) + 1
+        acc = {}
+        for c in columns:
+            v = values[:, COLUMNS.index(c)]
+            ok = ~np.isnan(v)
+            acc[c] = (np.bincount(b[ok], weights=v[ok], minlength=size),
+                      np.bincount(b[ok], minlength=size))
+        for i in np.nonzero(np.bincount(b, minlength=size))[0]:
+            row: Dict[str, Any] = {"zone": z, "b": int(i)}
+            for c, (s, n) in acc.items():
+                row[f"s_{c}"] = float(s[i]) if n[i] else None
+                row[f"n_{c}"] = int(n[i])
+            rows.append(row)
+    return rows
+
+
+def dashboard_aggregates(period: str, zone: str = "all", db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """multi / barZones / pie / kpis réels, ou None si la fenêtre courante est vide."""
+    db_path = db_path or os.getenv("DATABASE_PATH", "/tmp/smartcity.db")
+    span, step = PERIODS.get(period, PERIODS["24h"])
+    n_buckets = span // step
+
+    now = int(time.time())
+    start = now - span
+    prev_start = start - span
+
+    columns = ["aqi"] + list(POLLUTANT_COLUMNS.values())
+    rows = _rows_from_window(db_path, zone, prev_start, step, columns)
+    if rows is None:
+        rows = _rows_from_db(db_path, zone, prev_start, step, columns)
+
+    cur: Dict[str, List[float]] = {}
+    prev: Dict[str, List[float]] = {}
+    per_bucket: Dict[int, Dict[str, List[float]]] = {}
+    per_zone: Dict[str, Dict[str, List[float]]] = {}
+
+    for row in rows:
+        b = row["b"] - n_buckets
+        if b >= n_buckets:
+            b = n_buckets - 1
+        window = cur if b >= 0 else prev
+        for c in columns:
+            s, n = row[f"s_{c}"], row[f"n_{c}"]
+            _add(window, c, s, n)
+            if b >= 0:
+                _add(per_bucket.setdefault(b, {}), c, s, n)
+                _add(per_zone.setdefault(row["zone"] or "?", {}), c, s, n)
+
+    if not per_bucket:
+        return None
+
+    multi = []
+    for b in range(n_buckets):
+        acc = per_bucket.get(b, {})
+        point: Dict[str, Any] = {"t": _label(start + b * step, step)}
+        for name, c in POLLUTANT_COLUMNS.items():
+            v = _mean(acc, c)
+            point[name] = int(round(v)) if v is not None else None
+        multi.append(point)
+
+    bar_zones = []
+    for z, acc in sorted(per_zone.items()):
+        aqi = _mean(acc, "aqi")
+        if aqi is not None:
+            bar_zones.append({"name": ZONES.get(z, {}).get("label", z), "aqi": int(round(aqi))})
+
+    means = {name: _mean(cur, c) or 0.0 for name, c in POLLUTANT_COLUMNS.items()}
+    total = sum(means.values())
+    pie = [{"name": name, "value": int(round(v / total * 100)) if total else 0} for name, v in means.items()]
+    if total:
+        pie[0]["value"] += 100 - sum(p["value"] for p in pie)
+
+    def kpi(title: str, c: str, unit: str = "µg/m³") -> Dict[str, Any]:
+        v = _mean(cur, c)
+        return {
+            "title": title,
+            "value": int(round(v)) if v is not None else 0,
+            "unit": unit,
+            "delta": _delta_str(v, _mean(prev, c)),
+        }
+
+    kpis = {
+        "PM25": kpi("PM2.5 Moyen", "pm25"),
+        "PM10": kpi("PM10 Moyen", "pm10"),
+        "NO2": kpi("NO2 Moyen", "no2"),
+        "AQI": kpi("AQI Global", "aqi", ""),
+    }
+
+    return {"multi": multi, "barZones": bar_zones, "pie": pie, "kpis": kpis}
@@ -0,0 +1,212 @@
+# backend/services/anomaly.py
+"""
+Détection en ligne des mesures aberrantes et des capteurs défaillants.
+
+Appliquée sur le flux d'ingestion (capteurs IoT, collecte AQICN) avant
+l'écriture, avec un état O(1) par (source, mesure) gardé en mémoire :
+aucune lecture en base par mesure.
+
+Par mesure :
+- hors bornes physiques (ex. PM2.5 < 0, humidité > 100)  -> "range", mise en quarantaine
+- pic : |x - moyenne EWMA| > ANOMALY_Z écarts-types EWMA -> "spike", mise en quarantaine
+  (après ANOMALY_WARMUP mesures ; ANOMALY_SHIFT_AFTER pics consécutifs
+  du même côté sont pris pour un changement de niveau et acceptés)
+- valeur figée : aucune variation de plus de STUCK_EPSILON (par mesure)
+  pendant ANOMALY_STUCK_MINUTES et au moins ANOMALY_STUCK_AFTER mesures
+  -> "stuck" (signalée, pas en quarantaine). Fenêtre en temps : un canal
+  quantifié (entiers) qui varie lentement n'est pas pris pour un capteur figé.
+
+Une valeur en quarantaine est écrite à NULL ; la valeur brute reste dans la
+colonne quality ("pm25:spike=812.0;..."). Elle n'alimente pas les moyennes.
+
+Par capteur : taux d'anomalies lissé (EWMA, toutes anomalies confondues,
+valeur figée comprise). Au-delà de ANOMALY_DEGRADE_AT, le capteur passe
+"degraded" dans sensors.status ; il redevient "active" sous
+ANOMALY_RECOVER_AT (hystérésis).
+
+Env:
+  ANOMALY_ENABLED        true|false (défaut true)
+  ANOMALY_ALPHA          lissage EWMA des moyennes / variances (défaut 0.1)
+  ANOMALY_Z              seuil de pic en écarts-types (défaut 6)
+  ANOMALY_WARMUP         mesures avant détection des pics (défaut 10)
+  ANOMALY_SHIFT_AFTER    pics consécutifs acceptés comme nouveau niveau (défaut 5)
+  ANOMALY_STUCK_AFTER    mesures sans variation minimum pour une valeur figée (défaut 12)
+  ANOMALY_STUCK_MINUTES  durée sans variation pour une valeur figée (défaut 120)
+  ANOMALY_DEGRADE_AT     taux d'anomalies -> degraded (défaut 0.3)
+  ANOMALY_RECOVER_AT     taux d'anomalies -> active (défaut 0.05)
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+ENABLED = os.getenv("ANOMALY_ENABLED", "true").lower() == "true"
+ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.1"))
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z", "6"))
+WARMUP = int(os.getenv("ANOMALY_WARMUP", "10"))
+SHIFT_AFTER = int(os.getenv("ANOMALY_SHIFT_AFTER", "5"))
+STUCK_AFTER = int(os.getenv("ANOMALY_STUCK_AFTER", "12"))
+STUCK_SECONDS = float(os.getenv("ANOMALY_STUCK_MINUTES", "120")) * 60
+DEGRADE_AT = float(os.getenv("ANOMALY_DEGRADE_AT", "0.3"))
+RECOVER_AT = float(os.getenv("ANOMALY_RECOVER_AT", "0.05"))
+
+# Bornes physiques plausibles par mesure
+BOUNDS = {
+    "aqi": (0, 1000),
+    "pm25": (0, 1000),
+    "pm10": (0, 2000),
+    "no2": (0, 2000),
+    "o3": (0, 1000),
+    "so2": (0, 2000),
+    "co": (0, 50000),
+    "temperature": (-50, 60),
+    "humidity": (0, 100),
+    "wind_speed": (0, 100),
+    "battery_level": (0, 100),
+}
+
+# Écart-type minimal (unités de la mesure) : évite les pics sur un signal très stable
+MIN_STD = {"temperature": 0.5, "humidity": 1.0, "battery_level": 1.0}
+
+# Mesures dont une valeur constante est normale (batterie, capteur débranché du secteur...)
+NO_STUCK = {"battery_level"}
+
+# Variation en deçà de laquelle une mesure est considérée inchangée (défaut 0 : égalité)
+STUCK_EPSILON = {"temperature": 0.05, "humidity": 0.1, "wind_speed": 0.05}
+
+
+class _Stat:
+    """Moyenne / variance EWMA d'une mesure d'une source, plus détection de valeur figée."""
+
+    __slots__ = ("mean", "var", "n", "last", "repeats", "since", "spikes", "spike_sign")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.n = 0
+        self.last: Optional[float] = None
+        self.repeats = 0
+        self.since = 0.0  # instant de la dernière variation
+        self.spikes = 0
+        self.spike_sign = 0
+
+    def reset(self, x: float) -> None:
+        self.mean, self.var, self.n = x, 0.0, 1
+        self.spikes = self.spike_sign = 0
+
+    def update(self, x: float) -> None:
+        if self.n == 0:
+            self.reset(x)
+            return
+        # Moyenne cumulée au début, puis EWMA : une première valeur aberrante s'efface vite
+        alpha = max(ALPHA, 1.0 / (self.n + 1))
+        diff = x - self.mean
+        incr = alpha * diff
+        self.mean += incr
+        self.var = (1 - alpha) * (self.var + diff * incr)
+        self.n += 1
+
+
+class AnomalyDetector:
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], _Stat] = {}
+        self._health: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"readings": 0, "range": 0, "spike": 0, "stuck": 0}
+
+    def _check(self, key: str, field: str, x: float, now: float) -> Optional[str]:
+        lo, hi = BOUNDS.get(field, (-math.inf, math.inf))
+        if not lo <= x <= hi:
+            return "range"
+
+        stat = self._stats.get((key, field))
+        if stat is None:
+            stat = self._stats[(key, field)] = _Stat()
+
+        flag = None
+        if field not in NO_STUCK:
+            if stat.last is not None and abs(x - stat.last) <= STUCK_EPSILON.get(field, 0.0):
+                stat.repeats += 1
+            else:
+                stat.last, stat.repeats, stat.since = x, 0, now
+            if stat.repeats + 1 >= STUCK_AFTER and now - stat.since >= STUCK_SECONDS:
+                flag = "stuck"
+
+        if stat.n >= WARMUP:
+            std = max(math.sqrt(stat.var), MIN_STD.get(field, 1.0))
+            z = (x - stat.mean) / std
+            if abs(z) > Z_THRESHOLD:
+                sign = 1 if z > 0 else -1
+                stat.spikes = stat.spikes + 1 if sign == stat.spike_sign else 1
+                stat.spike_sign = sign
+                if stat.spikes < SHIFT_AFTER:
+                    return "spike"
+                # Pics persistants du même côté : nouveau niveau, on repart de là
+                stat.reset(x)
+                return flag
+            stat.spikes = stat.spike_sign = 0
+
+        stat.update(x)
+        return flag
+
+    def inspect(self, key: str, reading: Dict[str, Any], fields: Iterable[str],
+                now: Optional[float] = None) -> Tuple[Dict[str, Any], List[str], float]:
+        """
+        Contrôle une mesure de la source `key` (now : instant de la mesure,
+        défaut maintenant).
+
+        Retourne (mesure avec les valeurs en quarantaine à None, drapeaux
+        "champ:type=valeur", taux d'anomalies lissé de la source).
+        """
+        if not ENABLED:
+            return reading, [], 0.0
+        now = time.time() if now is None else now
+        cleaned = dict(reading)
+        flags: List[str] = []
+        with self._lock:
+            self.counts["readings"] += 1
+            for field in fields:
+                x = reading.get(field)
+                if x is None:
+                    continue
+                try:
+                    x = float(x)
+                except (TypeError, ValueError):
+                    continue
+                if math.isnan(x):
+                    cleaned[field] = None
+                    continue
+                flag = self._check(key, field, x, now)
+                if flag is None:
+                    continue
+                self.counts[flag] += 1
+                flags.append(f"{field}:{flag}={x:g}")
+                if flag != "stuck":
+                    cleaned[field] = None
+
+            anomalous = 1.0 if flags else 0.0
+            health = (1 - ALPHA) * self._health.get(key, 0.0) + ALPHA * anomalous
+            self._health[key] = health
+        return cleaned, flags, health
+
+    @staticmethod
+    def next_status(current: Optional[str], rate: float) -> str:
+        """Statut du capteur après une mesure, avec hystérésis."""
+        current = current or "active"
+        if current == "degraded":
+            return "active" if rate < RECOVER_AT else "degraded"
+        if current == "active" and rate >= DEGRADE_AT:
+            return "degraded"
+        return current
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            degraded = sum(1 for h in self._health.values() if h >= DEGRADE_AT)
+            return {**self.counts, "sources": len(self._health), "degraded": degraded}
+
+
+detector = AnomalyDetector()
@@ -0,0 +1,179 @@
+# backend/services/aqi.py
+"""
+Calcul de l'AQI à partir des tables de seuils officielles, en NumPy.
+
+Échelles :
+  us : US EPA AQI (0-500, seuils PM2.5 révisés en 2024). Échelle par défaut,
+       cohérente avec les libellés Bon / Modéré / Mauvais du dashboard et
+       avec l'AQI renvoyé par AQICN.
+  eu : CAQI européen horaire, grille "background" (0-100, extrapolé au-delà).
+
+Toutes les concentrations sont attendues en µg/m³ (CO compris), comme
+OpenWeather les fournit ; la conversion en ppb/ppm pour l'EPA est faite ici.
+Les fonctions acceptent des scalaires ou des tableaux entiers (une colonne
+de la table air_quality) et ignorent les valeurs manquantes (None / NaN).
+
+CLI de recalcul de l'historique :
+  python services/aqi.py --recompute [--scale us|eu] [--db chemin]
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+DEFAULT_SCALE = os.getenv("AQI_SCALE", "us")
+
+POLLUTANTS = ("pm25", "pm10", "no2", "o3", "so2", "co")
+
+# Conversion µg/m³ -> unité EPA (ppb, ppm pour le CO) à 25 °C
+_UG_TO_EPA_UNIT = {"no2": 1 / 1.88, "o3": 1 / 1.96, "so2": 1 / 2.62, "co": 1 / 1145.0}
+
+# (concentration basse, concentration haute, indice bas, indice haut)
+_EPA: Dict[str, Sequence[Tuple[float, float, float, float]]] = {
+    "pm25": ((0.0, 9.0, 0, 50), (9.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+             (55.5, 125.4, 151, 200), (125.5, 225.4, 201, 300), (225.5, 325.4, 301, 500)),
+    "pm10": ((0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+             (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500)),
+    "o3": ((0, 54, 0, 50), (55, 70, 51, 100), (71, 85, 101, 150),
+           (86, 105, 151, 200), (106, 200, 201, 300), (201, 604, 301, 500)),
+    "no2": ((0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150),
+            (361, 649, 151, 200), (650, 1249, 201, 300), (1250, 2049, 301, 500)),
+    "so2": ((0, 35, 0, 50), (36, 75, 51, 100), (76, 185, 101, 150),
+            (186, 304, 151, 200), (305, 604, 201, 300), (605, 1004, 301, 500)),
+    "co": ((0.0, 4.4, 0, 50), (4.5, 9.4, 51, 100), (9.5, 12.4, 101, 150),
+           (12.5, 15.4, 151, 200), (15.5, 30.4, 201, 300), (30.5, 50.4, 301, 500)),
+}
+
+# CAQI horaire (grille background), seuils des indices 0 / 25 / 50 / 75 / 100
+_CAQI: Dict[str, Sequence[float]] = {
+    "no2": (0, 50, 100, 200, 400),
+    "pm10": (0, 25, 50, 90, 180),
+    "pm25": (0, 15, 30, 55, 110),
+    "o3": (0, 60, 120, 180, 240),
+    "so2": (0, 50, 100, 350, 500),
+    "co": (0, 5000, 7500, 10000, 20000),
+}
+_CAQI_INDEX = (0, 25, 50, 75, 100)
+
+
+def _as_array(v) -> np.ndarray:
+    # None (scalaire ou dans une liste) devient NaN
+    return np.asarray(v, dtype=np.float64)
+
+
+def _epa_sub_index(pollutant: str, conc: np.ndarray) -> np.ndarray:
+    table = _EPA[pollutant]
+    c = conc * _UG_TO_EPA_UNIT.get(pollutant, 1.0)
+    xs = np.array([x for lo, hi, _, _ in table for x in (lo, hi)], dtype=np.float64)
+    ys = np.array([y for _, _, ilo, ihi in table for y in (ilo, ihi)], dtype=np.float64)
+    out = np.interp(np.maximum(c, 0.0), xs, ys)
+    return np.where(np.isnan(c), np.nan, out)
+
+
+def epa_concentration(pollutant: str, sub_index):
+    """
+    Inverse de la grille EPA : sous-indice AQI -> concentration en µg/m³.
+
+    Sert aux sources qui publient des sous-indices (AQICN, champ iaqi) pour
+    les ramener dans l'unité des autres sources avant de les combiner.
+    """
+    table = _EPA[pollutant]
+    idx = _as_array(sub_index)
+    xs = np.array([x for lo, hi, _, _ in table for x in (lo, hi)], dtype=np.float64)
+    ys = np.array([y for _, _, ilo, ihi in table for y in (ilo, ihi)], dtype=np.float64)
+    c = np.interp(np.maximum(idx, 0.0), ys, xs) / _UG_TO_EPA_UNIT.get(pollutant, 1.0)
+    return np.where(np.isnan(idx), np.nan, c)
+
+
+def _caqi_sub_index(pollutant: str, conc: np.ndarray) -> np.ndarray:
+    xs = np.array(_CAQI[pollutant], dtype=np.float64)
+    ys = np.array(_CAQI_INDEX, dtype=np.float64)
+    c = np.maximum(conc, 0.0)
+    out = np.interp(c, xs, ys)
+    # Au-delà de 100 : prolongement linéaire du dernier segment
+    slope = (ys[-1] - ys[-2]) / (xs[-1] - xs[-2])
+    out = np.where(c > xs[-1], ys[-1] + (c - xs[-1]) * slope, out)
+    return np.where(np.isnan(conc), np.nan, out)
+
+
+def compute_aqi(scale: str = DEFAULT_SCALE, **concentrations) -> np.ndarray:
+    """
+    AQI global = max des sous-indices disponibles, élément par élément.
+
+    Exemple : compute_aqi(pm25=col_pm25, pm10=col_pm10, no2=col_no2)
+    Retourne un tableau float (NaN là où aucun polluant n'est renseigné).
+    """
+    sub_index = _caqi_sub_index if scale == "eu" else _epa_sub_index
+    result = None
+    for name in POLLUTANTS:
+        if concentrations.get(name) is None:
+            continue
+        idx = sub_index(name, _as_array(concentrations[name]))
+        result = idx if result is None else np.fmax(result, idx)
+    if result is None:
+        return np.array(np.nan)
+    return result
+
+
+def aqi_value(scale: str = DEFAULT_SCALE, **concentrations) -> Optional[int]:
+    """Version scalaire de compute_aqi : entier arrondi, ou None."""
+    v = float(compute_aqi(scale, **concentrations))
+    return None if np.isnan(v) else int(round(v))
+
+
+def recompute_air_quality_aqi(db_path: str, scale: str = DEFAULT_SCALE, batch_size: int = 200_000) -> int:
+    """
+    Recalcule la colonne aqi de tout l'historique air_quality, par lots.
+
+    Les lignes AQICN sont ignorées : leurs colonnes polluants contiennent
+    déjà des sous-indices AQI (champ iaqi), pas des concentrations.
+    """
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    read = conn.cursor()
+    read.execute('''
+        SELECT id, pm25, pm10, no2, o3, so2, co
+        FROM air_quality
+        WHERE source IS NULL OR source != 'AQICN'
+    ''')
+
+    updated = 0
+    while True:
+        rows = read.fetchmany(batch_size)
+        if not rows:
+            break
+        cols = np.array(rows, dtype=np.float64).T  # None -> nan
+        ids = cols[0].astype(np.int64)
+        aqi = compute_aqi(scale, **dict(zip(POLLUTANTS, cols[1:])))
+        values = np.where(np.isnan(aqi), np.nan, np.rint(aqi))
+        conn.executemany(
+            "UPDATE air_quality SET aqi = ? WHERE id = ?",
+            zip((None if np.isnan(v) else int(v) for v in values), ids.tolist()),
+        )
+        updated += len(rows)
+
+    conn.commit()
+    conn.close()
+    return updated
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recalcul de l'AQI de l'historique air_quality")
+    parser.add_argument("--recompute", action="store_true", help="recalculer la colonne aqi")
+    parser.add_argument("--scale", choices=("us", "eu"), default=DEFAULT_SCALE)
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "/tmp/smartcity.db"))
+    args = parser.parse_args()
+
+    if args.recompute:
+        t0 = time.time()
+        n = recompute_air_quality_aqi(args.db, args.scale)
+        print(f"✅ AQI ({args.scale}) recalculé pour {n} lignes en {time.time() - t0:.1f}s")
+    else:
+        parser.print_help()
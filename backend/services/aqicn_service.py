@@ -1,5 +1,6 @@
 import os
-import requests
+
+from http_client import upstream
 
 def fetch_aqi_by_geo(lat: float, lon: float) -> dict:
     token = os.getenv("AQICN_TOKEN", "")
@@ -7,10 +8,9 @@ def fetch_aqi_by_geo(lat: float, lon: float) -> dict:
         # fallback demo if no token
         return {"aqi": 77, "iaqi": {"pm25": 36, "pm10": 54, "no2": 51, "o3": 42, "so2": 15}}
 
-    url = f"https://api.waqi.info/feed/geo:{lat};{lon}/?token={token}"
-    r = requests.get(url, timeout=10)
-    r.raise_for_status()
-    data = r.json()
+    url = f"https://api.waqi.info/feed/geo:{lat};{lon}/"
+    # Session partagée + cache 10 min + disjoncteur (dernière valeur connue si panne)
+    data = upstream.get_json("aqicn", url, params={"token": token}, default_ttl=600)
 
     if data.get("status") != "ok":
         # fallback if API returns error
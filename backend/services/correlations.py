@@ -0,0 +1,424 @@
+# backend/services/correlations.py
+"""
+Corrélations pollution / météo / trafic par zone, tenues à jour à l'ingestion.
+
+Pour chaque zone, chaque couple (facteur, polluant) et chaque décalage :
+  facteurs  : wind_speed, humidity, trafic (services.mobility_service)
+  polluants : pm25, no2
+  décalages : CORRELATION_LAGS heures (le facteur précède le polluant)
+
+L'état est un jeu de co-moments (n, moyennes, M2 de chaque variable,
+co-moment croisé), combinables sans revenir aux données (formule de Chan) :
+la corrélation de Pearson s'en déduit en O(1), /api/analytics/correlations
+ne lit que la mémoire.
+
+- En ligne : chaque ligne fusionnée (services.fusion) est ajoutée quand son
+  intervalle est clos (arrivée de l'intervalle suivant de la zone). Le
+  facteur décalé de h heures est sa dernière valeur connue entre
+  t - h - CORRELATION_LAG_TOLERANCE et t - h (historique court en mémoire).
+  Les co-moments de la zone sont écrits avec la mesure (même transaction).
+- Recalcul exact (tâche nocturne "correlations_recompute", ou au démarrage
+  si la table est vide) : numpy par tranches d'un mois sur l'archive
+  colonnaire (columnar_archive), mêmes règles de décalage sur une grille
+  d'intervalles. L'archive contient les mêmes lignes fusionnées
+  (air_quality_fused, un enregistrement par intervalle) que le calcul en
+  ligne : les deux chemins donnent le même état. Les intervalles clos
+  pendant le recalcul sont rejoués ensuite.
+
+Env:
+  CORRELATION_LAGS            décalages en heures (défaut "0,1,3,6")
+  CORRELATION_LAG_TOLERANCE   âge max du facteur décalé, en secondes (défaut 1800)
+  CORRELATION_MIN_SAMPLES     couples minimum pour publier r (défaut 30)
+  CORRELATION_HOUR            heure locale du recalcul nocturne (défaut 3)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from init_db import get_db_connection
+from services.fusion import BUCKET, bucket_of
+from write_buffer import get_write_buffer
+
+
+DRIVERS = ("wind_speed", "humidity", "traffic")
+TARGETS = ("pm25", "no2")
+LAGS = tuple(int(float(h) * 3600) for h in os.getenv("CORRELATION_LAGS", "0,1,3,6").split(","))
+LAG_TOLERANCE = int(os.getenv("CORRELATION_LAG_TOLERANCE", "1800"))
+MIN_SAMPLES = int(os.getenv("CORRELATION_MIN_SAMPLES", "30"))
+RECOMPUTE_HOUR = int(os.getenv("CORRELATION_HOUR", "3"))
+
+# Historique des facteurs nécessaire au plus grand décalage
+HISTORY = max(LAGS) + LAG_TOLERANCE
+
+# Composantes de l'état (axe 0 des tableaux (6, lags, facteurs, polluants))
+N, MEAN_X, MEAN_Y, M2_X, M2_Y, C_XY = range(6)
+
+_UPSERT = '''
+    INSERT INTO correlation_stats
+    (zone, target, driver, lag, n, mean_x, mean_y, m2_x, m2_y, c_xy, exact_until, recomputed_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(zone, target, driver, lag) DO UPDATE SET
+        n = excluded.n,
+        mean_x = excluded.mean_x,
+        mean_y = excluded.mean_y,
+        m2_x = excluded.m2_x,
+        m2_y = excluded.m2_y,
+        c_xy = excluded.c_xy,
+        exact_until = excluded.exact_until,
+        recomputed_at = excluded.recomputed_at,
+        updated_at = excluded.updated_at
+'''
+
+
+def _empty():
+    import numpy as np
+    return np.zeros((6, len(LAGS), len(DRIVERS), len(TARGETS)))
+
+
+def moments(x, y):
+    """Co-moments d'un lot : x (lags, facteurs, k), y (polluants, k) -> état (6, lags, facteurs, polluants)."""
+    import numpy as np
+
+    X = x[:, :, None, :]
+    Y = y[None, None, :, :]
+    mask = ~np.isnan(X) & ~np.isnan(Y)
+    n = mask.sum(axis=-1).astype(np.float64)
+    safe = np.where(n > 0, n, 1.0)
+    mx = np.where(mask, X, 0.0).sum(axis=-1) / safe
+    my = np.where(mask, Y, 0.0).sum(axis=-1) / safe
+    dx = np.where(mask, X - mx[..., None], 0.0)
+    dy = np.where(mask, Y - my[..., None], 0.0)
+    return np.stack([n, mx, my, (dx * dx).sum(axis=-1), (dy * dy).sum(axis=-1), (dx * dy).sum(axis=-1)])
+
+
+def merge(a, b):
+    """Combinaison de deux états (formule de Chan), élément par élément."""
+    import numpy as np
+
+    na, nb = a[N], b[N]
+    n = na + nb
+    safe = np.where(n > 0, n, 1.0)
+    dx = b[MEAN_X] - a[MEAN_X]
+    dy = b[MEAN_Y] - a[MEAN_Y]
+    f = na * nb / safe
+    return np.stack([
+        n,
+        a[MEAN_X] + dx * nb / safe,
+        a[MEAN_Y] + dy * nb / safe,
+        a[M2_X] + b[M2_X] + dx * dx * f,
+        a[M2_Y] + b[M2_Y] + dy * dy * f,
+        a[C_XY] + b[C_XY] + dx * dy * f,
+    ])
+
+
+def pearson(state):
+    """r de Pearson (lags, facteurs, polluants), NaN sous CORRELATION_MIN_SAMPLES couples."""
+    import numpy as np
+
+    denom = np.sqrt(state[M2_X] * state[M2_Y])
+    ok = (state[N] >= MIN_SAMPLES) & (denom > 0)
+    return np.where(ok, state[C_XY] / np.where(ok, denom, 1.0), np.nan)
+
+
+def _traffic(zone: str, ts):
+    from services.mobility_service import mobility_grid
+    return mobility_grid([zone], ts)[0][0].astype("float64")
+
+
+def _lagged_grid(values, tolerance_steps: int):
+    """Facteurs (facteurs, G) sur la grille -> valeurs décalées (lags, facteurs, G), NaN si trop anciennes."""
+    import numpy as np
+
+    d, g = values.shape
+    idx = np.arange(g)
+    # Position de la dernière valeur connue à chaque point de la grille
+    last = np.maximum.accumulate(np.where(~np.isnan(values), idx, -1), axis=1)
+    out = np.full((len(LAGS), d, g), np.nan)
+    for li, lag in enumerate(LAGS):
+        p = idx - lag // BUCKET
+        inside = p >= 0
+        src = np.where(inside, last[:, np.clip(p, 0, None)], -1)
+        ok = inside & (src >= 0) & (p - src <= tolerance_steps)
+        out[li] = np.where(ok, np.take_along_axis(values, np.clip(src, 0, None), axis=1), np.nan)
+    return out
+
+
+class CorrelationStore:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._states: Dict[str, Any] = {}
+        # Facteurs récents par zone : (ts, [facteurs]) pour les décalages
+        self._history: Dict[str, Deque[Tuple[int, List[float]]]] = {}
+        # Dernier intervalle vu par zone, ajouté à sa clôture
+        self._pending: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        # Intervalles clos pendant un recalcul exact : (zone, ts, x, y)
+        self._replay: Optional[list] = None
+        self._exact_until = 0
+        self._recomputed_at: Optional[int] = None
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    # ---------- État ----------
+
+    def _ensure_loaded(self) -> None:
+        """Charge les co-moments et l'historique récent des facteurs (une fois)."""
+        if self._loaded:
+            return
+        import numpy as np
+
+        self._loaded = True
+        conn = get_db_connection(self.db_path)
+        try:
+            rows = conn.execute("SELECT * FROM correlation_stats").fetchall()
+            recent = conn.execute('''
+                SELECT zone, ts, wind_speed, humidity
+                FROM air_quality_fused
+                WHERE ts >= ?
+                ORDER BY ts
+            ''', (int(time.time()) - HISTORY,)).fetchall()
+        except Exception as e:
+            print(f"⚠️ Corrélations: état indisponible: {e}")
+            return
+        finally:
+            conn.close()
+
+        for r in rows:
+            if r["target"] not in TARGETS or r["driver"] not in DRIVERS or r["lag"] not in LAGS:
+                continue  # couple ou décalage retiré de la configuration
+            state = self._states.setdefault(r["zone"], _empty())
+            key = (LAGS.index(r["lag"]), DRIVERS.index(r["driver"]), TARGETS.index(r["target"]))
+            state[(slice(None),) + key] = (r["n"], r["mean_x"], r["mean_y"], r["m2_x"], r["m2_y"], r["c_xy"])
+            self._exact_until = max(self._exact_until, r["exact_until"] or 0)
+            if r["recomputed_at"]:
+                self._recomputed_at = max(self._recomputed_at or 0, r["recomputed_at"])
+
+        for r in recent:
+            traffic = float(_traffic(r["zone"], np.array([r["ts"]]))[0])
+            self._history.setdefault(r["zone"], deque()).append(
+                (r["ts"], [_num(r["wind_speed"]), _num(r["humidity"]), traffic]))
+
+    def _lagged(self, zone: str, ts: int):
+        """Facteurs décalés (lags, facteurs) à l'instant ts, depuis l'historique de la zone."""
+        import numpy as np
+
+        out = np.full((len(LAGS), len(DRIVERS)), np.nan)
+        history = self._history.get(zone, ())
+        for li, lag in enumerate(LAGS):
+            for di in range(len(DRIVERS)):
+                for t, drivers in reversed(history):
+                    if t > ts - lag:
+                        continue
+                    if t < ts - lag - LAG_TOLERANCE:
+                        break
+                    if not np.isnan(drivers[di]):
+                        out[li, di] = drivers[di]
+                        break
+        return out
+
+    def _rows(self, zone: str) -> List[tuple]:
+        state = self._states[zone]
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        return [
+            (zone, target, driver, lag, *(float(v) for v in state[:, li, di, ti]),
+             self._exact_until, self._recomputed_at, now)
+            for li, lag in enumerate(LAGS)
+            for di, driver in enumerate(DRIVERS)
+            for ti, target in enumerate(TARGETS)
+        ]
+
+    # ---------- En ligne ----------
+
+    def observe(self, zone: str, bucket: int, fused: Dict[str, Any]) -> list:
+        """
+        Ligne fusionnée (zone, intervalle) courante. Retourne les opérations à
+        joindre à l'écriture de la mesure (upsert des co-moments de la zone
+        quand l'intervalle précédent est clos), sinon [].
+        """
+        import numpy as np
+
+        with self._lock:
+            self._ensure_loaded()
+            previous = self._pending.get(zone)
+            if previous is not None and bucket < previous[0]:
+                return []
+            self._pending[zone] = (bucket, fused)
+            if previous is None or previous[0] == bucket:
+                return []
+
+            ts, row = previous
+            history = self._history.setdefault(zone, deque())
+            history.append((ts, [_num(row.get("wind_speed")), _num(row.get("humidity")),
+                                 float(_traffic(zone, np.array([ts]))[0])]))
+            while history and history[0][0] < ts - HISTORY:
+                history.popleft()
+            if ts < self._exact_until:
+                return []  # déjà compté par le dernier recalcul exact
+
+            x = self._lagged(zone, ts)[:, :, None]
+            y = np.array([[_num(row.get(t))] for t in TARGETS])
+            self._states[zone] = merge(self._states.get(zone, _empty()), moments(x, y))
+            if self._replay is not None:
+                self._replay.append((zone, ts, x, y))
+            return [(_UPSERT, self._rows(zone), True)]
+
+    # ---------- Recalcul exact ----------
+
+    def _exact_zone(self, arch, zone: str, cutoff: int):
+        """Co-moments exacts d'une zone sur l'archive, par tranches d'un mois."""
+        import numpy as np
+
+        state = _empty()
+        months = sorted({m for t in TARGETS for m in arch.months(t, zone)})
+        for month in months:
+            first = datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+            start = int(first.timestamp())
+            end = min(int((first + timedelta(days=32)).replace(day=1).timestamp()), cutoff) - 1
+            if end < start:
+                continue
+            # Grille d'intervalles, avec l'historique nécessaire aux décalages
+            origin = bucket_of(start - HISTORY)
+            size = (end - origin) // BUCKET + 1
+
+            def column(name):
+                # Un enregistrement fusionné par intervalle : placé tel quel sur la grille
+                ts, values = arch.read(name, zone, origin - 1, end)
+                out = np.full(size, np.nan)
+                out[(ts - origin) // BUCKET] = values
+                return out
+
+            targets = np.stack([column(t) for t in TARGETS])
+            wind, humidity = column("wind_speed"), column("humidity")
+            grid = origin + np.arange(size) * BUCKET
+            present = ~np.isnan(targets).all(axis=0) | ~np.isnan(wind) | ~np.isnan(humidity)
+            traffic = np.where(present, _traffic(zone, grid), np.nan)
+
+            x = _lagged_grid(np.stack([wind, humidity, traffic]), LAG_TOLERANCE // BUCKET)
+            targets[:, grid < start] = np.nan  # historique : facteurs seulement
+            state = merge(state, moments(x, targets))
+        return state
+
+    def recompute(self) -> int:
+        """Recalcul exact depuis l'archive (synchronisée d'abord). Retourne le nombre de zones."""
+        from columnar_archive import ColumnarArchive, archive_dir_for, sync_archive
+
+        cutoff = bucket_of(int(time.time()))
+        get_write_buffer(self.db_path).flush()
+        sync_archive(self.db_path)
+        arch = ColumnarArchive(archive_dir_for(self.db_path))
+        zones = sorted({z for t in TARGETS for z in arch.zones(t)})
+
+        with self._lock:
+            self._ensure_loaded()
+            self._replay = []
+        try:
+            exact = {zone: self._exact_zone(arch, zone, cutoff) for zone in zones}
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+
+        with self._lock:
+            for zone, ts, x, y in self._replay:
+                if ts >= cutoff:
+                    exact[zone] = merge(exact.get(zone, _empty()), moments(x, y))
+            self._replay = None
+            self._states = exact
+            self._exact_until = cutoff
+            self._recomputed_at = int(time.time())
+            rows = [row for zone in exact for row in self._rows(zone)]
+
+        conn = get_db_connection(self.db_path)
+        try:
+            conn.execute("DELETE FROM correlation_stats")
+            conn.executemany(_UPSERT, rows)
+            conn.commit()
+        finally:
+            conn.close()
+        return len(exact)
+
+    def warm(self) -> None:
+        """Charge l'état ; recalcul exact immédiat si la table est vide et l'archive non."""
+        with self._lock:
+            self._ensure_loaded()
+            empty = not self._states
+        if empty:
+            t0 = time.time()
+            n = self.recompute()
+            if n:
+                print(f"✅ Corrélations: {n} zone(s) recalculée(s) en {time.time() - t0:.1f}s")
+
+    # ---------- Lecture ----------
+
+    def report(self, zone: str = "all") -> Dict[str, Any]:
+        """Corrélations de la zone ("all" : toutes zones combinées), par couple et décalage."""
+        import numpy as np
+
+        with self._lock:
+            self._ensure_loaded()
+            if zone == "all":
+                state = _empty()
+                for s in self._states.values():
+                    state = merge(state, s)
+            else:
+                state = self._states.get(zone, _empty()).copy()
+            recomputed_at = self._recomputed_at
+            zones = sorted(self._states)
+
+        r = pearson(state)
+        pairs = []
+        for ti, target in enumerate(TARGETS):
+            for di, driver in enumerate(DRIVERS):
+                lags = [
+                    {
+                        "lag": lag // 60,
+                        "r": None if np.isnan(r[li, di, ti]) else round(float(r[li, di, ti]), 3),
+                        "n": int(state[N, li, di, ti]),
+                    }
+                    for li, lag in enumerate(LAGS)
+                ]
+                known = [l for l in lags if l["r"] is not None]
+                best = max(known, key=lambda l: abs(l["r"])) if known else None
+                pairs.append({
+                    "target": target,
+                    "driver": driver,
+                    "r": lags[0]["r"],
+                    "n": lags[0]["n"],
+                    "bestLag": best["lag"] if best else None,
+                    "bestR": best["r"] if best else None,
+                    "lags": lags,
+                })
+        return {
+            "zone": zone,
+            "zones": zones,
+            "lagsMinutes": [lag // 60 for lag in LAGS],
+            "minSamples": MIN_SAMPLES,
+            "pairs": pairs,
+            "recomputedAt": datetime.fromtimestamp(recomputed_at).isoformat(timespec="seconds") if recomputed_at else None,
+        }
+
+
+def _num(v) -> float:
+    return float("nan") if v is None else float(v)
+
+
+def seconds_until_recompute(now: Optional[datetime] = None) -> float:
+    """Délai jusqu'au prochain CORRELATION_HOUR (heure locale)."""
+    now = now or datetime.now()
+    target = now.replace(hour=RECOMPUTE_HOUR, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+correlations = CorrelationStore(os.getenv("DATABASE_PATH", "/tmp/smartcity.db"))
+
+
+def recompute_correlations() -> None:
+    t0 = time.time()
+    n = correlations.recompute()
+    print(f"✅ Corrélations: recalcul exact de {n} zone(s) en {time.time() - t0:.1f}s")
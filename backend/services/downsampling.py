@@ -0,0 +1,59 @@
+# backend/services/downsampling.py
+"""
+Réduction des séries temporelles avant envoi au navigateur.
+
+LTTB (Largest-Triangle-Three-Buckets) : garde au plus `threshold` points en
+préservant la forme visuelle de la courbe (pics et creux). Travaille sur des
+tableaux NumPy et retourne des indices, pour pouvoir réduire plusieurs
+colonnes alignées avec le même choix de points.
+
+NumPy n'est importé qu'au premier appel : le module reste léger au démarrage.
+"""
+from __future__ import annotations
+
+
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 5000
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices des points conservés par LTTB (premier et dernier inclus)."""
+    n = len(x)
+    import numpy as np
+
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bornes des buckets intermédiaires (le premier et le dernier point sont fixes)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    out = np.empty(threshold, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Moyenne du bucket suivant (ou dernier point)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+
+        bx = x[lo:hi]
+        by = y[lo:hi]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+
+    return out
+
+
+def parse_max_points(raw) -> int:
+    """Valeur du paramètre maxPoints, bornée (défaut DEFAULT_MAX_POINTS)."""
+    try:
+        v = int(raw)
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_POINTS
+    return max(3, min(MAX_POINTS_LIMIT, v))
@@ -0,0 +1,271 @@
+# backend/services/forecast.py
+"""
+Prévisions AQI par zone avec intervalles d'incertitude (prediction_model.pkl).
+
+Le modèle est une forêt aléatoire (RandomForestRegressor) : la prévision est
+la moyenne des arbres, et la dispersion des prédictions des arbres donne
+l'incertitude.
+- bande : quantiles FORECAST_INTERVAL des prédictions des arbres (défaut 0.8,
+  soit du 10e au 90e centile) ;
+- confidence : part des arbres (en %) à moins de FORECAST_TOLERANCE de la
+  prévision.
+
+Les arbres sont aplatis une fois en tableaux numpy (enfants, variable, seuil,
+valeur) et parcourus ensemble : tous les arbres x toutes les lignes
+(zone, échéance) avancent d'un niveau à chaque pas, sans boucle Python par
+arbre ni par ligne. Le coût d'une bande est celui de la prévision moyenne.
+
+Les lignes (zone, échéance) sont indépendantes : variables d'heure et de jour
+de l'échéance, et pour le reste l'état courant de la zone (moyennes horaires
+récentes d'air_quality_fused : valeurs courantes, retards, moyennes
+glissantes). Tâche "forecast" du planificateur : le résultat est gardé en
+mémoire pour GET /api/predictions et historisé dans la table predictions.
+
+Env:
+  FORECAST_MODEL       chemin du modèle (défaut backend/prediction_model.pkl)
+  FORECAST_HOURS       échéances en heures (défaut 24)
+  FORECAST_INTERVAL    niveau de la bande (défaut 0.8)
+  FORECAST_TOLERANCE   écart relatif des arbres "d'accord" (défaut 0.15)
+  FORECAST_RETENTION   jours de prévisions conservés en base (défaut 30)
+  FORECAST_EVERY       cadence de la tâche "forecast", en secondes (défaut 3600, app.py)
+"""
+from __future__ import annotations
+
+import os
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from init_db import get_db_connection
+
+
+MODEL_PATH = os.getenv(
+    "FORECAST_MODEL",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prediction_model.pkl"),
+)
+HOURS = int(os.getenv("FORECAST_HOURS", "24"))
+INTERVAL = float(os.getenv("FORECAST_INTERVAL", "0.8"))
+TOLERANCE = float(os.getenv("FORECAST_TOLERANCE", "0.15"))
+RETENTION_DAYS = int(os.getenv("FORECAST_RETENTION", "30"))
+
+# Variable absente des mesures collectées : valeur standard
+DEFAULTS = {"pressure": 1013.0}
+
+MEASURES = ("aqi", "pm25", "pm10", "no2", "o3", "temperature", "humidity", "wind_speed")
+
+
+def _level(aqi: float) -> Dict[str, str]:
+    if aqi <= 50:
+        return {"level": "BON", "level_class": "success"}
+    if aqi <= 100:
+        return {"level": "MODÉRÉ", "level_class": "warning"}
+    if aqi <= 150:
+        return {"level": "MAUVAIS", "level_class": "danger"}
+    return {"level": "TRÈS MAUVAIS", "level_class": "danger"}
+
+
+class PackedForest:
+    """Arbres d'une forêt scikit-learn aplatis dans des tableaux communs."""
+
+    def __init__(self, estimators):
+        import numpy as np
+
+        trees = [e.tree_ for e in estimators]
+        sizes = np.array([t.node_count for t in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+        def shifted(children, offset):
+            return np.where(children >= 0, children + offset, -1)
+
+        self.left = np.concatenate([shifted(t.children_left, o) for t, o in zip(trees, offsets)])
+        self.right = np.concatenate([shifted(t.children_right, o) for t, o in zip(trees, offsets)])
+        self.feature = np.concatenate([t.feature for t in trees])
+        self.threshold = np.concatenate([t.threshold for t in trees])
+        self.value = np.concatenate([t.value[:, 0, 0] for t in trees])
+        self.missing_left = np.concatenate([
+            getattr(t, "missing_go_to_left", np.zeros(t.node_count, dtype=np.uint8)) for t in trees
+        ]).astype(bool)
+        self.roots = offsets
+        self.depth = max(t.max_depth for t in trees)
+
+    def predict_all(self, X):
+        """Prédiction de chaque arbre pour chaque ligne : (arbres, lignes)."""
+        import numpy as np
+
+        rows = np.arange(X.shape[0])[None, :]
+        node = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        for _ in range(self.depth):
+            inner = self.left[node] >= 0
+            if not inner.any():
+                break
+            x = X[rows, np.maximum(self.feature[node], 0)]
+            go_left = np.where(np.isnan(x), self.missing_left[node], x <= self.threshold[node])
+            node = np.where(inner, np.where(go_left, self.left[node], self.right[node]), node)
+        return self.value[node]
+
+
+class Forecaster:
+    def __init__(self, db_path: str, model_path: str = MODEL_PATH):
+        self.db_path = db_path
+        self.model_path = model_path
+        self._model: Optional[Dict[str, Any]] = None
+        self._latest: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        """Modèle + forêt aplatie (chargés une fois ; le dépickling importe scikit-learn)."""
+        if self._model is None:
+            with open(self.model_path, "rb") as f:
+                bundle = pickle.load(f)
+            model = bundle["model"]
+            self._model = {
+                "forest": PackedForest(model.estimators_),
+                "features": list(bundle.get("features") or model.feature_names_in_),
+                "version": bundle.get("trained_date"),
+                "trees": len(model.estimators_),
+            }
+        return self._model
+
+    def _zone_state(self, zones: Optional[Sequence[str]]) -> Dict[str, Dict[str, float]]:
+        """Variables non temporelles par zone, depuis les moyennes horaires récentes."""
+        import numpy as np
+
+        now = int(time.time())
+        conn = get_db_connection(self.db_path)
+        try:
+            rows = conn.execute(f'''
+                SELECT zone, ts - ts % 3600 AS hour, {", ".join(f"AVG({m}) AS {m}" for m in MEASURES)}
+                FROM air_quality_fused
+                WHERE ts >= ?
+                GROUP BY zone, hour
+                ORDER BY zone, hour
+            ''', (now - 7 * 3600 - now % 3600,)).fetchall()
+        finally:
+            conn.close()
+
+        hourly: Dict[str, list] = {}
+        for r in rows:
+            if zones is None or r["zone"] in zones:
+                hourly.setdefault(r["zone"], []).append(r)
+
+        out = {}
+        for zone, hours in hourly.items():
+            last = hours[-1]
+            by_hour = {h["hour"]: h for h in hours}
+
+            def back(n, measure):
+                row = by_hour.get(last["hour"] - n * 3600)
+                value = row[measure] if row is not None else None
+                return last[measure] if value is None else value
+
+            aqi = [h["aqi"] for h in hours if h["aqi"] is not None]
+            state = {m: last[m] for m in MEASURES}
+            state.update(
+                aqi_lag_1=back(1, "aqi"),
+                aqi_lag_3=back(3, "aqi"),
+                pm25_lag_1=back(1, "pm25"),
+                temp_lag_1=back(1, "temperature"),
+                aqi_rolling_mean_3=float(np.mean(aqi[-3:])) if aqi else None,
+                aqi_rolling_mean_6=float(np.mean(aqi[-6:])) if aqi else None,
+            )
+            out[zone] = state
+        return out
+
+    def compute(self, zones: Optional[Sequence[str]] = None, hours: int = HOURS) -> Dict[str, Any]:
+        """Prévisions + bandes pour toutes les zones et échéances, en un passage sur la forêt."""
+        import numpy as np
+
+        model = self._load()
+        features = model["features"]
+        states = self._zone_state(zones)
+        names = sorted(states)
+        start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        times = [start + timedelta(hours=h) for h in range(1, hours + 1)]
+
+        # Matrice (zones x échéances, variables) ; NaN = variable inconnue
+        X = np.full((len(names) * len(times), len(features)), np.nan)
+        for fi, name in enumerate(features):
+            if name == "hour":
+                X[:, fi] = np.tile([t.hour for t in times], len(names))
+            elif name == "day_of_week":
+                X[:, fi] = np.tile([t.weekday() for t in times], len(names))
+            elif name == "is_weekend":
+                X[:, fi] = np.tile([int(t.weekday() >= 5) for t in times], len(names))
+            else:
+                column = [states[z].get(name, DEFAULTS.get(name)) for z in names]
+                X[:, fi] = np.repeat(np.array(column, dtype=np.float64), len(times))
+
+        t0 = time.time()
+        trees = model["forest"].predict_all(X)  # (arbres, lignes)
+        point = trees.mean(axis=0)
+        alpha = (1 - INTERVAL) / 2
+        lower, upper = np.quantile(trees, [alpha, 1 - alpha], axis=0)
+        agree = np.abs(trees - point) <= TOLERANCE * np.maximum(np.abs(point), 1.0)
+        confidence = 100 * agree.mean(axis=0)
+        elapsed = time.time() - t0
+
+        zones_out: Dict[str, List[Dict[str, Any]]] = {}
+        for zi, zone in enumerate(names):
+            series = []
+            for hi, t in enumerate(times):
+                i = zi * len(times) + hi
+                series.append({
+                    "time": t.strftime("%H:%M"),
+                    "timestamp": t.isoformat(),
+                    "aqi": int(round(point[i])),
+                    "lower": round(float(lower[i]), 1),
+                    "upper": round(float(upper[i]), 1),
+                    "confidence": int(round(confidence[i])),
+                    **_level(point[i]),
+                })
+            zones_out[zone] = series
+
+        return {
+            "model": model["version"],
+            "trees": model["trees"],
+            "interval": INTERVAL,
+            "generatedAt": datetime.now().isoformat(timespec="seconds"),
+            "computeMs": round(elapsed * 1000, 2),
+            "zones": zones_out,
+        }
+
+    def refresh(self) -> Dict[str, Any]:
+        """Recalcule toutes les zones, garde le résultat en mémoire et l'historise."""
+        result = self.compute()
+        with self._lock:
+            self._latest = result
+
+        rows = [
+            (t["timestamp"][:10], int(t["timestamp"][11:13]), zone, "aqi", float(t["aqi"]),
+             float(t["confidence"]), t["lower"], t["upper"], result["model"])
+            for zone, series in result["zones"].items()
+            for t in series
+        ]
+        conn = get_db_connection(self.db_path)
+        try:
+            conn.executemany('''
+                INSERT INTO predictions
+                (prediction_date, hour, zone, pollutant, predicted_value, confidence, lower_bound, upper_bound, model_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.execute("DELETE FROM predictions WHERE created_at < datetime('now', ?)",
+                         (f"-{RETENTION_DAYS} days",))
+            conn.commit()
+        finally:
+            conn.close()
+        return result
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._latest
+
+
+forecaster = Forecaster(os.getenv("DATABASE_PATH", "/tmp/smartcity.db"))
+
+
+def refresh_forecasts() -> None:
+    result = forecaster.refresh()
+    n = sum(len(s) for s in result["zones"].values())
+    print(f"🔮 Prévisions: {n} échéances ({len(result['zones'])} zones) en {result['computeMs']} ms")
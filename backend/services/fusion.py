@@ -0,0 +1,260 @@
+# backend/services/fusion.py
+"""
+Fusion multi-sources : une ligne canonique par zone et par intervalle de temps.
+
+La collecte écrit une ligne par source (AQICN, OpenWeather, ...) pour la même
+ville au même moment, avec des valeurs différentes. Les lignes brutes restent
+dans air_quality ; la fusion en tire une ligne par (zone, intervalle de
+FUSION_BUCKET secondes) dans air_quality_fused, lue par le dashboard et le
+snapshot.
+
+Règles de fusion d'un intervalle :
+- fraîcheur : seule la dernière mesure de chaque source compte, et une source
+  en retard de plus de FUSION_MAX_AGE secondes sur la plus récente est écartée ;
+- chaque mesure est la moyenne pondérée (FUSION_WEIGHTS) des sources qui la
+  fournissent ;
+- les sources qui publient des sous-indices AQI au lieu de concentrations
+  (INDEX_SOURCES : AQICN, champ iaqi) sont d'abord ramenées en µg/m³ par la
+  grille EPA inverse (services.aqi.epa_concentration) ;
+- l'AQI est recalculé depuis les concentrations fusionnées (services.aqi),
+  pour ne pas moyenner des indices d'échelles différentes ; à défaut de
+  concentrations, moyenne pondérée des AQI des sources.
+
+En ligne, les intervalles ouverts sont gardés en mémoire (observe(), sans
+lecture DB) et la ligne fusionnée est écrite avec la mesure brute. rebuild()
+recalcule une plage depuis air_quality (table vide, import d'historique).
+
+Env:
+  FUSION_BUCKET    taille des intervalles en secondes (défaut 300)
+  FUSION_MAX_AGE   retard max d'une source dans un intervalle, en secondes (défaut 1800)
+  FUSION_WEIGHTS   poids par source (défaut "AQICN=1.0,OpenWeather=0.7,BACKFILL=0.8")
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from init_db import AIR_QUALITY_MEASURES, DEFAULT_ZONE, get_db_connection
+
+
+BUCKET = int(os.getenv("FUSION_BUCKET", "300"))
+MAX_AGE = int(os.getenv("FUSION_MAX_AGE", "1800"))
+
+# Poids d'une source absente de FUSION_WEIGHTS
+DEFAULT_WEIGHT = 0.5
+
+CONCENTRATIONS = ("pm25", "pm10", "no2", "o3", "so2", "co")
+
+# Sources dont les colonnes polluants sont des sous-indices AQI US (iaqi)
+INDEX_SOURCES = {"AQICN"}
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    weights = {}
+    for part in raw.split(","):
+        if "=" in part:
+            source, _, weight = part.partition("=")
+            try:
+                weights[source.strip()] = float(weight)
+            except ValueError:
+                continue
+    return weights
+
+
+WEIGHTS = _parse_weights(os.getenv("FUSION_WEIGHTS", "AQICN=1.0,OpenWeather=0.7,BACKFILL=0.8"))
+
+_UPSERT = f'''
+    INSERT INTO air_quality_fused
+    (zone, ts, {", ".join(AIR_QUALITY_MEASURES)}, last_ts, sources, n_sources, updated_at)
+    VALUES (?, ?, {", ".join("?" for _ in AIR_QUALITY_MEASURES)}, ?, ?, ?, ?)
+    ON CONFLICT(zone, ts) DO UPDATE SET
+        {", ".join(f"{c} = excluded.{c}" for c in AIR_QUALITY_MEASURES)},
+        last_ts = excluded.last_ts,
+        sources = excluded.sources,
+        n_sources = excluded.n_sources,
+        updated_at = excluded.updated_at
+'''
+
+# (ts, mesures) de la dernière lecture de chaque source d'un intervalle
+Readings = Dict[str, Tuple[int, Dict[str, Any]]]
+
+
+def bucket_of(ts: int) -> int:
+    return ts - ts % BUCKET
+
+
+def as_concentrations(source: Optional[str], reading: Dict[str, Any]) -> Dict[str, Any]:
+    """Lecture d'une source avec ses polluants en µg/m³ (sous-indices convertis)."""
+    if source not in INDEX_SOURCES:
+        return reading
+    from services.aqi import epa_concentration
+
+    out = dict(reading)
+    for c in CONCENTRATIONS:
+        if out.get(c) is not None:
+            out[c] = float(epa_concentration(c, out[c]))
+    return out
+
+
+def fuse(readings: Readings) -> Dict[str, Any]:
+    """Ligne canonique d'un intervalle à partir de la dernière lecture de chaque source."""
+    from services.aqi import aqi_value
+
+    newest = max(ts for ts, _ in readings.values())
+    fresh = {s: as_concentrations(s, r) for s, (ts, r) in readings.items() if newest - ts <= MAX_AGE}
+
+    out: Dict[str, Any] = {}
+    for c in AIR_QUALITY_MEASURES:
+        total = weight_sum = 0.0
+        for source, r in fresh.items():
+            v = r.get(c)
+            if v is None:
+                continue
+            w = WEIGHTS.get(source, DEFAULT_WEIGHT)
+            total += w * float(v)
+            weight_sum += w
+        out[c] = total / weight_sum if weight_sum else None
+
+    if any(out[c] is not None for c in CONCENTRATIONS):
+        out['aqi'] = aqi_value(**{c: out[c] for c in CONCENTRATIONS})
+
+    out['last_ts'] = newest
+    out['sources'] = {s: WEIGHTS.get(s, DEFAULT_WEIGHT) for s in sorted(fresh)}
+    return out
+
+
+def _row(zone: str, bucket: int, fused: Dict[str, Any]) -> tuple:
+    return (
+        zone,
+        bucket,
+        *(fused[c] for c in AIR_QUALITY_MEASURES),
+        fused['last_ts'],
+        json.dumps(fused['sources']),
+        len(fused['sources']),
+        datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+    )
+
+
+class FusionStage:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # (zone, intervalle) -> lectures par source, intervalles récents seulement
+        self._open: Dict[Tuple[str, int], Readings] = {}
+        self._lock = threading.Lock()
+
+    def _evict(self, now_bucket: int) -> None:
+        horizon = now_bucket - MAX_AGE - BUCKET
+        for key in [k for k in self._open if k[1] < horizon]:
+            del self._open[key]
+
+    def observe(self, zone: str, ts: int, source: Optional[str],
+                data: Dict[str, Any]) -> Optional[Tuple[int, Dict[str, Any], list]]:
+        """
+        Ajoute une mesure brute à son intervalle.
+
+        Retourne (intervalle, ligne fusionnée, upsert à joindre à l'écriture
+        de la mesure), ou None pour une mesure trop ancienne (voir rebuild()).
+        """
+        zone = zone or DEFAULT_ZONE
+        bucket = bucket_of(ts)
+        with self._lock:
+            self._evict(bucket_of(int(time.time())))
+            readings = self._open.get((zone, bucket))
+            if readings is None:
+                if bucket < bucket_of(int(time.time())) - MAX_AGE:
+                    return None
+                readings = self._open[(zone, bucket)] = {}
+            key = source or "?"
+            if key in readings and readings[key][0] > ts:
+                return None  # lecture plus ancienne que celle déjà retenue pour la source
+            readings[key] = (ts, {c: data.get(c) for c in AIR_QUALITY_MEASURES})
+            fused = fuse(readings)
+        return bucket, fused, [(_UPSERT, _row(zone, bucket, fused), False)]
+
+    def warm(self) -> None:
+        """Recharge les intervalles ouverts (quelques lignes) ; reconstruit la table si elle est vide."""
+        conn = get_db_connection(self.db_path)
+        try:
+            empty = conn.execute("SELECT 1 FROM air_quality_fused LIMIT 1").fetchone() is None
+            has_raw = conn.execute("SELECT 1 FROM air_quality LIMIT 1").fetchone() is not None
+            start = bucket_of(int(time.time())) - MAX_AGE - BUCKET
+            rows = conn.execute(f'''
+                SELECT zone, ts, source, {", ".join(AIR_QUALITY_MEASURES)}
+                FROM air_quality
+                WHERE ts >= ?
+                ORDER BY ts
+            ''', (start,)).fetchall()
+        finally:
+            conn.close()
+
+        with self._lock:
+            for r in rows:
+                key = (r["zone"] or DEFAULT_ZONE, bucket_of(r["ts"]))
+                self._open.setdefault(key, {})[r["source"] or "?"] = (
+                    r["ts"], {c: r[c] for c in AIR_QUALITY_MEASURES})
+
+        if empty and has_raw:
+            t0 = time.time()
+            n = rebuild(self.db_path)
+            print(f"✅ Fusion: {n} lignes canoniques reconstruites en {time.time() - t0:.1f}s")
+
+
+def rebuild(db_path: str, since: Optional[int] = None, until: Optional[int] = None,
+            batch: int = 10000) -> int:
+    """Recalcule les lignes fusionnées de [since, until] depuis air_quality. Retourne le nombre de lignes."""
+    lo = bucket_of(since) if since is not None else 0
+    hi = bucket_of(until) + BUCKET - 1 if until is not None else 2 ** 62
+    read = get_db_connection(db_path)
+    write = get_db_connection(db_path)
+    cursor = read.execute(f'''
+        SELECT zone, ts, source, {", ".join(AIR_QUALITY_MEASURES)}
+        FROM air_quality
+        WHERE ts >= ? AND ts <= ?
+        ORDER BY zone, ts
+    ''', (lo, hi))
+
+    total = 0
+    pending: List[tuple] = []
+    current: Optional[Tuple[str, int]] = None
+    readings: Readings = {}
+
+    def emit() -> None:
+        nonlocal total
+        if current is not None and readings:
+            pending.append(_row(current[0], current[1], fuse(readings)))
+            total += 1
+        if len(pending) >= batch:
+            write.executemany(_UPSERT, pending)
+            write.commit()
+            pending.clear()
+
+    for r in _iter(cursor):
+        key = (r["zone"] or DEFAULT_ZONE, bucket_of(r["ts"]))
+        if key != current:
+            emit()
+            current, readings = key, {}
+        source = r["source"] or "?"
+        if source not in readings or readings[source][0] <= r["ts"]:
+            readings[source] = (r["ts"], {c: r[c] for c in AIR_QUALITY_MEASURES})
+    emit()
+    if pending:
+        write.executemany(_UPSERT, pending)
+        write.commit()
+    read.close()
+    write.close()
+    return total
+
+
+def _iter(cursor, size: int = 50000) -> Iterable[Any]:
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+fusion = FusionStage(os.getenv("DATABASE_PATH", "/tmp/smartcity.db"))
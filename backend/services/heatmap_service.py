@@ -0,0 +1,162 @@
+# backend/services/heatmap_service.py
+"""
+Grille de pollution interpolée (IDW) pour la carte.
+
+- Les dernières mesures des capteurs actifs (registre mémoire) sont
+  interpolées sur une grille régulière couvrant la ville, en NumPy.
+- Les capteurs sont d'abord moyennés par cellule de la grille : le coût
+  reste borné par la taille de la grille, même avec des dizaines de milliers
+  de capteurs.
+- Le résultat est mis en cache par "génération" d'ingestion : tant qu'aucune
+  nouvelle mesure n'arrive, toutes les cartes reçoivent les mêmes octets.
+
+Formats servis :
+  png : PNG niveaux de gris 8 bits (0 = 0, 255 = vmax), ligne 0 = nord
+  bin : tableau uint8 brut (hauteur x largeur), même convention
+"""
+from __future__ import annotations
+
+import struct
+import threading
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from rate_limit import SingleFlight
+from services.sensor_registry import registry
+from services.zones import ZONES
+
+
+POLLUTANT_VMAX = {"pm25": 100.0, "pm10": 150.0}
+IDW_POWER = 2.0
+# Nombre max d'éléments de la matrice distances calculée en une fois
+_CHUNK_ELEMENTS = 4_000_000
+
+_cache: Dict[Tuple, Dict[str, Any]] = {}
+_cache_generation = -1
+_cache_lock = threading.Lock()
+_flight = SingleFlight()
+
+
+def _city_bbox(lats: np.ndarray, lons: np.ndarray) -> Tuple[float, float, float, float]:
+    """Emprise (sud, ouest, nord, est) des capteurs et zones, avec une marge."""
+    zl = np.array([z["lat"] for z in ZONES.values()])
+    zo = np.array([z["lon"] for z in ZONES.values()])
+    all_lat = np.concatenate([lats, zl])
+    all_lon = np.concatenate([lons, zo])
+    south, north = float(all_lat.min()), float(all_lat.max())
+    west, east = float(all_lon.min()), float(all_lon.max())
+    pad_lat = max(0.01, (north - south) * 0.1)
+    pad_lon = max(0.01, (east - west) * 0.1)
+    return south - pad_lat, west - pad_lon, north + pad_lat, east + pad_lon
+
+
+def idw_grid(
+    lats: np.ndarray,
+    lons: np.ndarray,
+    values: np.ndarray,
+    bbox: Tuple[float, float, float, float],
+    width: int,
+    height: int,
+    power: float = IDW_POWER,
+) -> np.ndarray:
+    """Interpolation IDW sur une grille (height, width), ligne 0 = nord."""
+    south, west, north, east = bbox
+    dlat = (north - south) / height
+    dlon = (east - west) / width
+
+    # 1) Moyenne des capteurs par cellule de la grille
+    rows = np.clip(((north - lats) / dlat).astype(np.int64), 0, height - 1)
+    cols = np.clip(((lons - west) / dlon).astype(np.int64), 0, width - 1)
+    flat = rows * width + cols
+    sums = np.bincount(flat, weights=values, minlength=width * height)
+    counts = np.bincount(flat, minlength=width * height)
+    occupied = np.nonzero(counts)[0]
+    src_val = sums[occupied] / counts[occupied]
+    src_r = (occupied // width).astype(np.float64)
+    src_c = (occupied % width).astype(np.float64)
+
+    # 2) IDW en coordonnées de cellules (distance corrigée par cos(lat))
+    kx = (dlon * np.cos(np.radians((south + north) / 2))) / dlat
+    grid = np.empty(width * height, dtype=np.float64)
+    gc = np.arange(width, dtype=np.float64)
+    rows_per_chunk = max(1, _CHUNK_ELEMENTS // max(1, width * len(occupied)))
+
+    for r0 in range(0, height, rows_per_chunk):
+        r1 = min(height, r0 + rows_per_chunk)
+        gr = np.repeat(np.arange(r0, r1, dtype=np.float64), width)
+        gcc = np.tile(gc, r1 - r0)
+        d2 = (gr[:, None] - src_r[None, :]) ** 2 + ((gcc[:, None] - src_c[None, :]) * kx) ** 2
+        w = 1.0 / np.maximum(d2, 1e-12) ** (power / 2)
+        grid[r0 * width:r1 * width] = (w @ src_val) / w.sum(axis=1)
+
+    return grid.reshape(height, width)
+
+
+def _png_gray8(a: np.ndarray) -> bytes:
+    """Encode un tableau uint8 (h, w) en PNG niveaux de gris, sans dépendance."""
+    h, w = a.shape
+    raw = np.hstack([np.zeros((h, 1), dtype=np.uint8), a]).tobytes()
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _render(pollutant: str, width: int, height: int, fmt: str, generation: int) -> Optional[Dict[str, Any]]:
+    sensors = [s for s in registry.latest() if s["active"] and s.get(pollutant) is not None and s["lat"] is not None]
+    if not sensors:
+        return None
+
+    lats = np.fromiter((s["lat"] for s in sensors), dtype=np.float64, count=len(sensors))
+    lons = np.fromiter((s["lon"] for s in sensors), dtype=np.float64, count=len(sensors))
+    vals = np.fromiter((s[pollutant] for s in sensors), dtype=np.float64, count=len(sensors))
+
+    bbox = _city_bbox(lats, lons)
+    grid = idw_grid(lats, lons, vals, bbox, width, height)
+
+    vmax = POLLUTANT_VMAX.get(pollutant, 100.0)
+    packed = np.clip(np.rint(grid / vmax * 255), 0, 255).astype(np.uint8)
+    body = _png_gray8(packed) if fmt == "png" else packed.tobytes()
+
+    return {
+        "body": body,
+        "mimetype": "image/png" if fmt == "png" else "application/octet-stream",
+        "meta": {
+            "bbox": [round(x, 6) for x in bbox],
+            "width": width,
+            "height": height,
+            "vmax": vmax,
+            "sensors": len(sensors),
+            "generation": generation,
+        },
+    }
+
+
+def get_heatmap(pollutant: str = "pm25", width: int = 96, height: int = 96, fmt: str = "png") -> Optional[Dict[str, Any]]:
+    """Grille interpolée (en cache pour la génération d'ingestion courante)."""
+    global _cache_generation
+
+    generation = registry.generation
+    key = (pollutant, width, height, fmt)
+    with _cache_lock:
+        if _cache_generation != generation:
+            _cache.clear()
+            _cache_generation = generation
+        hit = _cache.get(key)
+    if hit is not None:
+        return hit
+
+    result = _flight.do((generation,) + key, lambda: _render(pollutant, width, height, fmt, generation))
+    if result is not None:
+        with _cache_lock:
+            if _cache_generation == generation:
+                _cache[key] = result
+    return result
@@ -0,0 +1,239 @@
+# backend/services/hot_window.py
+"""
+Fenêtre chaude en mémoire : les HOT_WINDOW_DAYS derniers jours des lignes
+fusionnées (air_quality_fused, une par zone et intervalle, services.fusion).
+
+- Un buffer circulaire NumPy par zone : ts (int64, début de l'intervalle)
+  et une colonne float64 par polluant / mesure (NaN = absent). La zone
+  "all" est la fusion à la lecture des buffers de toutes les zones.
+- Chargé depuis la base au démarrage (warm, après vidage de la file
+  d'écriture différée), puis alimenté à chaque insertion
+  (insert_air_quality_data) : la ligne de l'intervalle en cours est
+  remplacée sur place, les points plus vieux que la fenêtre sont écrasés au
+  fil de l'eau. Les insertions arrivées pendant le chargement sont
+  rejouées ensuite.
+- Les lectures du dashboard (séries, agrégats) sont des tranches de tableaux
+  (searchsorted sur ts) au lieu de requêtes SQL + conversion en dicts.
+  Une plage qui commence avant la couverture retombe sur SQLite (None).
+
+Env:
+  HOT_WINDOW_DAYS   profondeur de la fenêtre en jours (défaut 7)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from init_db import DEFAULT_ZONE, get_db_connection
+from write_buffer import get_write_buffer
+
+
+HOT_WINDOW_DAYS = float(os.getenv("HOT_WINDOW_DAYS", "7"))
+
+COLUMNS = ("aqi", "pm25", "pm10", "no2", "o3", "so2", "co", "temperature", "humidity", "wind_speed")
+_COL_INDEX = {c: i for i, c in enumerate(COLUMNS)}
+
+ALL = "all"
+
+
+class _Ring:
+    """Buffer circulaire (ts, valeurs) trié par ts, qui grandit tant que tout est dans la fenêtre."""
+
+    __slots__ = ("ts", "values", "head", "size", "sorted")
+
+    def __init__(self, capacity: int = 1024):
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, len(COLUMNS)), np.nan)
+        self.head = 0
+        self.size = 0
+        self.sorted = True
+
+    @classmethod
+    def from_arrays(cls, ts: np.ndarray, values: np.ndarray) -> "_Ring":
+        ring = cls()
+        ring._reset(ts, values, max(1024, 1 << int(len(ts) * 1.25).bit_length()))
+        return ring
+
+    def _linear(self) -> Tuple[np.ndarray, np.ndarray]:
+        cap = len(self.ts)
+        idx = (self.head + np.arange(self.size)) % cap
+        return self.ts[idx], self.values[idx]
+
+    def _reset(self, ts: np.ndarray, values: np.ndarray, capacity: int) -> None:
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, len(COLUMNS)), np.nan)
+        self.ts[:len(ts)] = ts
+        self.values[:len(ts)] = values
+        self.head = 0
+        self.size = len(ts)
+
+    def upsert(self, ts: int, row: np.ndarray, horizon: int) -> None:
+        """Remplace la dernière ligne si elle a le même ts (intervalle en cours), sinon ajoute."""
+        if self.size:
+            pos = (self.head + self.size - 1) % len(self.ts)
+            if self.ts[pos] == ts:
+                self.values[pos] = row
+                return
+        self.append(ts, row, horizon)
+
+    def put(self, ts: int, row: np.ndarray, horizon: int) -> None:
+        """Remplace la ligne de même ts où qu'elle soit dans le buffer, sinon ajoute (rejeu)."""
+        if self.sorted:
+            for lo, hi in self._segments():
+                i = lo + int(np.searchsorted(self.ts[lo:hi], ts))
+                if i < hi and self.ts[i] == ts:
+                    self.values[i] = row
+                    return
+        self.upsert(ts, row, horizon)
+
+    def append(self, ts: int, row: np.ndarray, horizon: int) -> None:
+        cap = len(self.ts)
+        if self.size == cap:
+            if self.ts[self.head] < horizon:
+                # Le plus ancien point est sorti de la fenêtre : on l'écrase
+                self.head = (self.head + 1) % cap
+                self.size -= 1
+            else:
+                lin_ts, lin_values = self._linear()
+                self._reset(lin_ts, lin_values, cap * 2)
+                cap *= 2
+        if self.size and ts < self.ts[(self.head + self.size - 1) % cap]:
+            self.sorted = False
+        pos = (self.head + self.size) % cap
+        self.ts[pos] = ts
+        self.values[pos] = row
+        self.size += 1
+
+    def _segments(self):
+        """Zones contiguës occupées du buffer (une, ou deux si le buffer boucle)."""
+        cap = len(self.ts)
+        end = self.head + self.size
+        if end <= cap:
+            return ((self.head, end),)
+        return ((self.head, cap), (0, end - cap))
+
+    def since(self, start: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Copie des points de ts > start, triés par ts (seule la tranche demandée est copiée)."""
+        if not self.sorted:
+            lin_ts, lin_values = self._linear()
+            order = np.argsort(lin_ts, kind="stable")
+            self._reset(lin_ts[order], lin_values[order], len(self.ts))
+            self.sorted = True
+        parts_ts, parts_values = [], []
+        for lo, hi in self._segments():
+            i = lo + int(np.searchsorted(self.ts[lo:hi], start, side="right"))
+            if i < hi:
+                parts_ts.append(self.ts[i:hi])
+                parts_values.append(self.values[i:hi])
+        if not parts_ts:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, len(COLUMNS)))
+        return np.concatenate(parts_ts), np.concatenate(parts_values)
+
+
+class HotWindow:
+    def __init__(self, db_path: str, days: float = HOT_WINDOW_DAYS):
+        self.db_path = db_path
+        self.span = int(days * 86400)
+        self._rings: Dict[str, _Ring] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+        # Insertions reçues pendant warm(), rejouées une fois la fenêtre chargée
+        self._pending: Optional[List[Tuple[str, int, np.ndarray]]] = None
+        # Début de la période couverte (ts) ; avant, lecture SQLite
+        self.coverage_start: Optional[int] = None
+
+    def warm(self) -> int:
+        """Charge la fenêtre depuis air_quality_fused. Retourne le nombre de lignes chargées."""
+        start = int(time.time()) - self.span
+        with self._lock:
+            self._pending = []
+        # Lignes fusionnées encore en file d'écriture : à valider avant la lecture
+        get_write_buffer(self.db_path).flush()
+        conn = get_db_connection(self.db_path)
+        cursor = conn.execute(f'''
+            SELECT zone, ts, {", ".join(COLUMNS)}
+            FROM air_quality_fused
+            WHERE ts > ?
+            ORDER BY ts
+        ''', (start,))
+
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(50000)
+            if not rows:
+                break
+            zones = np.array([r[0] or DEFAULT_ZONE for r in rows], dtype=object)
+            block = np.array([tuple(r)[1:] for r in rows], dtype=np.float64)  # None -> NaN
+            chunks.append((zones, block))
+        conn.close()
+
+        rings: Dict[str, _Ring] = {}
+        total = sum(len(z) for z, _ in chunks)
+        if chunks:
+            zones = np.concatenate([z for z, _ in chunks])
+            block = np.concatenate([b for _, b in chunks])
+            ts, values = block[:, 0].astype(np.int64), block[:, 1:]
+            for zone in set(zones.tolist()):
+                mask = zones == zone
+                rings[zone] = _Ring.from_arrays(ts[mask], values[mask])
+
+        with self._lock:
+            horizon = int(time.time()) - self.span
+            for zone, ts, row in self._pending or ():
+                rings.setdefault(zone, _Ring()).put(ts, row, horizon)
+            self._pending = None
+            self._rings = rings
+            self.coverage_start = start
+            self.loaded = True
+        return total
+
+    def append(self, zone: Optional[str], ts: int, data: Dict[str, object]) -> None:
+        """Ajoute ou met à jour la ligne fusionnée d'un intervalle (mise de côté pendant warm())."""
+        row = np.array([data.get(c) if data.get(c) is not None else np.nan for c in COLUMNS], dtype=np.float64)
+        horizon = int(time.time()) - self.span
+        with self._lock:
+            # Pendant warm(), la ligne est rejouée sur la fenêtre rechargée ;
+            # avant le premier chargement, la base suffit
+            if self._pending is not None:
+                self._pending.append((zone or DEFAULT_ZONE, ts, row))
+            if not self.loaded:
+                return
+            self._rings.setdefault(zone or DEFAULT_ZONE, _Ring()).upsert(ts, row, horizon)
+
+    def covers(self, start: int) -> bool:
+        return self.loaded and self.coverage_start is not None and start >= self.coverage_start
+
+    def series(self, zone: str, column: str, start: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(ts, valeurs) d'une colonne pour ts > start, ou None si hors couverture."""
+        if not self.covers(start):
+            return None
+        col = _COL_INDEX[column]
+        with self._lock:
+            if zone != ALL:
+                ring = self._rings.get(zone)
+                if ring is None:
+                    return np.zeros(0, dtype=np.int64), np.zeros(0)
+                ts, values = ring.since(start)
+                return ts, values[:, col]
+            parts = [ring.since(start) for ring in self._rings.values()]
+        # Toutes zones : quelques lignes par intervalle, fusionnées par ts
+        if not parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        ts = np.concatenate([p[0] for p in parts])
+        values = np.concatenate([p[1][:, col] for p in parts])
+        order = np.argsort(ts, kind="stable")
+        return ts[order], values[order]
+
+    def zones_since(self, start: int) -> Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+        """{zone: (ts, valeurs toutes colonnes)} pour ts > start, ou None si hors couverture."""
+        if not self.covers(start):
+            return None
+        with self._lock:
+            return {z: ring.since(start) for z, ring in self._rings.items()}
+
+
+hot_window = HotWindow(os.getenv("DATABASE_PATH", "/tmp/smartcity.db"))
@@ -0,0 +1,231 @@
+# backend/services/mobility_pipeline.py
+"""
+Séries temporelles de mobilité par zone (trafic, charge transports, incidents).
+
+- Échantillonnage : tâche "mobility_sample" du planificateur. Chaque passage
+  calcule d'un coup (services.mobility_service.mobility_grid, numpy) toutes
+  les zones sur tous les instants manquants depuis le dernier échantillon
+  (rattrapage après un arrêt ou table vide, borné à MOBILITY_CATCHUP
+  secondes) et les écrit dans la table mobility par la file d'écriture différée.
+- Agrégats : tâche "mobility_rollup". Les heures complètes sont agrégées
+  dans mobility_hourly (moyenne / max du trafic, moyenne de la charge,
+  somme des incidents) ; les échantillons bruts plus vieux que
+  MOBILITY_RAW_DAYS jours sont ensuite purgés.
+- Lecture (series) : les courtes périodes lisent les échantillons bruts,
+  les longues l'agrégat horaire complété par l'heure en cours (agrégée à
+  la volée).
+
+Env:
+  MOBILITY_SAMPLE     pas d'échantillonnage en secondes (défaut 300)
+  MOBILITY_CATCHUP    rattrapage max après un arrêt, en secondes (défaut 7 jours)
+  MOBILITY_RAW_DAYS   rétention des échantillons bruts, en jours (défaut 7)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from init_db import get_db_connection
+from services.mobility_service import mobility_grid
+from services.zones import ZONES
+from write_buffer import get_write_buffer, write
+
+
+SAMPLE = int(os.getenv("MOBILITY_SAMPLE", "300"))
+CATCHUP = int(os.getenv("MOBILITY_CATCHUP", str(7 * 86400)))
+RAW_DAYS = int(os.getenv("MOBILITY_RAW_DAYS", "7"))
+
+HOUR = 3600
+
+# Zones réelles ("all" est un agrégat calculé à la lecture)
+MOBILITY_ZONES = tuple(z for z in ZONES if z != "all")
+
+# Période -> (durée en secondes, résolution)
+PERIODS = {
+    "1h": (HOUR, "raw"),
+    "6h": (6 * HOUR, "raw"),
+    "24h": (24 * HOUR, "raw"),
+    "7d": (7 * 86400, "hour"),
+    "30d": (30 * 86400, "hour"),
+}
+
+_INSERT = '''
+    INSERT OR IGNORE INTO mobility (zone, ts, traffic_index, pt_load, incidents)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+_ROLLUP = f'''
+    INSERT OR REPLACE INTO mobility_hourly
+    (zone, ts, traffic_avg, traffic_max, pt_load_avg, incidents, samples)
+    SELECT zone, ts - ts % {HOUR}, AVG(traffic_index), MAX(traffic_index),
+           AVG(pt_load), SUM(incidents), COUNT(*)
+    FROM mobility
+    WHERE ts >= ? AND ts < ?
+    GROUP BY zone, ts - ts % {HOUR}
+'''
+
+# (ts, trafic, charge transports, incidents) tableaux numpy par zone
+Series = Dict[str, Tuple[Any, Any, Any, Any]]
+
+
+class MobilityPipeline:
+    def __init__(self, db_path: str, zones: Sequence[str] = MOBILITY_ZONES):
+        self.db_path = db_path
+        self.zones = tuple(zones)
+        # Dernier instant échantillonné (évite de relire la DB à chaque passage)
+        self._last: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _last_sample(self) -> Optional[int]:
+        conn = get_db_connection(self.db_path)
+        try:
+            return conn.execute("SELECT MAX(ts) FROM mobility").fetchone()[0]
+        finally:
+            conn.close()
+
+    def sample(self, now: Optional[int] = None) -> int:
+        """Échantillonne toutes les zones jusqu'à now (rattrapage compris). Retourne le nombre de lignes."""
+        import numpy as np
+
+        now = int(now if now is not None else time.time())
+        end = now - now % SAMPLE
+        with self._lock:
+            last = self._last if self._last is not None else self._last_sample()
+            # Table vide : historique simulé sur la fenêtre de rattrapage
+            start = end - CATCHUP if last is None else max(last + SAMPLE, end - CATCHUP)
+            start -= start % SAMPLE
+            if start > end:
+                return 0
+            ts = np.arange(start, end + 1, SAMPLE, dtype=np.int64)
+            traffic, pt_load, incidents = mobility_grid(self.zones, ts)
+
+            # Lignes (zone, ts, ...) zone par zone, sans boucle Python par valeur
+            n = len(ts)
+            rows = list(zip(
+                np.repeat(np.array(self.zones, dtype=object), n).tolist(),
+                np.tile(ts, len(self.zones)).tolist(),
+                traffic.ravel().tolist(),
+                pt_load.ravel().tolist(),
+                incidents.ravel().tolist(),
+            ))
+            write(self.db_path, [(_INSERT, rows, True)])
+            self._last = end
+        return len(rows)
+
+    def rollup(self, now: Optional[int] = None) -> int:
+        """Agrège les heures complètes pas encore agrégées, puis purge les bruts expirés."""
+        now = int(now if now is not None else time.time())
+        current_hour = now - now % HOUR
+        # Échantillons encore en file d'écriture : à valider avant d'agréger
+        get_write_buffer(self.db_path).flush()
+        conn = get_db_connection(self.db_path)
+        try:
+            done = conn.execute("SELECT MAX(ts) FROM mobility_hourly").fetchone()[0]
+            if done is None:
+                first = conn.execute("SELECT MIN(ts) FROM mobility").fetchone()[0]
+                start = None if first is None else first - first % HOUR
+            else:
+                start = done + HOUR
+            count = 0
+            if start is not None and start < current_hour:
+                count = conn.execute(_ROLLUP, (start, current_hour)).rowcount
+            conn.execute("DELETE FROM mobility WHERE ts < ?", (current_hour - RAW_DAYS * 86400,))
+            conn.commit()
+        finally:
+            conn.close()
+        return count
+
+    def series(self, period: str, zones: Sequence[str]) -> Tuple[str, Series]:
+        """Séries par zone sur la période : (résolution, {zone: (ts, trafic, charge, incidents)})."""
+        import numpy as np
+
+        span, resolution = PERIODS.get(period, PERIODS["24h"])
+        now = int(time.time())
+        since = now - span
+        marks = ",".join("?" for _ in zones)
+        conn = get_db_connection(self.db_path)
+        try:
+            if resolution == "raw":
+                rows = conn.execute(f'''
+                    SELECT zone, ts, traffic_index, pt_load, incidents
+                    FROM mobility
+                    WHERE zone IN ({marks}) AND ts > ?
+                    ORDER BY zone, ts
+                ''', (*zones, since)).fetchall()
+            else:
+                # Agrégat horaire + heures pas encore agrégées (dont l'heure en
+                # cours), agrégées à la volée depuis les bruts
+                rolled = conn.execute("SELECT MAX(ts) FROM mobility_hourly").fetchone()[0]
+                boundary = max(since - since % HOUR, rolled + HOUR if rolled is not None else 0)
+                rows = conn.execute(f'''
+                    SELECT zone, ts, traffic_avg, pt_load_avg, incidents
+                    FROM mobility_hourly
+                    WHERE zone IN ({marks}) AND ts > ? AND ts < ?
+                    UNION ALL
+                    SELECT zone, ts - ts % {HOUR}, AVG(traffic_index), AVG(pt_load), SUM(incidents)
+                    FROM mobility
+                    WHERE zone IN ({marks}) AND ts >= ?
+                    GROUP BY zone, ts - ts % {HOUR}
+                    ORDER BY 1, 2
+                ''', (*zones, since, boundary, *zones, boundary)).fetchall()
+        finally:
+            conn.close()
+
+        if not rows:
+            return resolution, {}
+        zone_col = np.array([r[0] for r in rows], dtype=object)
+        values = np.array([tuple(r[1:]) for r in rows], dtype=np.float64)
+        # Lignes triées par zone : une coupure par changement de zone
+        cuts = np.flatnonzero(zone_col[1:] != zone_col[:-1]) + 1
+        out: Series = {}
+        for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(rows)]):
+            block = values[lo:hi]
+            out[zone_col[lo]] = (block[:, 0].astype(np.int64), block[:, 1], block[:, 2], block[:, 3])
+        return resolution, out
+
+
+def simulated_series(period: str, zones: Sequence[str]) -> Tuple[str, Series]:
+    """Séries calculées directement (table mobility encore vide), même pas que l'échantillonnage."""
+    import numpy as np
+
+    span, resolution = PERIODS.get(period, PERIODS["24h"])
+    step = SAMPLE if resolution == "raw" else HOUR
+    now = int(time.time())
+    end = now - now % step
+    ts = np.arange(end - span + step, end + 1, step, dtype=np.int64)
+    traffic, pt_load, incidents = mobility_grid(zones, ts)
+    return resolution, {
+        z: (ts, traffic[i].astype(np.float64), pt_load[i].astype(np.float64), incidents[i].astype(np.float64))
+        for i, z in enumerate(zones)
+    }
+
+
+def combine_zones(series: Series) -> Tuple[Any, Any, Any, Any]:
+    """Série "all" : moyenne du trafic et de la charge, somme des incidents, par instant."""
+    import numpy as np
+
+    ts = np.concatenate([s[0] for s in series.values()])
+    cols = [np.concatenate([s[k] for s in series.values()]) for k in (1, 2, 3)]
+    uniq, inverse = np.unique(ts, return_inverse=True)
+    counts = np.bincount(inverse)
+    traffic = np.bincount(inverse, weights=cols[0]) / counts
+    pt_load = np.bincount(inverse, weights=cols[1]) / counts
+    incidents = np.bincount(inverse, weights=cols[2])
+    return uniq, traffic, pt_load, incidents
+
+
+mobility = MobilityPipeline(os.getenv("DATABASE_PATH", "/tmp/smartcity.db"))
+
+
+def sample_mobility() -> None:
+    n = mobility.sample()
+    if n:
+        print(f"🚦 Mobilité: {n} échantillon(s) écrit(s)")
+
+
+def rollup_mobility() -> None:
+    n = mobility.rollup()
+    if n:
+        print(f"🚦 Mobilité: {n} agrégat(s) horaire(s) écrit(s)")
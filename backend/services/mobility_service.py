@@ -1,10 +1,15 @@
 import math
 import time
 
+# Niveau de trafic de base par zone (les autres zones : DEFAULT_BASE)
+ZONE_BASE = {"centre": 55, "nord": 45}
+DEFAULT_BASE = 65
+
+
 def mobility_index(zone_id: str) -> dict:
     # Simu stable + “rythme jour/nuit”
     t = time.time()
-    base = 55 if zone_id == "centre" else 45 if zone_id == "nord" else 65
+    base = ZONE_BASE.get(zone_id, DEFAULT_BASE)
     wave = 15 * (math.sin(t / 1800) + 1) / 2  # 0..15
     traffic = round(min(100, base + wave))
     pt_load = round(min(100, 40 + wave))
@@ -15,3 +20,19 @@ def mobility_index(zone_id: str) -> dict:
         "publicTransportLoad": pt_load,
         "incidentsCount": incidents,
     }
+
+
+def mobility_grid(zones, ts):
+    """
+    Même calcul que mobility_index, vectorisé sur zones x instants.
+
+    Retourne (traffic, pt_load, incidents), tableaux numpy (len(zones), len(ts)).
+    """
+    import numpy as np
+
+    base = np.array([ZONE_BASE.get(z, DEFAULT_BASE) for z in zones], dtype=np.float64)[:, None]
+    wave = 15 * (np.sin(np.asarray(ts, dtype=np.float64) / 1800) + 1) / 2
+    traffic = np.round(np.minimum(100, base + wave))
+    pt_load = np.broadcast_to(np.round(np.minimum(100, 40 + wave)), traffic.shape)
+    incidents = (traffic > 75).astype(np.int64)
+    return traffic.astype(np.int64), pt_load.astype(np.int64), incidents
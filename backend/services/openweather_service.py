@@ -1,5 +1,6 @@
 import os
-import requests
+
+from http_client import upstream
 
 def fetch_weather(lat: float, lon: float) -> dict:
     key = os.getenv("OPENWEATHER_KEY", "")
@@ -9,9 +10,8 @@ def fetch_weather(lat: float, lon: float) -> dict:
 
     url = "https://api.openweathermap.org/data/2.5/weather"
     params = {"lat": lat, "lon": lon, "appid": key, "units": "metric"}
-    r = requests.get(url, params=params, timeout=10)
-    r.raise_for_status()
-    d = r.json()
+    # Session partagée + cache 10 min + disjoncteur (dernière valeur connue si panne)
+    d = upstream.get_json("openweather", url, params=params, default_ttl=600)
 
     return {
         "temp": round(d["main"]["temp"]),
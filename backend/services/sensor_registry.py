@@ -0,0 +1,221 @@
+# backend/services/sensor_registry.py
+"""
+Registre des capteurs IoT avec cache mémoire de la dernière mesure par capteur.
+
+- Le cache est chargé une fois depuis les tables sensors / iot_data, puis mis
+  à jour à chaque ingestion (écriture DB + cache dans le même appel).
+- /api/sensors/latest et les compteurs actifs/total du snapshot sont servis
+  depuis la mémoire, sans requête SQL, en O(nombre de capteurs).
+- Un capteur est "actif" si sa dernière mesure date de moins de
+  SENSOR_STALE_AFTER secondes.
+- Chaque mesure passe par le détecteur d'anomalies (services.anomaly) :
+  valeurs aberrantes écrites à NULL, statut "degraded" / "active" mis à jour
+  dans sensors.status seulement quand il change.
+
+Env:
+  SENSOR_STALE_AFTER   fraîcheur max d'un capteur actif, en secondes (défaut 1800)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from init_db import get_db_connection, insert_iot_readings
+from services.anomaly import detector
+from services.spatial_index import GridIndex
+from services.zones import ZONES
+
+
+STALE_AFTER = int(os.getenv("SENSOR_STALE_AFTER", "1800"))
+
+_FIELDS = ("pm25", "pm10", "temperature", "humidity", "battery_level")
+
+
+def _to_epoch(ts: Optional[str]) -> Optional[float]:
+    if not ts:
+        return None
+    try:
+        return datetime.strptime(ts[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def _to_sql_ts(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _num(v: Any) -> Optional[float]:
+    try:
+        return None if v is None else float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class SensorRegistry:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self.index = GridIndex()
+        # Incrémenté à chaque ingestion (clé des caches dérivés, ex. heatmap)
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                conn = get_db_connection(self.db_path)
+                rows = conn.execute('''
+                    SELECT s.sensor_id, s.name, s.zone, s.latitude, s.longitude,
+                           s.status, s.last_update,
+                           d.pm25, d.pm10, d.temperature, d.humidity, d.battery_level
+                    FROM sensors s
+                    LEFT JOIN iot_data d ON d.id = (
+                        SELECT MAX(id) FROM iot_data WHERE sensor_id = s.sensor_id
+                    )
+                ''').fetchall()
+                conn.close()
+            except Exception as e:
+                print(f"⚠️ Chargement du registre capteurs impossible: {e}")
+                rows = []
+
+            for row in rows:
+                r = dict(row)
+                self._latest[r["sensor_id"]] = {
+                    "sensor_id": r["sensor_id"],
+                    "name": r["name"],
+                    "zone_id": r["zone"],
+                    "lat": r["latitude"],
+                    "lon": r["longitude"],
+                    "status": r["status"] or "active",
+                    "ts": _to_epoch(r["last_update"]),
+                    **{k: r[k] for k in _FIELDS},
+                }
+                self.index.upsert(r["sensor_id"], r["latitude"], r["longitude"])
+            self._loaded = True
+
+    def _normalize(self, raw: Dict[str, Any], now: float) -> Dict[str, Any]:
+        sensor_id = str(raw.get("sensor_id") or "").strip()
+        if not sensor_id:
+            raise ValueError("sensor_id manquant")
+
+        zone = raw.get("zone") or raw.get("zone_id")
+        known = self._latest.get(sensor_id, {})
+        center = ZONES.get(zone or known.get("zone_id") or "", {})
+        lat = _num(raw.get("latitude", raw.get("lat")))
+        lon = _num(raw.get("longitude", raw.get("lon")))
+        if lat is None or lon is None:
+            lat = known.get("lat", center.get("lat"))
+            lon = known.get("lon", center.get("lon"))
+
+        return {
+            "sensor_id": sensor_id,
+            "name": raw.get("name"),
+            "zone": zone,
+            "latitude": lat,
+            "longitude": lon,
+            "timestamp": _to_sql_ts(now),
+            "ts": now,
+            **{k: _num(raw.get(k)) for k in _FIELDS},
+        }
+
+    def ingest(self, readings: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Écrit un lot de mesures (une transaction) puis met à jour le cache.
+
+        Lève ValueError si une mesure n'a pas de sensor_id.
+        """
+        self._ensure_loaded()
+        now = time.time()
+        rows = [self._normalize(r, now) for r in readings]
+        if not rows:
+            return rows
+
+        # Contrôle en ligne : valeurs aberrantes à None, statut degraded/active
+        statuses: Dict[str, str] = {}
+        for r in rows:
+            sensor_id = r["sensor_id"]
+            cleaned, flags, rate = detector.inspect(sensor_id, r, _FIELDS)
+            r.update(cleaned, quality=";".join(flags) or None)
+            current = statuses.get(sensor_id) or self._latest.get(sensor_id, {}).get("status")
+            statuses[sensor_id] = detector.next_status(current, rate)
+        changes = [
+            (status, sensor_id) for sensor_id, status in statuses.items()
+            if status != (self._latest.get(sensor_id, {}).get("status") or "active")
+        ]
+
+        insert_iot_readings(rows, self.db_path, changes)
+        for status, sensor_id in changes:
+            print(f"{'⚠️' if status == 'degraded' else '✅'} Capteur {sensor_id}: {status}")
+
+        with self._lock:
+            for r in rows:
+                prev = self._latest.get(r["sensor_id"], {})
+                self._latest[r["sensor_id"]] = {
+                    "sensor_id": r["sensor_id"],
+                    "name": r["name"] or prev.get("name"),
+                    "zone_id": r["zone"] or prev.get("zone_id"),
+                    "lat": r["latitude"],
+                    "lon": r["longitude"],
+                    "status": statuses[r["sensor_id"]],
+                    "ts": now,
+                    **{k: r[k] for k in _FIELDS},
+                }
+                self.index.upsert(r["sensor_id"], r["latitude"], r["longitude"])
+            self.generation += 1
+        return rows
+
+    @staticmethod
+    def _public(s: Dict[str, Any], now: float) -> Dict[str, Any]:
+        ts = s["ts"]
+        return {
+            "sensor_id": s["sensor_id"],
+            "name": s["name"],
+            "zone_id": s["zone_id"],
+            "lat": s["lat"],
+            "lon": s["lon"],
+            **{k: s[k] for k in _FIELDS},
+            "status": s["status"],
+            "active": ts is not None and now - ts <= STALE_AFTER,
+            "last_update": _to_sql_ts(ts) if ts else None,
+        }
+
+    def latest(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Dernière mesure de chaque capteur (depuis la mémoire)."""
+        self._ensure_loaded()
+        now = now or time.time()
+        return [self._public(s, now) for s in list(self._latest.values())]
+
+    def in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Dict[str, Any]]:
+        """Capteurs visibles dans une vue de carte (via l'index spatial)."""
+        self._ensure_loaded()
+        now = time.time()
+        keys = self.index.bbox(min_lat, min_lon, max_lat, max_lon)
+        return [self._public(self._latest[k], now) for k in keys if k in self._latest]
+
+    def nearest(self, lat: float, lon: float, k: int = 5) -> List[Dict[str, Any]]:
+        """k capteurs les plus proches d'un point, avec leur distance en mètres."""
+        self._ensure_loaded()
+        now = time.time()
+        return [
+            {**self._public(self._latest[key], now), "distance_m": round(d)}
+            for key, d in self.index.nearest(lat, lon, k)
+            if key in self._latest
+        ]
+
+    def counts(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Compteurs actifs / total calculés sur la fraîcheur de last_update."""
+        self._ensure_loaded()
+        now = now or time.time()
+        states = list(self._latest.values())
+        active = sum(1 for s in states if s["ts"] is not None and now - s["ts"] <= STALE_AFTER)
+        return {"active": active, "total": len(states)}
+
+
+registry = SensorRegistry(os.getenv("DATABASE_PATH", "/tmp/smartcity.db"))
@@ -0,0 +1,236 @@
+# backend/services/snapshot_store.py
+"""
+État courant matérialisé par zone (dernière mesure + alertes récentes).
+
+- Une ligne par zone dans la table zone_snapshot (+ une ligne "all" toutes
+  zones), avec une copie en mémoire.
+- Les mesures sont les lignes fusionnées toutes sources (services.fusion).
+- Tenue à jour par le chemin d'ingestion : insert_air_quality_data et
+  insert_alert ajoutent l'upsert de zone_snapshot à leur propre écriture
+  différée (même transaction que la mesure ou l'alerte).
+- /api/snapshot devient une lecture de dict : son coût ne dépend plus de la
+  taille d'air_quality ni d'alerts.
+- Au premier accès, la copie mémoire est chargée depuis zone_snapshot ; si
+  la table est vide (base existante), elle est reconstruite depuis
+  air_quality_fused et alerts. Tant que cette reconstruction ne trouve
+  aucune mesure (air_quality_fused pas encore reconstruit par la fusion au
+  démarrage) ou échoue, elle est retentée à l'accès suivant.
+
+Env:
+  SNAPSHOT_TOP_ALERTS   alertes conservées par zone (défaut 10)
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from init_db import DEFAULT_ZONE, get_db_connection
+
+
+TOP_ALERTS = int(os.getenv("SNAPSHOT_TOP_ALERTS", "10"))
+
+# Les alertes du snapshot sont celles des dernières 24 h
+ALERT_TTL = 24 * 3600
+
+MEASURES = ("aqi", "pm25", "pm10", "no2", "o3", "so2", "co", "temperature", "humidity", "wind_speed")
+
+ALL = "all"
+
+_UPSERT = '''
+    INSERT INTO zone_snapshot (zone, ts, timestamp, source, measures, alerts, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(zone) DO UPDATE SET
+        ts = excluded.ts,
+        timestamp = excluded.timestamp,
+        source = excluded.source,
+        measures = excluded.measures,
+        alerts = excluded.alerts,
+        updated_at = excluded.updated_at
+'''
+
+
+def _to_epoch(ts: Optional[str]) -> Optional[int]:
+    if not ts:
+        return None
+    try:
+        return int(datetime.strptime(ts[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+
+def _format_alert(alert: Dict[str, Any], alert_id: Any, timestamp: str) -> Dict[str, Any]:
+    """Alerte au format du frontend (+ ts pour l'expiration)"""
+    return {
+        "id": f"alert_{alert_id}",
+        "title": alert.get('title'),
+        "message": alert.get('message'),
+        "zone": alert.get('zone'),
+        "time": timestamp.split(' ')[1] if ' ' in timestamp else timestamp,
+        "people": alert.get('people_affected') or 0,
+        "pollutant": alert.get('pollutant'),
+        "value": alert.get('value'),
+        "unit": alert.get('unit') or 'µg/m³',
+        "threshold": alert.get('threshold'),
+        "critical": bool(alert.get('critical')),
+        "read": bool(alert.get('read', False)),
+        "ts": _to_epoch(timestamp),
+    }
+
+
+class SnapshotStore:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        # zone_snapshot vide à la première lecture : les tentatives suivantes
+        # repartent d'air_quality_fused (la table ne contient alors que les
+        # upserts des mesures reçues entre-temps)
+        self._rebuilding = False
+        self._alert_seq = 0
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            conn = None
+            try:
+                conn = get_db_connection(self.db_path)
+                rows = [] if self._rebuilding else conn.execute("SELECT * FROM zone_snapshot").fetchall()
+                if rows:
+                    for row in rows:
+                        self._states[row["zone"]] = {
+                            "ts": row["ts"],
+                            "timestamp": row["timestamp"],
+                            "source": row["source"],
+                            "measures": json.loads(row["measures"] or "{}"),
+                            "alerts": json.loads(row["alerts"] or "[]"),
+                        }
+                    self._loaded = True
+                else:
+                    self._rebuilding = True
+                    # Aucune mesure : réessayé à l'accès suivant
+                    self._loaded = self._rebuild(conn) > 0
+            except Exception as e:
+                print(f"⚠️ Snapshot matérialisé indisponible: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _rebuild(self, conn) -> int:
+        """Reconstruction depuis air_quality_fused / alerts (table vide). Retourne le nombre de zones mesurées."""
+        # Colonnes "nues" avec MAX() : SQLite renvoie la ligne du maximum
+        rows = conn.execute(f'''
+            SELECT zone AS z, MAX(ts) AS ts, last_ts, sources, {", ".join(MEASURES)}
+            FROM air_quality_fused
+            GROUP BY zone
+        ''').fetchall()
+        for row in rows:
+            ts = row["last_ts"] or row["ts"]
+            timestamp = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            source = "+".join(json.loads(row["sources"] or "{}"))
+            measures = {c: row[c] for c in MEASURES}
+            self._apply_measure(row["z"], ts, timestamp, source, measures)
+
+        alert_rows = conn.execute('''
+            SELECT * FROM alerts
+            WHERE timestamp > datetime('now', '-1 day')
+            ORDER BY timestamp ASC
+        ''').fetchall()
+        # Alertes déjà reçues en mémoire (tentative précédente) : pas de doublon
+        known = {(a.get("ts"), a.get("zone"), a.get("title"))
+                 for state in self._states.values() for a in state["alerts"]}
+        for row in alert_rows:
+            alert = _format_alert(dict(row), row["id"], row["timestamp"] or "")
+            if (alert["ts"], alert["zone"], alert["title"]) not in known:
+                self._apply_alert(alert)
+
+        if self._states:
+            conn.executemany(_UPSERT, [self._row(zone) for zone in self._states])
+            conn.commit()
+            print(f"✅ Snapshot matérialisé reconstruit ({len(self._states)} zones)")
+        return len(rows)
+
+    # ---------- Mise à jour (appelée sous self._lock) ----------
+
+    def _apply_measure(self, zone: str, ts: Optional[int], timestamp: str, source: Optional[str],
+                       measures: Dict[str, Any]) -> List[str]:
+        changed = []
+        for key in (ALL, zone):
+            state = self._states.setdefault(key, {"ts": None, "timestamp": None, "source": None,
+                                                  "measures": {}, "alerts": []})
+            if state["ts"] is not None and ts is not None and ts < state["ts"]:
+                continue  # mesure plus ancienne que l'état courant
+            state.update(ts=ts, timestamp=timestamp, source=source, measures=measures)
+            changed.append(key)
+        return changed
+
+    def _apply_alert(self, alert: Dict[str, Any]) -> List[str]:
+        horizon = (alert["ts"] or time.time()) - ALERT_TTL
+        changed = []
+        for key in dict.fromkeys((ALL, alert.get("zone") or ALL)):
+            state = self._states.setdefault(key, {"ts": None, "timestamp": None, "source": None,
+                                                  "measures": {}, "alerts": []})
+            kept = [a for a in state["alerts"] if (a.get("ts") or 0) > horizon]
+            state["alerts"] = ([alert] + kept)[:TOP_ALERTS]
+            changed.append(key)
+        return changed
+
+    def _row(self, zone: str) -> tuple:
+        state = self._states[zone]
+        return (
+            zone,
+            state["ts"],
+            state["timestamp"],
+            state["source"],
+            json.dumps(state["measures"]),
+            json.dumps(state["alerts"], ensure_ascii=False),
+            datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        )
+
+    # ---------- API ----------
+
+    def measure_ops(self, zone: str, ts: int, timestamp: str, data: Dict[str, Any]) -> list:
+        """Met à jour l'état de la zone ; retourne les upserts à joindre à l'écriture de la mesure."""
+        self._ensure_loaded()
+        measures = {c: data.get(c) for c in MEASURES}
+        with self._lock:
+            changed = self._apply_measure(zone or DEFAULT_ZONE, ts, timestamp, data.get('source'), measures)
+            rows = [self._row(key) for key in changed]
+        return [(_UPSERT, rows, True)] if rows else []
+
+    def alert_ops(self, alert: Dict[str, Any], timestamp: str) -> list:
+        """Ajoute l'alerte en tête des alertes de sa zone ; retourne les upserts à joindre."""
+        self._ensure_loaded()
+        with self._lock:
+            # L'id SQL n'est connu qu'au commit différé : id local au snapshot
+            self._alert_seq += 1
+            formatted = _format_alert(alert, f"{int(time.time())}_{self._alert_seq}", timestamp)
+            rows = [self._row(key) for key in self._apply_alert(formatted)]
+        return [(_UPSERT, rows, True)]
+
+    def get(self, zone: str = ALL, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """État courant de la zone (mesures, alertes de moins de 24 h), ou None."""
+        self._ensure_loaded()
+        horizon = (now or time.time()) - ALERT_TTL
+        with self._lock:
+            state = self._states.get(zone)
+            if state is None:
+                return None
+            return {
+                "ts": state["ts"],
+                "timestamp": state["timestamp"],
+                "source": state["source"],
+                "measures": dict(state["measures"]),
+                "alerts": [{k: v for k, v in a.items() if k != "ts"}
+                           for a in state["alerts"] if (a.get("ts") or 0) > horizon],
+            }
+
+
+snapshot_store = SnapshotStore(os.getenv("DATABASE_PATH", "/tmp/smartcity.db"))
@@ -0,0 +1,148 @@
+# backend/services/spatial_index.py
+"""
+Index spatial en mémoire (grille régulière) pour les capteurs.
+
+- bbox(...)    : capteurs visibles dans la vue de la carte, en ne visitant que
+                 les cellules recouvertes par la vue.
+- nearest(...) : k capteurs les plus proches d'un point, par anneaux de
+                 cellules croissants autour du point.
+
+Les positions sont en degrés (lat/lon). Les distances utilisent une projection
+équirectangulaire locale, largement suffisante à l'échelle d'une ville.
+
+Env:
+  SPATIAL_CELL_DEG   taille d'une cellule en degrés (défaut 0.01, ~1 km)
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+
+CELL_DEG = float(os.getenv("SPATIAL_CELL_DEG", "0.01"))
+METERS_PER_DEG = 111_320.0
+
+Cell = Tuple[int, int]
+
+
+class GridIndex:
+    def __init__(self, cell_deg: float = CELL_DEG):
+        self.cell = cell_deg
+        self._cells: Dict[Cell, Set[str]] = {}
+        self._pos: Dict[str, Tuple[float, float]] = {}
+        # Étendue des cellules déjà occupées (jamais réduite, borne les anneaux)
+        self._extent: Optional[Tuple[int, int, int, int]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def _cell_of(self, lat: float, lon: float) -> Cell:
+        return (math.floor(lat / self.cell), math.floor(lon / self.cell))
+
+    def upsert(self, key: str, lat: Optional[float], lon: Optional[float]) -> None:
+        """Ajoute ou déplace un point (ignoré si la position est inconnue)."""
+        if lat is None or lon is None:
+            return
+        with self._lock:
+            old = self._pos.get(key)
+            if old == (lat, lon):
+                return
+            if old is not None:
+                self._discard(key, old)
+            self._pos[key] = (lat, lon)
+            i, j = self._cell_of(lat, lon)
+            self._cells.setdefault((i, j), set()).add(key)
+            if self._extent is None:
+                self._extent = (i, i, j, j)
+            else:
+                i0, i1, j0, j1 = self._extent
+                self._extent = (min(i0, i), max(i1, i), min(j0, j), max(j1, j))
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            old = self._pos.pop(key, None)
+            if old is not None:
+                self._discard(key, old)
+
+    def _discard(self, key: str, pos: Tuple[float, float]) -> None:
+        c = self._cell_of(*pos)
+        members = self._cells.get(c)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._cells[c]
+
+    def bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[str]:
+        """Clés des points dans la boîte [min_lat, max_lat] x [min_lon, max_lon]."""
+        if min_lat > max_lat:
+            min_lat, max_lat = max_lat, min_lat
+        if min_lon > max_lon:
+            min_lon, max_lon = max_lon, min_lon
+
+        c0 = self._cell_of(min_lat, min_lon)
+        c1 = self._cell_of(max_lat, max_lon)
+        n_cells = (c1[0] - c0[0] + 1) * (c1[1] - c0[1] + 1)
+
+        out: List[str] = []
+        with self._lock:
+            if n_cells > len(self._cells):
+                # Vue très large : parcourir les cellules occupées suffit
+                cells = [c for c in self._cells if c0[0] <= c[0] <= c1[0] and c0[1] <= c[1] <= c1[1]]
+            else:
+                cells = [(i, j) for i in range(c0[0], c1[0] + 1) for j in range(c0[1], c1[1] + 1)]
+
+            for c in cells:
+                for key in self._cells.get(c, ()):
+                    lat, lon = self._pos[key]
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                        out.append(key)
+        return out
+
+    def nearest(self, lat: float, lon: float, k: int = 5) -> List[Tuple[str, float]]:
+        """k plus proches voisins : liste de (clé, distance en mètres), triée."""
+        if k <= 0:
+            return []
+        kx = math.cos(math.radians(lat))
+        ci, cj = self._cell_of(lat, lon)
+
+        with self._lock:
+            if not self._cells:
+                return []
+            # Nombre d'anneaux au-delà duquel toutes les cellules occupées sont visitées
+            i0, i1, j0, j1 = self._extent
+            max_ring = max(abs(i0 - ci), abs(i1 - ci), abs(j0 - cj), abs(j1 - cj))
+
+            best: List[Tuple[float, str]] = []  # tas max via distances négatives
+            ring = 0
+            while ring <= max_ring:
+                for c in self._ring_cells(ci, cj, ring):
+                    for key in self._cells.get(c, ()):
+                        plat, plon = self._pos[key]
+                        d = math.hypot(plat - lat, (plon - lon) * kx)
+                        if len(best) < k:
+                            heapq.heappush(best, (-d, key))
+                        elif d < -best[0][0]:
+                            heapq.heapreplace(best, (-d, key))
+
+                # Tout point hors des anneaux visités est à plus de ring * cell * cos(lat)
+                if len(best) == k and -best[0][0] <= ring * self.cell * min(1.0, kx):
+                    break
+                ring += 1
+
+        return [(key, -d * METERS_PER_DEG) for d, key in sorted(best, reverse=True)]
+
+    @staticmethod
+    def _ring_cells(ci: int, cj: int, r: int):
+        if r == 0:
+            yield (ci, cj)
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
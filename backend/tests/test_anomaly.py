@@ -0,0 +1,35 @@
+# backend/tests/test_anomaly.py
+"""Détection des valeurs figées : fenêtre en temps, statut avec hystérésis."""
+from iot_simulator import ZONES, _tick
+from services.anomaly import AnomalyDetector
+
+FIELDS = ("pm25", "pm10", "no2", "o3", "temperature", "humidity")
+
+
+def test_quantized_simulator_readings_are_not_stuck():
+    detector = AnomalyDetector()
+    status = {zone: "active" for zone in ZONES}
+    for tick in range(40):
+        for zone in ZONES:
+            kpis = _tick(zone, tick)["kpis"]
+            _, flags, rate = detector.inspect(f"sim-{zone}", kpis, FIELDS, now=tick * 60.0)
+            assert not [f for f in flags if ":stuck=" in f]
+            status[zone] = detector.next_status(status[zone], rate)
+    assert set(status.values()) == {"active"}
+
+
+def test_stuck_sensor_degrades_then_recovers():
+    detector = AnomalyDetector()
+    status, now = "active", 0.0
+    for _ in range(40):  # 40 mesures identiques, une toutes les 5 min
+        _, flags, rate = detector.inspect("s1", {"pm25": 12.0}, ("pm25",), now=now)
+        status = detector.next_status(status, rate)
+        now += 300
+    assert flags == ["pm25:stuck=12"]
+    assert status == "degraded"
+
+    for i in range(60):  # le capteur varie à nouveau
+        _, flags, rate = detector.inspect("s1", {"pm25": 12.0 + (i % 5)}, ("pm25",), now=now)
+        status = detector.next_status(status, rate)
+        now += 300
+    assert status == "active"
@@ -0,0 +1,10 @@
+# backend/tests/test_cold_start.py
+"""Démarrage à froid : même sonde que import_budget.py, dans un interpréteur neuf."""
+from import_budget import IMPORT_BUDGET_MS, _env, probe
+
+
+def test_cold_start_within_budget(tmp_path):
+    env = {**_env(str(tmp_path)), "DATABASE_PATH": str(tmp_path / "smartcity.db")}
+    result = probe(env)
+    assert result["heavy"] == [], f"bibliothèques lourdes chargées au démarrage: {result['heavy']}"
+    assert result["import_ms"] < IMPORT_BUDGET_MS, f"import app: {result['import_ms']:.0f} ms"
@@ -0,0 +1,76 @@
+# backend/tests/test_columnar_archive.py
+"""Archive colonnaire : série fusionnée, intervalles mis à jour remplacés."""
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from columnar_archive import ColumnarArchive
+from init_db import init_database
+
+T0 = 1_790_000_100  # début d'intervalle (multiple de 300)
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "t.db")
+    init_database(path)
+    return path
+
+
+def _fused(db, zone, ts, pm25):
+    stamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    conn = sqlite3.connect(db)
+    conn.execute('''
+        INSERT INTO air_quality_fused (zone, ts, pm25, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(zone, ts) DO UPDATE SET pm25 = excluded.pm25, updated_at = excluded.updated_at
+    ''', (zone, ts, pm25, stamp))
+    conn.commit()
+    conn.close()
+
+
+def test_sync_archives_fused_rows_and_zone_mean(db, tmp_path):
+    arch = ColumnarArchive(str(tmp_path / "archive"))
+    _fused(db, "centre", T0, 10.0)
+    _fused(db, "nord", T0, 20.0)
+    _fused(db, "centre", T0 + 300, 12.0)
+    arch.sync(db)
+
+    ts, values = arch.read("pm25", "centre", T0 - 1, T0 + 300)
+    assert ts.tolist() == [T0, T0 + 300]
+    assert values.tolist() == [10.0, 12.0]
+    _, values = arch.read("pm25", "all", T0 - 1, T0 + 300)
+    assert values.tolist() == [15.0, 12.0]
+
+
+def test_updated_interval_replaces_archived_value(db, tmp_path):
+    arch = ColumnarArchive(str(tmp_path / "archive"))
+    _fused(db, "centre", T0, 10.0)
+    _fused(db, "centre", T0 + 300, 12.0)
+    arch.sync(db)
+
+    # Intervalle encore ouvert (nouvelle source) + import d'historique plus ancien
+    _fused(db, "centre", T0, 14.0)
+    _fused(db, "centre", T0 - 600, 8.0)
+    arch.sync(db)
+    arch.sync(db)  # recouvrement : relire les mêmes lignes ne crée pas de doublon
+
+    ts, values = arch.read("pm25", "centre", T0 - 3600, T0 + 300)
+    assert ts.tolist() == [T0 - 600, T0, T0 + 300]
+    assert values.tolist() == [8.0, 14.0, 12.0]
+
+
+def test_raw_archive_format_is_rebuilt(db, tmp_path):
+    root = tmp_path / "archive"
+    stale = root / "pm25" / "centre"
+    stale.mkdir(parents=True)
+    (stale / "2020-01.bin").write_bytes(b"\0" * 16)
+    (root / "manifest.json").write_text(json.dumps({"last_id": 42, "counts": {}}))
+
+    _fused(db, "centre", T0, 10.0)
+    arch = ColumnarArchive(str(root))
+    arch.sync(db)
+    assert not os.path.exists(stale / "2020-01.bin")
+    assert arch.read("pm25", "centre", T0 - 1, T0)[1].tolist() == [10.0]
@@ -0,0 +1,54 @@
+# backend/tests/test_correlations.py
+"""Corrélations : le calcul en ligne et le recalcul exact lisent la même série fusionnée."""
+import random
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+from init_db import init_database
+from services.correlations import CorrelationStore
+from services.fusion import BUCKET, bucket_of
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "t.db")
+    init_database(path)
+    return path
+
+
+def test_recompute_matches_incremental_state(db):
+    rng = random.Random(7)
+    # Hors de l'historique rechargé au démarrage (HISTORY), avant le seuil du recalcul
+    end = bucket_of(int(time.time())) - 86400
+    rows = []
+    for i in range(400):
+        if rng.random() < 0.1:
+            continue  # intervalle sans mesure
+        rows.append({
+            "zone": "centre",
+            "ts": end - (400 - i) * BUCKET,
+            "wind_speed": rng.uniform(0, 20),
+            "humidity": None if rng.random() < 0.1 else rng.uniform(30, 90),
+            "pm25": rng.uniform(5, 60),
+            "no2": rng.uniform(10, 80),
+        })
+
+    online = CorrelationStore(db)
+    for row in rows:
+        online.observe("centre", row["ts"], row)
+    online.observe("centre", end, {})  # clôt le dernier intervalle
+
+    conn = sqlite3.connect(db)
+    conn.executemany('''
+        INSERT INTO air_quality_fused (zone, ts, wind_speed, humidity, pm25, no2)
+        VALUES (:zone, :ts, :wind_speed, :humidity, :pm25, :no2)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+    exact = CorrelationStore(db)
+    assert exact.recompute() == 1
+    np.testing.assert_allclose(exact._states["centre"], online._states["centre"], rtol=1e-4, atol=1e-3)
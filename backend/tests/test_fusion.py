@@ -0,0 +1,27 @@
+# backend/tests/test_fusion.py
+"""Fusion multi-sources : unités homogènes avant la moyenne pondérée."""
+import pytest
+
+from services.aqi import aqi_value, epa_concentration
+from services.fusion import fuse
+
+
+def test_epa_concentration_inverts_sub_index():
+    for pollutant, conc in (("pm25", 26.0), ("pm10", 80.0), ("no2", 60.0), ("o3", 90.0)):
+        sub_index = aqi_value(**{pollutant: conc})
+        assert float(epa_concentration(pollutant, sub_index)) == pytest.approx(conc, rel=0.03)
+
+
+def test_aqicn_sub_indices_are_not_averaged_with_concentrations():
+    # AQICN publie des sous-indices (iaqi), OpenWeather des µg/m³
+    fused = fuse({
+        "AQICN": (1000, {"aqi": 80, "pm25": 80}),
+        "OpenWeather": (1000, {"aqi": None, "pm25": 26}),
+    })
+    assert 24 <= fused["pm25"] <= 27
+    assert 75 <= fused["aqi"] <= 85
+
+
+def test_single_aqicn_reading_keeps_its_aqi():
+    fused = fuse({"AQICN": (1000, {"aqi": 80, "pm25": 80})})
+    assert fused["aqi"] == pytest.approx(80, abs=1)
@@ -0,0 +1,49 @@
+# backend/tests/test_hot_window.py
+"""Fenêtre chaude : aucune ligne perdue pendant le chargement."""
+import sqlite3
+import time
+
+import pytest
+
+from init_db import init_database
+from services.hot_window import HotWindow
+from write_buffer import get_write_buffer, write
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "t.db")
+    init_database(path)
+    return path
+
+
+def test_warm_sees_queued_writes(db):
+    ts = int(time.time()) - 600
+    write(db, [("INSERT INTO air_quality_fused (zone, ts, pm25) VALUES (?, ?, ?)", ("centre", ts, 12.0), False)])
+    window = HotWindow(db)
+    window.warm()
+    assert window.series("centre", "pm25", ts - 1)[1].tolist() == [12.0]
+
+
+def test_appends_during_warm_are_replayed(db, monkeypatch):
+    now = int(time.time())
+    conn = sqlite3.connect(db)
+    conn.executemany("INSERT INTO air_quality_fused (zone, ts, pm25) VALUES (?, ?, ?)",
+                     [("centre", now - 900, 10.0), ("centre", now - 600, 11.0)])
+    conn.commit()
+    conn.close()
+
+    window = HotWindow(db)
+    flush = get_write_buffer(db).flush
+
+    def flush_then_ingest(*args, **kwargs):
+        # Insertions arrivées pendant la lecture de la fenêtre
+        window.append("centre", now - 600, {"pm25": 13.0})
+        window.append("centre", now - 300, {"pm25": 14.0})
+        return flush(*args, **kwargs)
+
+    monkeypatch.setattr(get_write_buffer(db), "flush", flush_then_ingest)
+    window.warm()
+    ts, values = window.series("centre", "pm25", now - 3600)
+    assert ts.tolist() == [now - 900, now - 600, now - 300]
+    assert values.tolist() == [10.0, 13.0, 14.0]
@@ -0,0 +1,35 @@
+# backend/tests/test_init_db.py
+"""Migration ts/zone des lignes historiques d'air_quality."""
+import sqlite3
+
+from init_db import backfill_air_quality_epoch, flush_writes, init_database, insert_air_quality_data
+
+
+def test_backfill_epoch_terminates_on_unparseable_timestamps(tmp_path):
+    db = str(tmp_path / "t.db")
+    init_database(db)
+    conn = sqlite3.connect(db)
+    conn.executemany(
+        "INSERT INTO air_quality (timestamp, city, source, pm25) VALUES (?, 'Paris', 'AQICN', 10)",
+        [("2024-01-01 10:00:00",), ("2024-01-01T10:00:00+0100",), ("not-a-date",), ("2024-01-02 10:00:00",)],
+    )
+    # Lignes d'avant la migration : ts / zone absents
+    conn.execute("UPDATE air_quality SET ts = NULL, zone = NULL")
+    conn.commit()
+
+    assert backfill_air_quality_epoch(db, batch_size=1, pause=0) == 2
+
+    rows = conn.execute("SELECT timestamp, ts, zone FROM air_quality ORDER BY id").fetchall()
+    conn.close()
+    assert [r[1] for r in rows] == [1704103200, None, None, 1704189600]
+    assert all(r[2] for r in rows)
+
+
+def test_missing_aqi_recomputed_from_aqicn_sub_indices(tmp_path):
+    db = str(tmp_path / "t.db")
+    init_database(db)
+    # AQI absent (ou mis en quarantaine) : les colonnes AQICN sont des sous-indices, pas des µg/m³
+    written = insert_air_quality_data(
+        {"city": "Paris", "zone": "centre", "source": "AQICN", "aqi": None, "pm25": 80}, db_path=db)
+    flush_writes()
+    assert 75 <= written["aqi"] <= 85
@@ -0,0 +1,32 @@
+# backend/tests/test_iot_auth.py
+import pytest
+from flask import Flask
+
+import routes.iot as iot
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(iot.iot_bp)
+    return app.test_client()
+
+
+def test_ingest_refused_without_configured_key(client, monkeypatch):
+    monkeypatch.setattr(iot, "IOT_API_KEY", "")
+    monkeypatch.setattr(iot, "IOT_ALLOW_ANONYMOUS", False)
+    assert client.post("/api/iot/ingest", json={}).status_code == 503
+
+
+def test_ingest_checks_key(client, monkeypatch):
+    monkeypatch.setattr(iot, "IOT_API_KEY", "secret")
+    assert client.post("/api/iot/ingest", json={}).status_code == 401
+    assert client.post("/api/iot/ingest", json={}, headers={"X-API-Key": "wrong"}).status_code == 401
+    # Clé valide : on passe au contrôle du contenu (payload vide -> 400)
+    assert client.post("/api/iot/ingest", json={}, headers={"X-API-Key": "secret"}).status_code == 400
+
+
+def test_anonymous_ingest_opt_in(client, monkeypatch):
+    monkeypatch.setattr(iot, "IOT_API_KEY", "")
+    monkeypatch.setattr(iot, "IOT_ALLOW_ANONYMOUS", True)
+    assert client.post("/api/iot/ingest", json={}).status_code == 400
@@ -0,0 +1,52 @@
+# backend/tests/test_snapshot_store.py
+"""Snapshot matérialisé : pas de données de démo figées avant la reconstruction de la fusion."""
+import sqlite3
+import time
+
+import pytest
+
+from init_db import init_database
+from services.snapshot_store import SnapshotStore
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "t.db")
+    init_database(path)
+    return path
+
+
+def _fused(db, zone, ts, pm25):
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO air_quality_fused (zone, ts, pm25, sources) VALUES (?, ?, ?, '{}')",
+                 (zone, ts, pm25))
+    conn.commit()
+    conn.close()
+
+
+def test_rebuild_retried_until_fused_rows_exist(db):
+    store = SnapshotStore(db)
+    # Premier /api/snapshot avant que fusion.warm() ait reconstruit air_quality_fused
+    assert store.get("centre") is None
+
+    now = int(time.time())
+    _fused(db, "centre", now - 300, 12.0)
+    _fused(db, "nord", now - 300, 20.0)
+    assert store.get("centre")["measures"]["pm25"] == 12.0
+    assert store.get("nord")["measures"]["pm25"] == 20.0
+
+
+def test_alerts_received_before_rebuild_are_not_duplicated(db):
+    store = SnapshotStore(db)
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    alert = {"title": "Pic PM2.5", "zone": "centre", "pollutant": "PM25", "value": 80}
+    store.alert_ops(alert, timestamp)
+
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO alerts (timestamp, title, zone, pollutant, value) VALUES (?, ?, ?, ?, ?)",
+                 (timestamp, alert["title"], alert["zone"], alert["pollutant"], alert["value"]))
+    conn.commit()
+    conn.close()
+    _fused(db, "centre", int(time.time()) - 300, 12.0)
+
+    assert len(store.get("centre")["alerts"]) == 1
@@ -0,0 +1,216 @@
+# backend/write_buffer.py
+"""
+File d'écriture différée (write-behind) avec commit groupé pour SQLite.
+
+Les écritures (ingestion IoT, collecte, alertes, logs) sont mises en file
+par l'appelant, qui repart sans attendre le disque. Un thread écrivain unique
+par base les applique par groupes dans une seule transaction : un fsync pour
+des centaines d'écritures au lieu d'un par écriture.
+
+- Un groupe est validé dès WRITE_BATCH_MAX écritures, ou WRITE_FLUSH_MS après
+  la première écriture du groupe.
+- Backpressure : au-delà de WRITE_QUEUE_MAX écritures en attente, submit()
+  bloque jusqu'à WRITE_BLOCK_TIMEOUT secondes puis lève WriteBufferFull.
+- Une écriture en échec n'entraîne pas le reste du groupe : le groupe est
+  rejoué écriture par écriture et seule la fautive est écartée (loggée).
+- flush() attend que tout ce qui a été soumis soit validé ; close() est
+  appelé à la sortie du processus (atexit) pour ne rien perdre à l'arrêt.
+  Un crash brutal peut perdre au plus le groupe en cours (~WRITE_FLUSH_MS).
+
+Env:
+  WRITE_BEHIND          true|false (défaut true ; false = écriture synchrone)
+  WRITE_BATCH_MAX       écritures max par transaction (défaut 500)
+  WRITE_FLUSH_MS        délai max avant commit, en ms (défaut 50)
+  WRITE_QUEUE_MAX       écritures max en attente (défaut 20000)
+  WRITE_BLOCK_TIMEOUT   attente max d'un producteur si la file est pleine (défaut 5)
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+
+ENABLED = os.getenv("WRITE_BEHIND", "true").lower() == "true"
+BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "500"))
+FLUSH_MS = float(os.getenv("WRITE_FLUSH_MS", "50"))
+QUEUE_MAX = int(os.getenv("WRITE_QUEUE_MAX", "20000"))
+BLOCK_TIMEOUT = float(os.getenv("WRITE_BLOCK_TIMEOUT", "5"))
+
+# (sql, paramètres, executemany ?) ; une écriture = une ou plusieurs opérations atomiques
+Operation = Tuple[str, Any, bool]
+
+
+class WriteBufferFull(Exception):
+    """File d'écriture pleine : le disque ne suit pas le débit entrant."""
+
+
+def _apply(conn: sqlite3.Connection, ops: Sequence[Operation]) -> None:
+    for sql, params, many in ops:
+        if many:
+            conn.executemany(sql, params)
+        else:
+            conn.execute(sql, params)
+
+
+class WriteBuffer:
+    def __init__(self, db_path: str, batch_max: int = BATCH_MAX, flush_ms: float = FLUSH_MS,
+                 queue_max: int = QUEUE_MAX):
+        self.db_path = db_path
+        self.batch_max = batch_max
+        self.flush_interval = flush_ms / 1000
+        self._queue: "queue.Queue[Tuple[int, List[Operation]]]" = queue.Queue(maxsize=queue_max)
+        self._submitted = 0
+        self._committed = 0
+        self._submit_lock = threading.Lock()  # numérotation + mise en file, dans l'ordre
+        self._cond = threading.Condition()    # avancement des commits
+        self._closed = False
+        self.stats = {"writes": 0, "groups": 0, "dropped": 0}
+        self._thread = threading.Thread(target=self._run, name=f"write-buffer:{db_path}", daemon=True)
+        self._thread.start()
+
+    def submit(self, ops: List[Operation]) -> int:
+        """Met une écriture en file ; retourne son numéro de séquence."""
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("WriteBuffer fermé")
+            seq = self._submitted + 1
+            try:
+                self._queue.put((seq, ops), timeout=BLOCK_TIMEOUT)
+            except queue.Full:
+                raise WriteBufferFull(f"{self._queue.qsize()} écritures en attente") from None
+            self._submitted = seq
+        return seq
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Attend la validation de tout ce qui a été soumis avant l'appel."""
+        with self._submit_lock:
+            target = self._submitted
+        with self._cond:
+            return self._cond.wait_for(lambda: self._committed >= target, timeout)
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Vide la file puis arrête le thread écrivain."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put((0, []))  # sentinelle de fin
+        self._thread.join(timeout)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _mark_committed(self, seq: int) -> None:
+        with self._cond:
+            self._committed = max(self._committed, seq)
+            self._cond.notify_all()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _commit_group(self, conn: sqlite3.Connection, group: List[Tuple[int, List[Operation]]]) -> None:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for _, ops in group:
+                _apply(conn, ops)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Rejouer une par une pour n'écarter que l'écriture fautive
+            for seq, ops in group:
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    _apply(conn, ops)
+                    conn.execute("COMMIT")
+                except sqlite3.Error as item_error:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    self.stats["dropped"] += 1
+                    print(f"❌ Écriture différée #{seq} abandonnée: {item_error} (groupe: {e})")
+        self.stats["writes"] += len(group)
+        self.stats["groups"] += 1
+
+    def _run(self) -> None:
+        conn = self._connect()
+        stop = False
+        while not stop:
+            seq, ops = self._queue.get()
+            if seq == 0:
+                break
+            group = [(seq, ops)]
+            deadline = time.monotonic() + self.flush_interval
+            while len(group) < self.batch_max:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item[0] == 0:
+                    stop = True
+                    break
+                group.append(item)
+            try:
+                self._commit_group(conn, group)
+            except Exception as e:
+                print(f"❌ Commit groupé impossible ({len(group)} écritures): {e}")
+                self.stats["dropped"] += len(group)
+            self._mark_committed(group[-1][0])
+        # File vidée jusqu'à la sentinelle : tout ce qui a été soumis est validé
+        conn.close()
+
+
+_buffers: Dict[str, WriteBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def get_write_buffer(db_path: str) -> WriteBuffer:
+    with _buffers_lock:
+        buf = _buffers.get(db_path)
+        if buf is None:
+            buf = _buffers[db_path] = WriteBuffer(db_path)
+        return buf
+
+
+def write(db_path: str, ops: List[Operation]) -> None:
+    """Écriture différée (ou immédiate si WRITE_BEHIND=false) d'un groupe d'opérations atomique."""
+    if ENABLED:
+        get_write_buffer(db_path).submit(ops)
+        return
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            _apply(conn, ops)
+    finally:
+        conn.close()
+
+
+def flush_all(timeout: float = 30.0) -> None:
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+    for buf in buffers:
+        buf.flush(timeout)
+
+
+def buffer_stats() -> Dict[str, Dict[str, Any]]:
+    with _buffers_lock:
+        buffers = dict(_buffers)
+    return {path: {**buf.stats, "pending": buf.pending()} for path, buf in buffers.items()}
+
+
+@atexit.register
+def close_all() -> None:
+    """Vidage garanti à l'arrêt du processus."""
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+    for buf in buffers:
+        buf.close()
@@ -2,6 +2,7 @@ import { useMemo, useState, useEffect } from "react"
 import { MapContainer, TileLayer, Marker, Popup } from "react-leaflet"
 import { ZONES, aqiLabel, toneClasses } from "../lib/mockData.js"
 import L from "leaflet"
+import { apiGet } from "../lib/api.js"
 
 // Coordonnées Paris intra-muros
 const ZONE_COORDS = {
@@ -208,18 +209,12 @@ export default function Carte() {
     const fetchData = async () => {
       try {
         // Récupérer données air quality
-        const response = await fetch('http://localhost:10000/api/sensors/latest')
-        if (response.ok) {
-          const data = await response.json()
-          setRealData(data)
-        }
-        
+        const data = await apiGet("/api/sensors/latest")
+        setRealData(data)
+
         // Récupérer données météo réelles
-        const weatherResponse = await fetch('http://localhost:10000/api/weather/current')
-        if (weatherResponse.ok) {
-          const weather = await weatherResponse.json()
-          setWeatherData(weather)
-        }
+        const weather = await apiGet("/api/weather/current")
+        setWeatherData(weather)
       } catch (error) {
         console.log("Données API non disponibles, utilisation des données de simulation")
       }
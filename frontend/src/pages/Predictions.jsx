@@ -1,8 +1,12 @@
-import { useMemo, useState } from "react"
+import { useEffect, useMemo, useState } from "react"
 import { Area, AreaChart, CartesianGrid, ResponsiveContainer, Tooltip, XAxis, YAxis, Line, LineChart } from "recharts"
+import { apiGet } from "../lib/api"
 import { ZONES, aqiLabel, toneClasses } from "../lib/mockData.js"
 
+// AQI : prévu par le modèle du backend (/api/predictions), avec bande et confiance.
+// Les autres séries sont simulées (pas de modèle côté backend).
 const POLLUTANTS = [
+  { id: "AQI", label: "AQI", unit: "", threshold: 100 },
   { id: "PM25", label: "PM2.5", unit: "µg/m³", threshold: 50 },
   { id: "PM10", label: "PM10", unit: "µg/m³", threshold: 80 },
   { id: "NO2", label: "NO2", unit: "µg/m³", threshold: 200 },
@@ -16,22 +20,14 @@ const PREDICTION_TYPES = [
   { id: "trafic", label: "Trafic" },
 ]
 
-const MODELS = [
-  { id: "rf", label: "Random Forest", baseConfidence: 78 },
-  { id: "xgb", label: "XGBoost", baseConfidence: 82 },
-]
-
-function buildPollutionSeries(base, hours, pollutantId, modelId) {
+function buildPollutionSeries(base, hours, pollutantId) {
   const now = new Date()
   const series = []
   const multiplier = pollutantId === "PM10" ? 1.5 : pollutantId === "NO2" ? 1.3 : pollutantId === "O3" ? 1.2 : pollutantId === "SO2" ? 0.8 : 1
   
-  // Variation selon le modèle (Random Forest vs XGBoost)
-  const modelVariation = modelId === "xgb" ? 0 : 3 // XGBoost plus précis, RF légèrement plus haut
-  
   for (let i = 0; i <= hours; i += 1) {
     const t = new Date(now.getTime() + i * 60 * 60 * 1000)
-    const v = Math.round((base * multiplier) + 6 * Math.sin(i / 3) + (i % 4 === 0 ? 2 : 0) + modelVariation)
+    const v = Math.round((base * multiplier) + 6 * Math.sin(i / 3) + (i % 4 === 0 ? 2 : 0))
     series.push({
       h: t.toLocaleTimeString("fr-FR", { hour: "2-digit", minute: "2-digit" }),
       value: Math.max(5, v),
@@ -40,21 +36,18 @@ function buildPollutionSeries(base, hours, pollutantId, modelId) {
   return series
 }
 
-function buildMeteoSeries(hours, modelId) {
+function buildMeteoSeries(hours) {
   const now = new Date()
   const series = []
   const baseTemp = 2 // Température réelle fin décembre Paris
   const baseHumidity = 85
   const baseWind = 12
   
-  // Variation selon le modèle
-  const tempAdjust = modelId === "xgb" ? 0 : 0.5
-  
   for (let i = 0; i <= hours; i += 1) {
     const t = new Date(now.getTime() + i * 60 * 60 * 1000)
     series.push({
       h: t.toLocaleTimeString("fr-FR", { hour: "2-digit", minute: "2-digit" }),
-      temperature: Math.round(baseTemp + 3 * Math.sin(i / 4) + (Math.random() - 0.5) * 2 + tempAdjust),
+      temperature: Math.round(baseTemp + 3 * Math.sin(i / 4) + (Math.random() - 0.5) * 2),
       humidity: baseHumidity + Math.round(5 * Math.cos(i / 3)) + (Math.random() - 0.5) * 3,
       wind: baseWind + Math.round(4 * Math.sin(i / 5)) + (Math.random() - 0.5) * 2,
     })
@@ -62,14 +55,11 @@ function buildMeteoSeries(hours, modelId) {
   return series
 }
 
-function buildTraficSeries(hours, zoneId, modelId) {
+function buildTraficSeries(hours, zoneId) {
   const now = new Date()
   const series = []
   const baseTraffic = zoneId === "industrie" ? 120 : zoneId === "centre" ? 85 : 45
   
-  // Variation selon le modèle
-  const modelAdjust = modelId === "xgb" ? 0 : 5
-  
   for (let i = 0; i <= hours; i += 1) {
     const t = new Date(now.getTime() + i * 60 * 60 * 1000)
     const hour = t.getHours()
@@ -78,67 +68,83 @@ function buildTraficSeries(hours, zoneId, modelId) {
     
     series.push({
       h: t.toLocaleTimeString("fr-FR", { hour: "2-digit", minute: "2-digit" }),
-      value: Math.round(baseTraffic * peakMultiplier + (Math.random() - 0.5) * 15 + modelAdjust),
+      value: Math.round(baseTraffic * peakMultiplier + (Math.random() - 0.5) * 15),
     })
   }
   return series
 }
 
-function confidenceForModel(modelId, zoneId, pollutantId, predictionType) {
-  const model = MODELS.find(m => m.id === modelId)
-  let baseConf = model?.baseConfidence || 75
-  
-  // Ajustement selon le type de prédiction
-  if (predictionType === "pollution") {
-    // Ajustement selon le polluant
-    const pollutantAdjust = {
-      "PM25": 0,      // Référence
-      "PM10": -3,     // Un peu moins précis
-      "NO2": -5,      // Plus difficile à prédire
-      "O3": -7,       // Très variable selon météo
-      "SO2": -4,      // Moins de données historiques
-    }
-    baseConf += pollutantAdjust[pollutantId] || 0
-  } else if (predictionType === "meteo") {
-    baseConf += 5   // Météo généralement plus prévisible
-  } else if (predictionType === "trafic") {
-    baseConf -= 2   // Trafic plus aléatoire (événements imprévisibles)
-  }
-  
-  // Ajustement selon la zone
-  const zoneAdjust = zoneId === "centre" ? 3 : zoneId === "industrie" ? -5 : 0
-  baseConf += zoneAdjust
-  
-  return Math.min(95, Math.max(60, Math.round(baseConf)))
+// Échéances /api/predictions -> points du graphique (bande = [lower, upper])
+function fromForecast(points) {
+  return points.map((p) => ({
+    h: p.time,
+    value: p.aqi,
+    band: [p.lower, p.upper],
+    confidence: p.confidence,
+  }))
 }
 
 export default function Predictions() {
   const [zoneId, setZoneId] = useState("centre")
   const [horizon, setHorizon] = useState(24)
   const [predictionType, setPredictionType] = useState("pollution")
-  const [pollutantId, setPollutantId] = useState("PM25")
-  const [selectedModel, setSelectedModel] = useState("xgb") // Modèle sélectionnable par l'utilisateur
+  const [pollutantId, setPollutantId] = useState("AQI")
+  // Réponse de /api/predictions pour la zone et l'horizon (null : indisponible)
+  const [forecast, setForecast] = useState(null)
+
+  const wantsModel = predictionType === "pollution" && pollutantId === "AQI"
+
+  useEffect(() => {
+    if (!wantsModel) return
+    let alive = true
+
+    async function refresh() {
+      try {
+        const qs = new URLSearchParams({ zone: zoneId, hours: String(horizon) }).toString()
+        const data = await apiGet(`/api/predictions?${qs}`)
+        if (!alive) return
+        const points = data?.zones?.[zoneId]
+        setForecast(Array.isArray(points) && points.length ? { ...data, points } : null)
+      } catch {
+        // backend indisponible ou persona non autorisé : simulation
+        if (alive) setForecast(null)
+      }
+    }
+
+    refresh()
+    return () => {
+      alive = false
+    }
+  }, [wantsModel, zoneId, horizon])
+
+  // Réponse de la sélection courante seulement (pas celle d'une zone / horizon précédent)
+  const modelData = wantsModel && forecast?.zone === zoneId && forecast?.hours === horizon ? forecast : null
 
   const series = useMemo(() => {
+    if (modelData) {
+      return fromForecast(modelData.points)
+    }
     if (predictionType === "pollution") {
       const base = zoneId === "industrie" ? 44 : zoneId === "centre" ? 36 : 28
-      return buildPollutionSeries(base, horizon, pollutantId, selectedModel)
+      return buildPollutionSeries(base, horizon, pollutantId)
     } else if (predictionType === "meteo") {
-      return buildMeteoSeries(horizon, selectedModel)
+      return buildMeteoSeries(horizon)
     } else {
-      return buildTraficSeries(horizon, zoneId, selectedModel)
+      return buildTraficSeries(horizon, zoneId)
     }
-  }, [zoneId, horizon, predictionType, pollutantId, selectedModel])
+  }, [modelData, zoneId, horizon, predictionType, pollutantId])
 
   const selectedPollutant = POLLUTANTS.find(p => p.id === pollutantId)
   const last = series[series.length - 1]
-  const conf = confidenceForModel(selectedModel, zoneId, pollutantId, predictionType)
+  // Confiance du modèle (part des arbres d'accord) ; rien à afficher pour une simulation
+  const conf = modelData ? last?.confidence : null
   
   const lastValue = predictionType === "pollution" ? last?.value : 
                     predictionType === "meteo" ? last?.temperature :
                     last?.value
 
-  const aqiApprox = predictionType === "pollution" ? Math.round(lastValue * 2) : null
+  const aqiApprox = predictionType !== "pollution" ? null :
+                    pollutantId === "AQI" ? lastValue : Math.round(lastValue * 2)
   const aqiInfo = aqiApprox ? aqiLabel(aqiApprox) : null
 
   const trend = useMemo(() => {
@@ -175,11 +181,9 @@ export default function Predictions() {
     }
   }, [zoneId, predictionType])
 
-  // Calculer les prédictions de tous les modèles pour comparaison
-  const modelComparisons = MODELS.map(model => ({
-    ...model,
-    confidence: confidenceForModel(model.id, zoneId, pollutantId, predictionType)
-  })).sort((a, b) => b.confidence - a.confidence) // Trier par confiance décroissante
+  const valueText = predictionType === "meteo" ? `${lastValue}°C` :
+                    predictionType === "trafic" ? `${lastValue} véh/h` :
+                    pollutantId === "AQI" ? `${lastValue}` : `${lastValue} ${selectedPollutant?.unit}`
 
   return (
     <div className="space-y-5">
@@ -275,17 +279,19 @@ export default function Predictions() {
           <Metric 
             title={predictionType === "pollution" ? `${selectedPollutant?.label} prévu` : 
                    predictionType === "meteo" ? "Température" : "Trafic"} 
-            value={predictionType === "pollution" ? `${lastValue} ${selectedPollutant?.unit}` :
-                   predictionType === "meteo" ? `${lastValue}°C` :
-                   `${lastValue} véh/h`}
-            hint="à la fin de l'horizon" 
+            value={valueText}
+            hint={modelData ? `bande ${last?.band[0]} – ${last?.band[1]}, fin de l'horizon` : "à la fin de l'horizon"}
           />
           <Metric title="Tendance" value={trend} hint="sur la période" />
-          <Metric title="Confiance" value={`${conf}%`} hint="fiabilité estimée" />
-          <Metric 
-            title="Modèle" 
-            value={MODELS.find(m => m.id === selectedModel)?.label} 
-            hint="sélectionné manuellement" 
+          <Metric
+            title="Confiance"
+            value={conf != null ? `${conf}%` : "—"}
+            hint={conf != null ? "arbres du modèle en accord" : "simulation, sans modèle"}
+          />
+          <Metric
+            title="Modèle"
+            value={modelData ? "Random Forest" : "Simulation"}
+            hint={modelData ? `${modelData.trees} arbres` : wantsModel ? "prévisions indisponibles" : "pas de modèle pour cette série"}
           />
         </div>
 
@@ -315,6 +321,16 @@ export default function Predictions() {
                   <XAxis dataKey="h" tick={{ fontSize: 12 }} />
                   <YAxis tick={{ fontSize: 12 }} />
                   <Tooltip />
+                  {modelData && (
+                    <Area
+                      type="monotone"
+                      dataKey="band"
+                      stroke="none"
+                      fill="#9ca3af"
+                      fillOpacity={0.25}
+                      name={`Intervalle ${Math.round(modelData.interval * 100)} %`}
+                    />
+                  )}
                   <Area type="monotone" dataKey="value" stroke="currentColor" fill="url(#valueFill)" />
                 </AreaChart>
               )}
@@ -335,21 +351,37 @@ export default function Predictions() {
             </ul>
           </Panel>
 
-          <Panel title="Comparaison des modèles">
-            <div className="space-y-3">
-              {modelComparisons.map((model) => (
-                <ModelCard 
-                  key={model.id}
-                  name={model.label}
-                  confidence={model.confidence}
-                  isSelected={selectedModel === model.id}
-                  onClick={() => setSelectedModel(model.id)}
-                />
-              ))}
-            </div>
-            <div className="mt-3 text-xs text-gray-500">
-              Cliquez sur un modèle pour voir ses prédictions
-            </div>
+          <Panel title="Modèle de prévision">
+            {modelData ? (
+              <ul className="space-y-2 text-sm text-gray-700">
+                <li className="flex justify-between gap-3">
+                  <span className="text-gray-500">Modèle</span>
+                  <span className="font-medium">Random Forest ({modelData.trees} arbres)</span>
+                </li>
+                <li className="flex justify-between gap-3">
+                  <span className="text-gray-500">Entraîné le</span>
+                  <span className="font-medium">{modelData.model || "—"}</span>
+                </li>
+                <li className="flex justify-between gap-3">
+                  <span className="text-gray-500">Bande</span>
+                  <span className="font-medium">
+                    {Math.round(modelData.interval * 100)} % des arbres
+                  </span>
+                </li>
+                <li className="flex justify-between gap-3">
+                  <span className="text-gray-500">Calculé à</span>
+                  <span className="font-medium">
+                    {new Date(modelData.generatedAt).toLocaleTimeString("fr-FR", { hour: "2-digit", minute: "2-digit" })}
+                  </span>
+                </li>
+              </ul>
+            ) : (
+              <div className="text-sm text-gray-500">
+                {wantsModel
+                  ? "Prévisions du modèle indisponibles : série simulée affichée."
+                  : "Seul l'AQI est prévu par le modèle ; cette série est une simulation."}
+              </div>
+            )}
           </Panel>
         </div>
       </div>
@@ -375,26 +407,3 @@ function Panel({ title, children }) {
     </div>
   )
 }
-
-function ModelCard({ name, confidence, isSelected, onClick }) {
-  return (
-    <button
-      onClick={onClick}
-      className={`w-full p-3 rounded-xl border transition-all ${
-        isSelected 
-          ? 'border-gray-900 bg-gray-50 shadow-sm' 
-          : 'border-gray-200 hover:border-gray-400 hover:bg-gray-50'
-      }`}
-    >
-      <div className="flex items-center justify-between">
-        <div className="font-medium text-sm text-left">{name}</div>
-        <div className="text-xs px-2 py-1 rounded-lg bg-gray-100">
-          {confidence}% confiance
-        </div>
-      </div>
-      {isSelected && (
-        <div className="text-xs text-gray-500 mt-1 text-left">✓ Modèle actif</div>
-      )}
-    </button>
-  )
-}
\ No newline at end of file